@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boarding', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='boardingpass',
+            index=models.Index(fields=['scanned_at', 'id'], name='boarding_pa_scanned_e606f8_idx'),
+        ),
+    ]
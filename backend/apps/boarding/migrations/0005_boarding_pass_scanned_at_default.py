@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boarding', '0004_boardingpass_scanned_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='boardingpass',
+            name='scanned_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='scanné le'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boarding', '0005_boarding_pass_scanned_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boardingpass',
+            name='client_scan_id',
+            field=models.UUIDField(blank=True, editable=False, help_text="Généré par l'appareil : un scan renvoyé n'est enregistré qu'une fois", null=True, unique=True, verbose_name='identifiant scan client'),
+        ),
+    ]
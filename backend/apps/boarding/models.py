@@ -57,7 +57,16 @@ class BoardingPass(models.Model):
         db_index=True
     )
     
-    scanned_at = models.DateTimeField(_('scanné le'), auto_now_add=True, db_index=True)
+    scanned_at = models.DateTimeField(_('scanné le'), default=timezone.now, db_index=True)
+    
+    client_scan_id = models.UUIDField(
+        _('identifiant scan client'),
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        help_text=_('Généré par l\'appareil : un scan renvoyé n\'est enregistré qu\'une fois')
+    )
     
     # Localisation
     latitude = models.DecimalField(
@@ -109,6 +118,7 @@ class BoardingPass(models.Model):
             models.Index(fields=['boarding_agent', 'scanned_at']),
             models.Index(fields=['scan_status']),
             models.Index(fields=['is_offline_scan', 'synced_at']),
+            models.Index(fields=['scanned_at', 'id']),
         ]
     
     def __str__(self):
@@ -20,9 +20,9 @@ class BoardingPassCreateSerializer(serializers.ModelSerializer):
     
     def validate_qr_code_data(self, value):
         """Valider et décoder le QR code"""
-        from utils.qr_generator import QRCodeGenerator
+        from utils.qr_generator import get_qr_generator
         
-        qr_generator = QRCodeGenerator()
+        qr_generator = get_qr_generator()
         
         try:
             decoded_data = qr_generator.decode_qr_code(value)
@@ -34,6 +34,7 @@ class BoardingPassCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Créer un boarding pass"""
         from apps.tickets.models import Ticket
+        from apps.boarding.services import BoardingProgressService, BoardingService
         from django.utils import timezone
         
         # Retirer qr_code_data qui n'est pas un champ du modèle
@@ -49,16 +50,7 @@ class BoardingPassCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Ticket introuvable.')
         
         # Vérifier la validité du ticket
-        scan_status = BoardingPass.VALID
-        
-        if ticket.status == Ticket.USED:
-            scan_status = BoardingPass.ALREADY_USED
-        elif ticket.status != Ticket.CONFIRMED:
-            scan_status = BoardingPass.INVALID
-        elif str(ticket.trip.id) != decoded_data.get('trip_id'):
-            scan_status = BoardingPass.WRONG_TRIP
-        elif ticket.trip.departure_datetime < timezone.now() - timezone.timedelta(hours=24):
-            scan_status = BoardingPass.EXPIRED
+        scan_status = BoardingService.scan_status(ticket, decoded_data.get('trip_id'), timezone.now())
         
         # Créer le boarding pass
         boarding_pass = BoardingPass.objects.create(
@@ -69,6 +61,8 @@ class BoardingPassCreateSerializer(serializers.ModelSerializer):
             **validated_data
         )
         
+        BoardingProgressService.record(ticket.trip_id, [scan_status])
+        
         # Si scan valide, marquer le ticket comme utilisé
         if scan_status == BoardingPass.VALID:
             ticket.status = Ticket.USED
@@ -93,11 +87,11 @@ class BoardingPassDetailSerializer(serializers.ModelSerializer):
             'id', 'ticket', 'trip', 'boarding_agent', 'boarding_agent_name',
             'scan_status', 'scan_status_display', 'is_valid_scan',
             'scanned_at', 'latitude', 'longitude', 'device_info',
-            'is_offline_scan', 'synced_at', 'notes'
+            'is_offline_scan', 'client_scan_id', 'synced_at', 'notes'
         ]
         read_only_fields = [
             'id', 'scan_status_display', 'is_valid_scan',
-            'scanned_at', 'synced_at'
+            'scanned_at', 'client_scan_id', 'synced_at'
         ]
 
 
@@ -116,24 +110,34 @@ class BoardingPassListSerializer(serializers.ModelSerializer):
         ]
 
 
+class GateScanSerializer(serializers.Serializer):
+    """Scan en porte d'embarquement (chemin court, réponse minimale)"""
+    
+    qr_code_data = serializers.CharField()
+    client_scan_id = serializers.UUIDField(required=False)
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    device_info = serializers.JSONField(required=False)
+
+
+class OfflineScanSerializer(serializers.Serializer):
+    """Un scan hors ligne (validé individuellement lors de la synchronisation)"""
+    
+    client_scan_id = serializers.UUIDField(required=False)
+    qr_code_data = serializers.CharField()
+    scanned_at = serializers.DateTimeField()
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    device_info = serializers.JSONField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
 class OfflineBoardingSyncSerializer(serializers.Serializer):
     """Serializer pour synchroniser les scans offline"""
     
     boarding_passes = serializers.ListField(
         child=serializers.JSONField(),
         required=True,
-        allow_empty=False
+        allow_empty=False,
+        max_length=1000
     )
-    
-    def validate_boarding_passes(self, value):
-        """Valider la structure des boarding passes"""
-        required_fields = ['qr_code_data', 'scanned_at']
-        
-        for bp in value:
-            for field in required_fields:
-                if field not in bp:
-                    raise serializers.ValidationError(
-                        f'Champ requis manquant : {field}'
-                    )
-        
-        return value
\ No newline at end of file
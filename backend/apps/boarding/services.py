@@ -0,0 +1,539 @@
+"""
+Services métier de l'embarquement
+"""
+import base64
+import hashlib
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from cryptography.hazmat.primitives import serialization
+
+from apps.boarding.models import BoardingPass
+from apps.logs.models import ActivityLog
+from apps.tickets.models import Ticket
+from apps.tickets.services import TicketWalletService
+from apps.trips.models import Trip
+from utils.qr_generator import QRKeyRegistry, get_qr_generator
+
+
+class BoardingService:
+    """
+    Contrôle des scans et synchronisation des scans hors ligne
+
+    La synchronisation traite un lot entier en quelques requêtes : tokens
+    vérifiés avec les clés déjà chargées, tickets lus (et verrouillés) en
+    une requête id__in, doublons résolus en mémoire par ordre de scan,
+    puis bulk_create des passes et bulk_update des tickets.
+
+    Chaque scan porte un identifiant généré par l'appareil (client_scan_id,
+    index unique) : dans un lot renvoyé après une coupure, les scans déjà
+    enregistrés sont repérés par une lecture indexée avant le rejeu et
+    renvoient leur résultat d'origine sans rejouer les transitions ;
+    l'insertion ON CONFLICT DO NOTHING ne couvre que les envois concurrents.
+    """
+
+    SYNCED = 'synced'
+    DUPLICATE = 'duplicate'
+    REJECTED = 'rejected'
+
+    class Rejected(Exception):
+        """QR code illisible ou ticket introuvable (aucun pass enregistré)"""
+
+    # Un ticket reste scannable jusqu'à 24h après le départ
+    BOARDING_WINDOW = timedelta(hours=24)
+
+    @classmethod
+    def scan_status(cls, ticket, trip_id, scanned_at):
+        """Statut d'un scan du ticket (trip_id : voyage inscrit dans le QR code)"""
+        if ticket.status == Ticket.USED:
+            return BoardingPass.ALREADY_USED
+        if ticket.status != Ticket.CONFIRMED:
+            return BoardingPass.INVALID
+        if str(ticket.trip_id) != trip_id:
+            return BoardingPass.WRONG_TRIP
+        if ticket.trip.departure_datetime < scanned_at - cls.BOARDING_WINDOW:
+            return BoardingPass.EXPIRED
+        return BoardingPass.VALID
+
+    @classmethod
+    @transaction.atomic
+    def scan(cls, agent, token, client_scan_id=None, ip_address=None, **fields):
+        """
+        Scan en porte d'embarquement, chemin court
+
+        Le ticket passe à « utilisé » par un UPDATE conditionnel (confirmé,
+        bon voyage, dans la fenêtre d'embarquement) : deux scans simultanés
+        ne peuvent pas valider le même ticket et aucun verrou n'est pris.
+        Les signaux du ticket sont court-circuités, leurs effets pour cette
+        transition (portefeuille, journal) sont écrits directement.
+
+        Returns:
+            dict: résultat minimal pour l'appareil
+        """
+        try:
+            decoded = get_qr_generator().decode_qr_code(token)
+            ticket_id = uuid.UUID(decoded['ticket_id'])
+        except Exception as e:
+            raise cls.Rejected(str(e))
+
+        now = timezone.now()
+        # Pas de jointure sur le voyage : Django réécrirait l'UPDATE en
+        # « id IN (sous-requête) » et la condition de statut ne serait plus
+        # réévaluée après un scan concurrent
+        boarded = Ticket.objects.filter(
+            pk=ticket_id,
+            status=Ticket.CONFIRMED,
+            trip_id__in=Trip.objects.filter(
+                pk=decoded.get('trip_id'),
+                departure_datetime__gte=now - cls.BOARDING_WINDOW
+            ).values('pk')
+        ).update(
+            status=Ticket.USED,
+            boarding_time=now,
+            boarded_by=agent,
+            updated_at=now
+        )
+
+        ticket = Ticket.objects.filter(pk=ticket_id).values(
+            'ticket_number', 'trip_id', 'seat_number', 'status',
+            'passenger_first_name', 'passenger_last_name'
+        ).first()
+        if ticket is None:
+            raise cls.Rejected('Ticket introuvable.')
+
+        if boarded:
+            scan_status = BoardingPass.VALID
+            TicketWalletService.mirror([ticket_id], status=Ticket.USED)
+        else:
+            # Scan renvoyé par l'appareil (délai réseau) : résultat d'origine
+            replayed = client_scan_id and BoardingPass.objects.filter(
+                client_scan_id=client_scan_id
+            ).values_list('id', 'scan_status').first()
+            if replayed:
+                return cls._scan_result(replayed[0], replayed[1], ticket)
+
+            if ticket['status'] == Ticket.USED:
+                scan_status = BoardingPass.ALREADY_USED
+            elif ticket['status'] != Ticket.CONFIRMED:
+                scan_status = BoardingPass.INVALID
+            elif str(ticket['trip_id']) != decoded.get('trip_id'):
+                scan_status = BoardingPass.WRONG_TRIP
+            else:
+                scan_status = BoardingPass.EXPIRED
+
+        try:
+            # Point de sauvegarde : le même scan peut arriver deux fois en parallèle
+            with transaction.atomic():
+                boarding_pass = BoardingPass.objects.create(
+                    ticket_id=ticket_id,
+                    trip_id=ticket['trip_id'],
+                    boarding_agent=agent,
+                    scan_status=scan_status,
+                    scanned_at=now,
+                    client_scan_id=client_scan_id,
+                    **fields
+                )
+        except IntegrityError:
+            stored = client_scan_id and BoardingPass.objects.filter(
+                client_scan_id=client_scan_id
+            ).values_list('id', 'scan_status').first()
+            if not stored:
+                raise
+            if boarded:
+                # Le scan est déjà enregistré par l'autre requête : annuler la transition
+                transaction.set_rollback(True)
+            return cls._scan_result(stored[0], stored[1], ticket)
+
+        ActivityLog.objects.create(
+            user=agent,
+            action=ActivityLog.TICKET_SCAN,
+            description=f"Scan ticket : {ticket['ticket_number']}",
+            details={
+                'boarding_pass_id': str(boarding_pass.id),
+                'ticket_id': str(ticket_id),
+                'ticket_number': ticket['ticket_number'],
+                'scan_status': scan_status,
+                'is_offline': False
+            },
+            content_type='BoardingPass',
+            object_id=str(boarding_pass.id),
+            severity=ActivityLog.SEVERITY_INFO if boarded else ActivityLog.SEVERITY_WARNING,
+            ip_address=ip_address
+        )
+
+        BoardingProgressService.record(ticket['trip_id'], [scan_status])
+        return cls._scan_result(boarding_pass.id, scan_status, ticket)
+
+    @staticmethod
+    def _scan_result(boarding_pass_id, scan_status, ticket):
+        return {
+            'is_valid': scan_status == BoardingPass.VALID,
+            'scan_status': scan_status,
+            'boarding_pass_id': str(boarding_pass_id),
+            'ticket_number': ticket['ticket_number'],
+            'passenger_name': f"{ticket['passenger_first_name']} {ticket['passenger_last_name']}",
+            'seat_number': ticket['seat_number'],
+        }
+
+    @classmethod
+    @transaction.atomic
+    def sync_offline(cls, agent, scans, ip_address=None):
+        """
+        Enregistrer un lot de scans hors ligne (idempotent par client_scan_id)
+
+        Args:
+            agent: embarqueur qui synchronise
+            scans: liste de dicts (client_scan_id, qr_code_data, scanned_at, ...)
+            ip_address: IP du client, pour le journal
+
+        Returns:
+            list: un résultat par scan, dans l'ordre reçu
+        """
+        from apps.boarding.serializers import OfflineScanSerializer
+
+        generator = get_qr_generator()
+        results = [None] * len(scans)
+        decoded_scans = []
+        # Scans répétés dans le même lot : index du premier envoi
+        first_index = {}
+        repeated = []
+
+        for index, item in enumerate(scans):
+            serializer = OfflineScanSerializer(data=item)
+            if not serializer.is_valid():
+                results[index] = cls._rejected(index, item, errors=serializer.errors)
+                continue
+
+            data = dict(serializer.validated_data)
+            # Les anciens clients n'envoient pas d'identifiant : pas de dédoublonnage
+            data['client_scan_id'] = data.get('client_scan_id') or uuid.uuid4()
+            if data['client_scan_id'] in first_index:
+                repeated.append((index, data['client_scan_id']))
+                continue
+
+            try:
+                decoded = generator.decode_qr_code(data.pop('qr_code_data'))
+                ticket_id = uuid.UUID(decoded['ticket_id'])
+            except Exception as e:
+                results[index] = cls._rejected(index, item, error=str(e))
+                continue
+            first_index[data['client_scan_id']] = index
+            decoded_scans.append((index, item, data, decoded, ticket_id))
+
+        tickets = Ticket.objects.select_for_update(of=('self',)).select_related('trip').in_bulk(
+            {scan[4] for scan in decoded_scans}
+        )
+
+        # Scans déjà enregistrés (lot renvoyé) : lus avant le rejeu, pour
+        # qu'un ancien scan ne modifie ni les tickets ni le statut des nouveaux
+        stored = {
+            row[0]: row[1:]
+            for row in BoardingPass.objects.filter(
+                client_scan_id__in=[scan[2]['client_scan_id'] for scan in decoded_scans]
+            ).values_list('client_scan_id', 'id', 'scan_status', 'ticket_id', 'synced_at')
+        }
+
+        now = timezone.now()
+        passes, boarded = [], {}
+        # Le premier scan d'un ticket l'emporte, les suivants sont « déjà utilisé »
+        for index, item, data, decoded, ticket_id in sorted(decoded_scans, key=lambda scan: scan[2]['scanned_at']):
+            if data['client_scan_id'] in stored:
+                continue
+
+            ticket = tickets.get(ticket_id)
+            if ticket is None:
+                results[index] = cls._rejected(index, item, error='Ticket introuvable.')
+                continue
+
+            scan_status = cls.scan_status(ticket, decoded.get('trip_id'), data['scanned_at'])
+            if scan_status == BoardingPass.VALID:
+                ticket.status = Ticket.USED
+                ticket.boarding_time = data['scanned_at']
+                ticket.boarded_by = agent
+                ticket.updated_at = now
+                boarded[data['client_scan_id']] = ticket
+
+            passes.append(BoardingPass(
+                ticket=ticket,
+                trip_id=ticket.trip_id,
+                boarding_agent=agent,
+                scan_status=scan_status,
+                is_offline_scan=True,
+                synced_at=now,
+                **data
+            ))
+
+        # L'index unique n'écarte plus que les envois concurrents du même lot
+        BoardingPass.objects.bulk_create(passes, ignore_conflicts=True)
+
+        # Relecture des lignes du lot : synced_at == now désigne celles insérées ici
+        stored.update(
+            (row[0], row[1:])
+            for row in BoardingPass.objects.filter(
+                client_scan_id__in=[boarding_pass.client_scan_id for boarding_pass in passes]
+            ).values_list('client_scan_id', 'id', 'scan_status', 'ticket_id', 'synced_at')
+        )
+        inserted = [
+            boarding_pass for boarding_pass in passes
+            if stored[boarding_pass.client_scan_id][3] == now
+        ]
+        for boarding_pass in inserted:
+            boarding_pass.id = stored[boarding_pass.client_scan_id][0]
+
+        # Transitions rejouées uniquement pour les scans réellement insérés
+        boarded = [
+            boarded[boarding_pass.client_scan_id] for boarding_pass in inserted
+            if boarding_pass.client_scan_id in boarded
+        ]
+        if boarded:
+            Ticket.objects.bulk_update(boarded, ['status', 'boarding_time', 'boarded_by', 'updated_at'])
+            TicketWalletService.mirror([ticket.pk for ticket in boarded], status=Ticket.USED)
+
+        scans_by_trip = defaultdict(list)
+        for boarding_pass in inserted:
+            scans_by_trip[boarding_pass.trip_id].append(boarding_pass.scan_status)
+        for trip_id, statuses in scans_by_trip.items():
+            BoardingProgressService.record(trip_id, statuses)
+
+        ActivityLog.objects.bulk_create([
+            ActivityLog(
+                user=agent,
+                action=ActivityLog.TICKET_SCAN,
+                description=f"Scan hors ligne : {boarding_pass.ticket.ticket_number}",
+                details={
+                    'boarding_pass_id': str(boarding_pass.id),
+                    'client_scan_id': str(boarding_pass.client_scan_id),
+                    'ticket_id': str(boarding_pass.ticket_id),
+                    'ticket_number': boarding_pass.ticket.ticket_number,
+                    'scan_status': boarding_pass.scan_status,
+                    'scanned_at': boarding_pass.scanned_at.isoformat(),
+                    'is_offline': True
+                },
+                content_type='BoardingPass',
+                object_id=str(boarding_pass.id),
+                severity=ActivityLog.SEVERITY_INFO if boarding_pass.is_valid_scan else ActivityLog.SEVERITY_WARNING,
+                ip_address=ip_address
+            )
+            for boarding_pass in inserted
+        ])
+
+        for client_scan_id, (pass_id, scan_status, ticket_id, synced_at) in stored.items():
+            index = first_index[client_scan_id]
+            results[index] = {
+                'index': index,
+                'result': cls.SYNCED if synced_at == now else cls.DUPLICATE,
+                'client_scan_id': str(client_scan_id),
+                'ticket_id': str(ticket_id),
+                'boarding_pass_id': str(pass_id),
+                'scan_status': scan_status,
+            }
+
+        for index, client_scan_id in repeated:
+            original = results[first_index[client_scan_id]]
+            results[index] = {**original, 'index': index}
+            if original['result'] != cls.REJECTED:
+                results[index]['result'] = cls.DUPLICATE
+        return results
+
+    @classmethod
+    def _rejected(cls, index, item, **error):
+        return {'index': index, 'result': cls.REJECTED, 'data': item, **error}
+
+
+class BoardingProgressService:
+    """
+    Compteurs d'embarquement en direct par voyage (cache partagé)
+
+    Embarqués et tentatives invalides sont incrémentés après la validation
+    de chaque scan : les tableaux de bord lisent le cache sans interroger
+    boarding_passes. Un compteur absent (expiré, évincé) est réinitialisé
+    depuis la base à la lecture suivante ; la durée de vie limitée
+    rattrape un scan validé pendant cette réinitialisation.
+    """
+
+    KEY = 'boarding_progress:{trip_id}:{counter}'
+    COUNTERS = ('boarded', 'invalid')
+    COUNTERS_TIMEOUT = 900
+    # Passagers attendus (confirmés ou embarqués) : varie hors embarquement
+    EXPECTED_TIMEOUT = 60
+
+    @classmethod
+    def _key(cls, trip_id, counter):
+        return cls.KEY.format(trip_id=trip_id, counter=counter)
+
+    @classmethod
+    def record(cls, trip_id, scan_statuses):
+        """Comptabiliser des scans enregistrés (après commit)"""
+        boarded = sum(scan_status == BoardingPass.VALID for scan_status in scan_statuses)
+        increments = {'boarded': boarded, 'invalid': len(scan_statuses) - boarded}
+
+        def apply():
+            for counter, value in increments.items():
+                if not value:
+                    continue
+                try:
+                    cache.incr(cls._key(trip_id, counter), value)
+                except ValueError:
+                    # Absent : la prochaine lecture compte depuis la base, ce scan inclus
+                    pass
+
+        transaction.on_commit(apply)
+
+    @classmethod
+    def get(cls, trip_id):
+        """Progression de l'embarquement d'un voyage"""
+        keys = {counter: cls._key(trip_id, counter) for counter in cls.COUNTERS + ('expected',)}
+        values = cache.get_many(keys.values())
+        progress = {counter: values.get(key) for counter, key in keys.items()}
+
+        if any(progress[counter] is None for counter in cls.COUNTERS):
+            counts = BoardingPass.objects.filter(trip_id=trip_id).aggregate(
+                boarded=Count('id', filter=Q(scan_status=BoardingPass.VALID)),
+                invalid=Count('id', filter=~Q(scan_status=BoardingPass.VALID))
+            )
+            for counter in cls.COUNTERS:
+                # add : ne pas écraser un compteur initialisé par une requête concurrente
+                cache.add(keys[counter], counts[counter], cls.COUNTERS_TIMEOUT)
+            values = cache.get_many([keys[counter] for counter in cls.COUNTERS])
+            for counter in cls.COUNTERS:
+                progress[counter] = values.get(keys[counter], counts[counter])
+
+        if progress['expected'] is None:
+            progress['expected'] = Ticket.objects.filter(
+                trip_id=trip_id,
+                status__in=[Ticket.CONFIRMED, Ticket.USED]
+            ).count()
+            cache.set(keys['expected'], progress['expected'], cls.EXPECTED_TIMEOUT)
+
+        # Empreinte des compteurs : le client la renvoie (since) pour obtenir un 304
+        version = hashlib.sha1(
+            f"{progress['expected']}:{progress['boarded']}:{progress['invalid']}".encode()
+        ).hexdigest()[:12]
+        return {
+            'trip_id': int(trip_id),
+            'version': version,
+            'expected': progress['expected'],
+            'boarded': progress['boarded'],
+            'remaining': max(progress['expected'] - progress['boarded'], 0),
+            'invalid_attempts': progress['invalid'],
+        }
+
+
+class BoardingManifestService:
+    """
+    Manifeste d'embarquement signé, pour la validation hors ligne
+
+    Le manifeste liste les tickets d'un voyage sous forme compacte
+    [id hexadécimal, siège, code statut, passager]. Il est signé (Ed25519)
+    avec la clé des manifestes, épinglée sur l'appareil de l'embarqueur et
+    jamais tournée avec les clés des QR codes : l'appareil vérifie la
+    signature puis valide les QR codes (clés publiques fournies dans le
+    manifeste et dans chaque delta) sans réseau, ni serveur, ni cache.
+
+    La version est un horodatage en millisecondes. Un appareil qui possède
+    la version N ne télécharge ensuite que les tickets modifiés depuis N
+    (delta) ; une marge couvre les transactions validées après la lecture
+    précédente (une entrée reçue deux fois est simplement réécrite).
+    """
+
+    FORMAT = 3
+    OVERLAP = timedelta(seconds=30)
+
+    STATUS_CODES = {
+        Ticket.PENDING: 'P',
+        Ticket.CONFIRMED: 'C',
+        Ticket.USED: 'U',
+        Ticket.CANCELLED: 'X',
+        Ticket.EXPIRED: 'E',
+        Ticket.REFUNDED: 'R',
+    }
+    # Statuts listés dans un manifeste complet (les autres ne peuvent pas embarquer)
+    LISTED_STATUSES = [Ticket.PENDING, Ticket.CONFIRMED, Ticket.USED]
+
+    @staticmethod
+    def to_version(moment):
+        return int(moment.timestamp() * 1000)
+
+    @staticmethod
+    def from_version(version):
+        return datetime.fromtimestamp(version / 1000, tz=dt_timezone.utc)
+
+    @staticmethod
+    def canonical(data):
+        """Sérialisation JSON stable : les octets signés sont ceux transmis"""
+        return json.dumps(data, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    def public_keys():
+        """
+        Clés publiques nécessaires à la vérification sur l'appareil
+
+        Clé courante en premier, puis celles des rotations précédentes
+        (QR codes émis avant la rotation).
+        """
+        keys = QRKeyRegistry.get()
+        return {
+            'ed25519': [
+                base64.b64encode(public_key.public_bytes(
+                    encoding=serialization.Encoding.Raw,
+                    format=serialization.PublicFormat.Raw
+                )).decode()
+                for public_key in keys.ed25519_verify_keys
+            ],
+            # Tokens JWT historiques encore en circulation
+            'rs256': [
+                public_key.public_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PublicFormat.SubjectPublicKeyInfo
+                ).decode()
+                for public_key in keys.rsa_verify_keys
+            ],
+        }
+
+    @classmethod
+    def build(cls, trip, since=None):
+        """
+        Manifeste complet (since=None) ou delta depuis la version since
+
+        Returns:
+            dict: {'manifest': JSON signé (chaîne), 'signature': base64}
+        """
+        now = timezone.now()
+        tickets = Ticket.objects.filter(trip=trip)
+        if since:
+            tickets = tickets.filter(updated_at__gte=cls.from_version(since) - cls.OVERLAP)
+        else:
+            tickets = tickets.filter(status__in=cls.LISTED_STATUSES)
+
+        rows = tickets.values_list(
+            'id', 'seat_number', 'status', 'passenger_first_name', 'passenger_last_name'
+        )
+
+        manifest = {
+            'format': cls.FORMAT,
+            'trip_id': trip.pk,
+            'version': cls.to_version(now),
+            'since': since or 0,
+            'departure': int(trip.departure_datetime.timestamp()),
+            'generated_at': int(now.timestamp()),
+            'tickets': [
+                [ticket_id.hex, seat, cls.STATUS_CODES.get(status, status), f'{first} {last}']
+                for ticket_id, seat, status, first, last in rows
+            ],
+        }
+        # Aussi dans les deltas : une rotation des clés QR arrive par le delta suivant
+        manifest['keys'] = cls.public_keys()
+
+        payload = cls.canonical(manifest)
+        signature = QRKeyRegistry.get().manifest_private_key.sign(payload.encode())
+
+        return {
+            'manifest': payload,
+            'signature': base64.b64encode(signature).decode(),
+        }
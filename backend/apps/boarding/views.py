@@ -6,16 +6,21 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from django.db import transaction
 
 from apps.boarding.models import BoardingPass
+from apps.boarding.services import BoardingManifestService, BoardingProgressService, BoardingService
 from apps.boarding.serializers import (
     BoardingPassCreateSerializer,
     BoardingPassDetailSerializer,
     BoardingPassListSerializer,
+    GateScanSerializer,
     OfflineBoardingSyncSerializer
 )
-from apps.users.permissions import CanScanTicket
+from apps.trips.models import Trip
+from apps.users.permissions import CanMonitorBoarding, CanScanTicket
 from apps.logs.models import ActivityLog
 from utils.pagination import StandardResultsSetPagination
 from django_filters.rest_framework import DjangoFilterBackend
@@ -33,6 +38,7 @@ class BoardingPassViewSet(viewsets.ModelViewSet):
     search_fields = ['ticket__ticket_number', 'ticket__passenger_first_name', 'ticket__passenger_last_name']
     ordering_fields = ['scanned_at']
     ordering = ['-scanned_at']
+    cursor_ordering = ('-scanned_at', '-id')
     
     def get_serializer_class(self):
         """Retourner le serializer approprié"""
@@ -42,8 +48,16 @@ class BoardingPassViewSet(viewsets.ModelViewSet):
             return BoardingPassListSerializer
         elif self.action == 'sync_offline':
             return OfflineBoardingSyncSerializer
+        elif self.action == 'scan':
+            return GateScanSerializer
         return BoardingPassDetailSerializer
     
+    def get_permissions(self):
+        """Suivi de l'embarquement ouvert aux compagnies et aux admins"""
+        if self.action in ['manifest', 'progress']:
+            return [IsAuthenticated(), CanMonitorBoarding()]
+        return super().get_permissions()
+    
     def get_queryset(self):
         """Filtrer selon le rôle"""
         queryset = super().get_queryset().select_related(
@@ -101,50 +115,49 @@ class BoardingPassViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], url_path='scan')
+    def scan(self, request):
+        """Scan rapide en porte d'embarquement (réponse minimale)"""
+        serializer = GateScanSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = dict(serializer.validated_data)
+        try:
+            result = BoardingService.scan(
+                request.user,
+                data.pop('qr_code_data'),
+                ip_address=self.get_client_ip(request),
+                **data
+            )
+        except BoardingService.Rejected as e:
+            return Response(
+                {'is_valid': False, 'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(result, status=status.HTTP_201_CREATED)
+    
     @action(detail=False, methods=['post'], url_path='sync-offline')
     def sync_offline(self, request):
-        """Synchroniser les scans effectués hors ligne"""
+        """Synchroniser les scans effectués hors ligne (un résultat par scan)"""
         serializer = OfflineBoardingSyncSerializer(data=request.data)
         
         if serializer.is_valid():
-            boarding_passes_data = serializer.validated_data['boarding_passes']
-            
-            synced_count = 0
-            failed_count = 0
-            errors = []
-            
-            for bp_data in boarding_passes_data:
-                try:
-                    # Créer le boarding pass avec les données offline
-                    bp_serializer = BoardingPassCreateSerializer(
-                        data=bp_data,
-                        context={'request': request}
-                    )
-                    
-                    if bp_serializer.is_valid():
-                        boarding_pass = bp_serializer.save()
-                        boarding_pass.synced_at = timezone.now()
-                        boarding_pass.save()
-                        synced_count += 1
-                    else:
-                        failed_count += 1
-                        errors.append({
-                            'data': bp_data,
-                            'errors': bp_serializer.errors
-                        })
-                
-                except Exception as e:
-                    failed_count += 1
-                    errors.append({
-                        'data': bp_data,
-                        'error': str(e)
-                    })
+            results = BoardingService.sync_offline(
+                request.user,
+                serializer.validated_data['boarding_passes'],
+                ip_address=self.get_client_ip(request)
+            )
+            errors = [result for result in results if result['result'] == BoardingService.REJECTED]
             
             return Response({
                 'message': 'Synchronisation terminée',
-                'synced_count': synced_count,
-                'failed_count': failed_count,
-                'errors': errors if errors else None
+                'synced_count': len(results) - len(errors),
+                'failed_count': len(errors),
+                'errors': errors if errors else None,
+                'results': results
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -216,6 +229,73 @@ class BoardingPassViewSet(viewsets.ModelViewSet):
             'scans': serializer.data
         })
     
+    @method_decorator(gzip_page)
+    @action(detail=False, methods=['get'], url_path='manifest')
+    def manifest(self, request):
+        """
+        Manifeste signé d'un voyage pour l'embarquement hors ligne
+        
+        ?since=<version> : seuls les tickets modifiés depuis cette version
+        """
+        trip_id = request.query_params.get('trip_id')
+        since = request.query_params.get('since')
+        
+        if not trip_id:
+            return Response(
+                {'error': 'trip_id requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if since is not None and not since.isdigit():
+            return Response(
+                {'error': 'since doit être une version (entier)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        trip = self.get_scannable_trip(trip_id)
+        if trip is None:
+            return Response(
+                {'error': 'Voyage introuvable'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(BoardingManifestService.build(trip, since=int(since) if since else None))
+    
+    @action(detail=False, methods=['get'], url_path='progress')
+    def progress(self, request):
+        """
+        Progression de l'embarquement d'un voyage (compteurs en cache)
+        
+        ?since=<version> : 304 sans corps si rien n'a changé depuis cette version
+        """
+        trip_id = request.query_params.get('trip_id')
+        since = request.query_params.get('since')
+        
+        if not trip_id:
+            return Response(
+                {'error': 'trip_id requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if self.get_scannable_trip(trip_id) is None:
+            return Response(
+                {'error': 'Voyage introuvable'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        progress = BoardingProgressService.get(trip_id)
+        if since == progress['version']:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return Response(progress)
+    
+    def get_scannable_trip(self, trip_id):
+        """Voyage accessible à l'utilisateur (admin : tous, sinon sa compagnie)"""
+        if not str(trip_id).isdigit():
+            return None
+        
+        trips = Trip.objects.all()
+        if self.request.user.role != 'admin':
+            trips = trips.filter(company=self.request.user.company)
+        return trips.filter(pk=trip_id).first()
+    
     @staticmethod
     def get_client_ip(request):
         """Récupérer l'IP du client"""
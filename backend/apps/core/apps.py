@@ -5,3 +5,7 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     verbose_name = 'Core'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import apps.core.signals
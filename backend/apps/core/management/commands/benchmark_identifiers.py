@@ -0,0 +1,116 @@
+"""
+Commande de test de charge de la génération des numéros de tickets
+"""
+import random
+import string
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.core.services import IdentifierService
+
+
+def legacy_ticket_numbers(count=1):
+    """Ancienne implémentation (date + 6 chiffres aléatoires)"""
+    date_part = timezone.now().strftime('%Y%m%d')
+    return [f"TZ{date_part}{''.join(random.choices(string.digits, k=6))}" for _ in range(count)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère des numéros de tickets depuis des clients concurrents et '
+        'vérifie l\'absence de collision (les valeurs de séquence consommées '
+        'laissent des trous sans conséquence)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Nombre de clients concurrents')
+        parser.add_argument('--count', type=int, default=2000, help='Numéros par client')
+        parser.add_argument('--batch', type=int, default=1, help='Numéros par appel (réservation de groupe)')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        count = options['count']
+        batch = options['batch']
+        if threads < 1 or count < 1 or batch < 1:
+            raise CommandError('threads, count et batch doivent être positifs')
+
+        self.stdout.write(
+            f'🎫 {threads} clients x {count} numéros (lots de {batch}) '
+            f'= {threads * count} numéros\n'
+        )
+
+        engines = [
+            ('Ancienne (aléatoire)', legacy_ticket_numbers, False),
+            ('Séquence + contrôle Luhn', IdentifierService.generate_ticket_numbers, True),
+        ]
+
+        failed = False
+        for label, generate, checked in engines:
+            per_thread, errors, elapsed = self._run(generate, threads, count, batch)
+            numbers = [number for values in per_thread for number in values]
+            duplicates = sum(n - 1 for n in Counter(numbers).values() if n > 1)
+
+            self.stdout.write(f'📊 {label}')
+            self.stdout.write(f'   Débit : {len(numbers) / elapsed:.0f} numéros/s ({elapsed:.2f}s)')
+            self.stdout.write(f'   Numéros générés : {len(numbers)} (erreurs : {errors})')
+
+            if not checked:
+                self.stdout.write(self.style.WARNING(f'   ⚠️  Collisions : {duplicates}\n'))
+                continue
+
+            invalid = sum(
+                not IdentifierService.is_valid(IdentifierService.TICKET, number)
+                for number in numbers
+            )
+            # Chaque client doit voir des numéros strictement croissants
+            unordered = sum(
+                any(a >= b for a, b in zip(values, values[1:]))
+                for values in per_thread
+            )
+
+            if duplicates or invalid or unordered or errors:
+                failed = True
+                self.stdout.write(self.style.ERROR(
+                    f'   ❌ Collisions : {duplicates}, contrôle invalide : {invalid}, '
+                    f'clients non monotones : {unordered}\n'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('   ✅ Aucune collision, numéros croissants\n'))
+
+        if failed:
+            raise CommandError('Le générateur a produit des numéros invalides')
+
+    def _run(self, generate, threads, count, batch):
+        """Lancer les clients concurrents et mesurer le temps total"""
+        barrier = threading.Barrier(threads)
+        results = [[] for _ in range(threads)]
+        errors = [0] * threads
+
+        def worker(index):
+            try:
+                barrier.wait()
+                remaining = count
+                while remaining > 0:
+                    size = min(batch, remaining)
+                    try:
+                        results[index].extend(generate(size))
+                    except Exception:
+                        errors[index] += 1
+                    remaining -= size
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return results, sum(errors), elapsed
@@ -0,0 +1,95 @@
+"""
+Commande de comparaison des formats de token QR (JWT RS256 / compact Ed25519)
+"""
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+
+import qrcode
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from utils.qr_generator import get_qr_generator
+
+
+def sample_ticket():
+    """Ticket fictif représentatif (noms et villes de longueur courante)"""
+    trip = SimpleNamespace(
+        id=48213,
+        departure_datetime=timezone.now() + timedelta(days=2),
+        departure_city=SimpleNamespace(name='Abidjan'),
+        arrival_city=SimpleNamespace(name='Yamoussoukro'),
+    )
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        ticket_number='TZ2026101700004217',
+        trip=trip,
+        trip_id=trip.id,
+        passenger_full_name='Aya Konan-Kouassi',
+        seat_number='12',
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare la taille, la version QR et la vitesse des formats de token'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ticket', help='ID d\'un ticket réel (défaut : ticket fictif)')
+        parser.add_argument('--iterations', type=int, default=300, help='Signatures/vérifications mesurées')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations < 1:
+            raise CommandError('iterations doit être positif')
+
+        if options['ticket']:
+            from apps.tickets.models import Ticket
+            try:
+                ticket = Ticket.objects.select_related(
+                    'trip__departure_city', 'trip__arrival_city'
+                ).get(pk=options['ticket'])
+            except (Ticket.DoesNotExist, ValueError):
+                raise CommandError(f'Ticket {options["ticket"]} introuvable')
+        else:
+            ticket = sample_ticket()
+
+        generator = get_qr_generator()
+        formats = [
+            ('JWT RS256 (historique)', generator.sign_ticket_jwt),
+            ('Compact Ed25519', generator.sign_ticket_compact),
+        ]
+
+        self.stdout.write(f'🎫 Ticket {ticket.ticket_number}, {iterations} itérations\n')
+
+        results = []
+        for label, sign in formats:
+            token = sign(ticket)
+
+            qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H)
+            qr.add_data(token)
+            qr.make(fit=True)
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                sign(ticket)
+            sign_ms = (time.perf_counter() - start) * 1000 / iterations
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                generator.decode_qr_code(token)
+            verify_ms = (time.perf_counter() - start) * 1000 / iterations
+
+            png = generator.render_png(token)
+            results.append((len(token), qr.version))
+
+            self.stdout.write(f'📊 {label}')
+            self.stdout.write(f'   Token : {len(token)} caractères')
+            self.stdout.write(f'   QR code : version {qr.version} ({qr.modules_count}x{qr.modules_count} modules), PNG {len(png)} octets')
+            self.stdout.write(f'   Signature : {sign_ms:.3f} ms, vérification : {verify_ms:.3f} ms\n')
+
+        (jwt_size, jwt_version), (compact_size, compact_version) = results
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Token {100 - compact_size * 100 // jwt_size}% plus court, '
+            f'QR version {jwt_version} → {compact_version}'
+        ))
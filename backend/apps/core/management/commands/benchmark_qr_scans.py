@@ -0,0 +1,61 @@
+"""
+Commande de benchmark de la vérification des QR codes (scans par seconde)
+"""
+import time
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+
+from utils.qr_generator import QRCodeGenerator, get_qr_generator
+
+
+def legacy_decode(token):
+    """Ancienne implémentation : relecture et analyse des clés PEM à chaque scan"""
+    with open(settings.QR_CODE_RSA_PRIVATE_KEY_PATH, 'rb') as f:
+        serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
+    with open(settings.QR_CODE_RSA_PUBLIC_KEY_PATH, 'rb') as f:
+        public_key = serialization.load_pem_public_key(f.read(), backend=default_backend())
+
+    return jwt.decode(
+        token,
+        public_key,
+        algorithms=['RS256'],
+        options={'verify_signature': True, 'verify_exp': True, 'verify_iss': True},
+        issuer='TicketZen'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare les scans par seconde avec et sans le registre de clés partagé'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scans', type=int, default=500, help='Nombre de scans par implémentation')
+
+    def handle(self, *args, **options):
+        scans = options['scans']
+        if scans < 1:
+            raise CommandError('scans doit être positif')
+
+        token = QRCodeGenerator.generate_test_token()
+        self.stdout.write(f'🔍 {scans} vérifications de QR code par implémentation\n')
+
+        engines = [
+            ('Ancienne (clés relues à chaque scan)', legacy_decode),
+            ('Registre de clés partagé', get_qr_generator().decode_qr_code),
+        ]
+
+        rates = []
+        for label, decode in engines:
+            start = time.perf_counter()
+            for _ in range(scans):
+                decode(token)
+            elapsed = time.perf_counter() - start
+            rates.append(scans / elapsed)
+
+            self.stdout.write(f'📊 {label}')
+            self.stdout.write(f'   Débit : {scans / elapsed:.0f} scans/s ({elapsed * 1000 / scans:.2f} ms/scan)\n')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Accélération : x{rates[1] / rates[0]:.1f}'))
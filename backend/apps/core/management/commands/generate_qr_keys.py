@@ -2,55 +2,64 @@
 Commande pour générer les clés RSA pour QR codes
 """
 from django.core.management.base import BaseCommand
-from utils.qr_generator import QRCodeGenerator
+from utils.qr_generator import QRCodeGenerator, QRKeyRegistry
 
 
 class Command(BaseCommand):
-    help = 'Générer les clés RSA pour les QR codes sécurisés'
+    help = 'Générer les clés Ed25519 et RSA pour les QR codes sécurisés'
     
     def add_arguments(self, parser):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Forcer la regénération même si les clés existent',
+            help='Remplacer les clés existantes (rotation, anciennes clés publiques conservées)',
         )
     
     def handle(self, *args, **options):
         import os
         from django.conf import settings
         
-        private_key_path = settings.QR_CODE_RSA_PRIVATE_KEY_PATH
-        public_key_path = settings.QR_CODE_RSA_PUBLIC_KEY_PATH
+        key_paths = [
+            settings.QR_CODE_ED25519_PRIVATE_KEY_PATH,
+            settings.QR_CODE_ED25519_PUBLIC_KEY_PATH,
+            settings.QR_CODE_RSA_PRIVATE_KEY_PATH,
+            settings.QR_CODE_RSA_PUBLIC_KEY_PATH,
+            settings.QR_CODE_MANIFEST_PRIVATE_KEY_PATH,
+            settings.QR_CODE_MANIFEST_PUBLIC_KEY_PATH,
+        ]
         
         # Vérifier si les clés existent déjà
-        if os.path.exists(private_key_path) and os.path.exists(public_key_path):
+        if all(os.path.exists(path) for path in key_paths):
             if not options['force']:
                 self.stdout.write(self.style.WARNING(
-                    '\n⚠️  Les clés RSA existent déjà !\n'
+                    '\n⚠️  Les clés existent déjà !\n'
                 ))
-                self.stdout.write(f'   Clé privée: {private_key_path}')
-                self.stdout.write(f'   Clé publique: {public_key_path}\n')
-                self.stdout.write('   Utilisez --force pour regénérer les clés.\n')
+                for path in key_paths:
+                    self.stdout.write(f'   {path}')
+                self.stdout.write('\n   Utilisez --force pour regénérer les clés.\n')
                 return
             else:
                 self.stdout.write(self.style.WARNING(
-                    '\n⚠️  Regénération des clés RSA (--force activé)...\n'
+                    '\n⚠️  Rotation des clés (--force activé)...\n'
                 ))
-                # Supprimer les anciennes clés
-                if os.path.exists(private_key_path):
-                    os.remove(private_key_path)
-                if os.path.exists(public_key_path):
-                    os.remove(public_key_path)
+                # Les clés publiques actuelles restent valides pour les QR codes déjà émis
+                QRKeyRegistry.rotate()
+                self.stdout.write(
+                    f'   Anciennes clés publiques conservées dans {settings.QR_CODE_PREVIOUS_KEYS_DIR}\n'
+                    f'   Clé des manifestes inchangée (épinglée sur les appareils) : '
+                    f'{settings.QR_CODE_MANIFEST_PUBLIC_KEY_PATH}\n'
+                )
         
-        # Générer les nouvelles clés
-        self.stdout.write('🔐 Génération des clés RSA pour QR codes sécurisés...\n')
+        # Générer les nouvelles clés (seules les paires absentes sont créées)
+        self.stdout.write('🔐 Génération des clés pour QR codes sécurisés...\n')
         
         try:
             generator = QRCodeGenerator()
             
-            self.stdout.write(self.style.SUCCESS('✅ Clés RSA générées avec succès !\n'))
-            self.stdout.write(f'   📁 Clé privée: {generator.private_key_path}')
-            self.stdout.write(f'   📁 Clé publique: {generator.public_key_path}\n')
+            self.stdout.write(self.style.SUCCESS('✅ Clés générées avec succès !\n'))
+            for path in key_paths:
+                self.stdout.write(f'   📁 {path}')
+            self.stdout.write('')
             
             # Tester les clés
             self.stdout.write('🧪 Test des clés...')
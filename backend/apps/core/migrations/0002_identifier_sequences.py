@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+# Séquences natives PostgreSQL utilisées par IdentifierService (CACHE 1 :
+# les valeurs restent croissantes entre connexions)
+SEQUENCES = ('ticket_number_seq', 'transaction_id_seq')
+
+
+def create_sequences(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for name in SEQUENCES:
+        schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {name} START 1 CACHE 1')
+
+
+def drop_sequences(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name in SEQUENCES:
+            schema_editor.execute(f'DROP SEQUENCE IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='nom')),
+                ('value', models.BigIntegerField(default=0, verbose_name='valeur')),
+            ],
+            options={
+                'verbose_name': "séquence d'identifiants",
+                'verbose_name_plural': "séquences d'identifiants",
+                'db_table': 'identifier_sequences',
+            },
+        ),
+        migrations.RunPython(create_sequences, drop_sequences),
+    ]
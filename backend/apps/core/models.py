@@ -256,4 +256,23 @@ class Banner(models.Model):
         """Calcule le taux de clic"""
         if self.views == 0:
             return 0
-        return (self.clicks / self.views) * 100
\ No newline at end of file
+        return (self.clicks / self.views) * 100
+
+class IdentifierSequence(models.Model):
+    """
+    Compteur d'identifiants pour les bases sans séquences (SQLite en développement)
+
+    Sous PostgreSQL, les numéros viennent de séquences natives (nextval),
+    sans verrou ni contention : voir IdentifierService.
+    """
+    
+    name = models.CharField(_('nom'), max_length=50, primary_key=True)
+    value = models.BigIntegerField(_('valeur'), default=0)
+    
+    class Meta:
+        db_table = 'identifier_sequences'
+        verbose_name = _('séquence d\'identifiants')
+        verbose_name_plural = _('séquences d\'identifiants')
+    
+    def __str__(self):
+        return f"{self.name} ({self.value})"
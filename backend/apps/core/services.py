@@ -0,0 +1,77 @@
+"""
+Services transverses de la plateforme
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.models import IdentifierSequence
+from utils.identifiers import format_identifier, is_valid_identifier
+
+
+class IdentifierService:
+    """
+    Numéros de tickets et de transactions sans collision
+
+    Format : préfixe + date AAAAMMJJ + compteur + chiffre de contrôle Luhn
+    (ex. TZ2026101700004217). Le compteur vient d'une séquence PostgreSQL :
+    nextval ne prend aucun verrou et n'est jamais annulé, deux appels ne
+    peuvent donc pas obtenir la même valeur, quel que soit le nombre de
+    processus. Les numéros croissent dans la journée et d'un jour à l'autre :
+    les insertions restent en fin de l'index unique.
+
+    Les anciens numéros aléatoires ont une autre longueur et ne peuvent
+    pas entrer en conflit avec les nouveaux.
+    """
+
+    TICKET = 'ticket_number'
+    TRANSACTION = 'transaction_id'
+
+    # (préfixe, chiffres du compteur) : 10**width numéros par jour
+    FORMATS = {
+        TICKET: ('TZ', 7),
+        TRANSACTION: ('PAY', 9),
+    }
+
+    @staticmethod
+    def sequence_name(kind):
+        return f'{kind}_seq'
+
+    @classmethod
+    def next_values(cls, kind, count=1):
+        """Réserver count valeurs du compteur (une requête)"""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT nextval(%s) FROM generate_series(1, %s)',
+                    [cls.sequence_name(kind), count]
+                )
+                return [row[0] for row in cursor.fetchall()]
+
+        # Repli sans séquence : la ligne reste verrouillée jusqu'à la fin de la
+        # transaction, acceptable sur SQLite où les écritures sont sérialisées
+        with transaction.atomic():
+            sequence, _ = IdentifierSequence.objects.select_for_update().get_or_create(name=kind)
+            IdentifierSequence.objects.filter(name=kind).update(value=F('value') + count)
+            return list(range(sequence.value + 1, sequence.value + count + 1))
+
+    @classmethod
+    def generate(cls, kind, count=1):
+        """Générer count identifiants distincts, dans l'ordre d'émission"""
+        prefix, width = cls.FORMATS[kind]
+        day = timezone.localdate()
+        return [format_identifier(prefix, day, value, width) for value in cls.next_values(kind, count)]
+
+    @classmethod
+    def generate_ticket_numbers(cls, count=1):
+        return cls.generate(cls.TICKET, count)
+
+    @classmethod
+    def generate_transaction_ids(cls, count=1):
+        return cls.generate(cls.TRANSACTION, count)
+
+    @classmethod
+    def is_valid(cls, kind, value):
+        """Contrôler la forme et le chiffre de contrôle (sans accès à la base)"""
+        prefix, width = cls.FORMATS[kind]
+        return is_valid_identifier(value, prefix, width)
@@ -0,0 +1,30 @@
+"""
+Signaux de l'application core
+"""
+from django.db import connections
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from apps.core.services import IdentifierService
+
+
+@receiver(post_migrate)
+def create_identifier_sequences(sender, using='default', **kwargs):
+    """
+    Créer les séquences d'IdentifierService après chaque migrate
+
+    Les bases construites sans migrations (réglages de test, --run-syncdb)
+    n'exécutent pas core/0002 : les séquences y seraient absentes.
+    """
+    if sender.name != 'apps.core':
+        return
+
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        for kind in IdentifierService.FORMATS:
+            cursor.execute(
+                f'CREATE SEQUENCE IF NOT EXISTS {IdentifierService.sequence_name(kind)} START 1 CACHE 1'
+            )
@@ -6,6 +6,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from apps.fleet.models import Vehicle
 from apps.fleet.serializers import (
@@ -14,6 +16,7 @@ from apps.fleet.serializers import (
     VehicleUpdateSerializer,
     VehicleListSerializer
 )
+from apps.trips.services import VehicleScheduleService
 from apps.users.permissions import IsApprovedCompagnie, CanManageVehicle
 from utils.pagination import StandardResultsSetPagination
 from django_filters.rest_framework import DjangoFilterBackend
@@ -83,12 +86,35 @@ class VehicleViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='available')
     def available(self, request):
-        """Liste des véhicules disponibles"""
+        """
+        Liste des véhicules disponibles
+        
+        Avec ?start=...&end=... (ISO 8601), seuls les véhicules sans voyage
+        sur ce créneau sont retournés.
+        """
         queryset = self.get_queryset().filter(
             status=Vehicle.ACTIVE,
             is_active=True
         )
         
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+        if start or end:
+            start = parse_datetime(start or '')
+            end = parse_datetime(end or '')
+            if not start or not end or end <= start:
+                return Response(
+                    {'error': 'start et end doivent être des dates ISO 8601 avec end > start'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end)
+            
+            queryset = VehicleScheduleService.free_vehicles(queryset, start, end)
+        
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = VehicleListSerializer(page, many=True)
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0002_alter_activitylog_tags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['created_at', 'id'], name='activity_lo_created_752cbe_idx'),
+        ),
+    ]
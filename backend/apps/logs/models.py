@@ -141,6 +141,7 @@ class ActivityLog(models.Model):
             models.Index(fields=['severity', 'created_at']),
             models.Index(fields=['ip_address', 'created_at']),
             models.Index(fields=['object_id', 'content_type']),
+            models.Index(fields=['created_at', 'id']),
         ]
         
     
@@ -21,7 +21,7 @@ class ActivityLogSerializer(serializers.ModelSerializer):
             'user_agent', 'content_type', 'object_id', 'severity',
             'severity_display', 'tags', 'created_at'
         ]
-        read_only_fields = '__all__'  # Tous les champs en lecture seule
+        read_only_fields = fields  # Tous les champs en lecture seule
 
 
 class ActivityLogCreateSerializer(serializers.Serializer):
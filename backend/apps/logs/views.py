@@ -26,6 +26,7 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['description', 'ip_address']
     ordering_fields = ['created_at', 'severity']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', '-id')
     
     @action(detail=False, methods=['get'], url_path='recent')
     def recent(self, request):
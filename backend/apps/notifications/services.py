@@ -0,0 +1,79 @@
+"""
+Services pour l'envoi des notifications
+"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from apps.notifications.models import Notification
+
+
+class NotificationDispatchService:
+    """
+    Envoi groupé de notifications email
+
+    Un lot partage une seule connexion SMTP et les notifications envoyées
+    sont marquées en une mise à jour. Les échecs sont confiés à la tâche
+    unitaire send_email_notification, qui gère les nouvelles tentatives.
+    """
+
+    @staticmethod
+    def build_email(notification, connection=None):
+        """Construire l'email d'une notification"""
+        if notification.html_content:
+            body = strip_tags(notification.html_content)
+        else:
+            body = notification.message
+
+        email = EmailMultiAlternatives(
+            subject=notification.title,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.recipient_email or notification.user.email],
+            connection=connection
+        )
+        if notification.html_content:
+            email.attach_alternative(notification.html_content, 'text/html')
+        return email
+
+    @classmethod
+    def send_email_batch(cls, notification_ids):
+        """
+        Envoyer un lot de notifications email en attente
+
+        Returns:
+            tuple: (identifiants envoyés, identifiants en échec)
+        """
+        from apps.notifications.tasks import send_email_notification
+
+        notifications = Notification.objects.filter(
+            id__in=notification_ids,
+            notification_type=Notification.EMAIL,
+            status=Notification.PENDING
+        ).select_related('user')
+
+        sent, failed = [], []
+        connection = get_connection()
+        try:
+            connection.open()
+            for notification in notifications:
+                try:
+                    cls.build_email(notification, connection).send()
+                    sent.append(notification.id)
+                except Exception:
+                    failed.append(notification.id)
+        finally:
+            connection.close()
+
+        now = timezone.now()
+        Notification.objects.filter(id__in=sent).update(
+            status=Notification.SENT,
+            sent_at=now,
+            updated_at=now
+        )
+
+        for notification_id in failed:
+            send_email_notification.delay(notification_id)
+
+        return sent, failed
@@ -4,6 +4,7 @@ Tâches Celery pour les notifications
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from apps.notifications.models import Notification
@@ -7,10 +7,15 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
 
+from utils.tracking import FieldTrackerMixin
 
-class Payment(models.Model):
+
+class Payment(FieldTrackerMixin, models.Model):
     """Paiement effectué par un voyageur"""
     
+    # Champs comparés par les signaux sans relire la ligne (utils.tracking)
+    tracked_fields = ('status',)
+    
     # Méthodes de paiement
     ORANGE_MONEY = 'orange_money'
     MTN_MONEY = 'mtn_money'
@@ -203,14 +208,10 @@ class Payment(models.Model):
     
     @staticmethod
     def generate_transaction_id():
-        """Génère un ID de transaction unique"""
-        import random
-        import string
-        from django.utils import timezone
+        """Génère un ID de transaction unique (séquence + chiffre de contrôle)"""
+        from apps.core.services import IdentifierService
         
-        date_part = timezone.now().strftime('%Y%m%d%H%M%S')
-        random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        return f"PAY{date_part}{random_part}"
+        return IdentifierService.generate_transaction_ids()[0]
     
     @property
     def is_successful(self):
@@ -12,6 +12,7 @@ from django.db import transaction
 from apps.payments.providers.base import BasePaymentProvider
 from apps.payments.models import Payment
 from apps.tickets.models import Ticket
+from apps.tickets.services import GroupBookingService
 from apps.logs.models import ActivityLog
 
 
@@ -206,6 +207,31 @@ class CinetPayProvider(BasePaymentProvider):
                 'data': {'error': str(e)}
             }
     
+    @staticmethod
+    def _flag_for_refund(payment, tickets):
+        """Signaler un paiement encaissé pour des tickets non confirmables"""
+        amount = sum((member.total_amount for member in tickets), Decimal('0'))
+        numbers = ', '.join(member.ticket_number for member in tickets)
+        
+        payment.notes = (
+            f"{payment.notes}\n" if payment.notes else ''
+        ) + f"Remboursement requis ({amount} XOF) : tickets non confirmables {numbers}"
+        
+        ActivityLog.objects.create(
+            user=payment.user,
+            action=ActivityLog.ADMIN_ACTION,
+            description=f"Paiement {payment.transaction_id} reçu pour des tickets expirés ou annulés : remboursement requis",
+            details={
+                'payment_id': str(payment.id),
+                'transaction_id': payment.transaction_id,
+                'refund_amount': str(amount),
+                'tickets': {str(member.id): member.status for member in tickets}
+            },
+            content_type='Payment',
+            object_id=str(payment.id),
+            severity=ActivityLog.SEVERITY_CRITICAL
+        )
+    
     def _mock_check_status(self, transaction_id):
         """
         Simuler la vérification de statut (mode développement)
@@ -281,23 +307,43 @@ class CinetPayProvider(BasePaymentProvider):
                     'message': 'Paiement déjà traité'
                 }
             
+            # Verrouiller les tickets de la réservation : l'expiration
+            # automatique (skip_locked) ne peut plus les modifier en parallèle
+            ticket = None
+            group = []
+            if hasattr(payment, 'ticket'):
+                ticket = Ticket.objects.select_for_update().get(pk=payment.ticket.pk)
+                if ticket.booking_group:
+                    group = list(
+                        Ticket.objects.select_for_update().filter(
+                            booking_group=ticket.booking_group
+                        ).exclude(pk=ticket.pk).order_by('pk')
+                    )
+            
             # Mettre à jour le statut selon la réponse CinetPay
             if cpm_trans_status == '00':  # Succès
                 payment.status = Payment.SUCCESS
                 payment.completed_at = timezone.now()
                 
-                # Confirmer le ticket associé
-                if hasattr(payment, 'ticket'):
-                    ticket = payment.ticket
+                # Confirmer le ticket associé (uniquement depuis « en attente »)
+                if ticket and ticket.status == Ticket.PENDING:
                     ticket.status = Ticket.CONFIRMED
                     ticket.confirmed_at = timezone.now()
                     ticket.is_paid = True
                     ticket.save()
                     
-                    # Générer le QR code
-                    from apps.tickets.services import TicketService
-                    ticket_service = TicketService()
-                    ticket_service.create_and_generate_qr(ticket)
+                    # Confirmer les autres tickets d'une réservation de groupe
+                    # (QR codes émis après validation par le pipeline Celery)
+                    GroupBookingService.confirm_members(ticket)
+                
+                # Paiement encaissé pour des places qui ne sont plus réservées
+                # (réservation expirée ou annulée) : à rembourser
+                lost = [
+                    member for member in ([ticket] if ticket else []) + group
+                    if member.status not in (Ticket.PENDING, Ticket.CONFIRMED)
+                ]
+                if lost:
+                    self._flag_for_refund(payment, lost)
                 
             elif cpm_trans_status in ['01', '02']:  # En cours
                 payment.status = Payment.PROCESSING
@@ -305,11 +351,13 @@ class CinetPayProvider(BasePaymentProvider):
             else:  # Échec
                 payment.status = Payment.FAILED
                 
-                # Libérer le siège si ticket existe
-                if hasattr(payment, 'ticket'):
-                    payment.ticket.status = Ticket.CANCELLED
-                    payment.ticket.trip.release_seats(1)
-                    payment.ticket.save()
+                # Libérer le siège si ticket existe (signal ticket_post_save)
+                if ticket and ticket.status == Ticket.PENDING:
+                    ticket.status = Ticket.CANCELLED
+                    ticket.save()
+                    
+                    # Libérer aussi les sièges du reste du groupe
+                    GroupBookingService.cancel_members(ticket, reason='Paiement échoué')
             
             # Sauvegarder la réponse du provider
             payment.provider_response = webhook_data
@@ -330,32 +378,7 @@ class CinetPayProvider(BasePaymentProvider):
                 severity=ActivityLog.SEVERITY_INFO if payment.status == Payment.SUCCESS else ActivityLog.SEVERITY_WARNING
             )
             
-            # Envoyer une notification
-            from apps.notifications.models import Notification
-            if payment.status == Payment.SUCCESS:
-                Notification.objects.create(
-                    user=payment.user,
-                    notification_type=Notification.EMAIL,
-                    category=Notification.PAYMENT_SUCCESS,
-                    title='Paiement réussi',
-                    message=f'Votre paiement de {payment.amount} FCFA a été effectué avec succès.',
-                    metadata={
-                        'payment_id': str(payment.id),
-                        'transaction_id': payment.transaction_id
-                    }
-                )
-            else:
-                Notification.objects.create(
-                    user=payment.user,
-                    notification_type=Notification.EMAIL,
-                    category=Notification.PAYMENT_FAILED,
-                    title='Paiement échoué',
-                    message=f'Votre paiement de {payment.amount} FCFA a échoué. Veuillez réessayer.',
-                    metadata={
-                        'payment_id': str(payment.id),
-                        'transaction_id': payment.transaction_id
-                    }
-                )
+            # Les notifications de succès/échec sont créées par payment_post_save
             
             return {
                 'success': True,
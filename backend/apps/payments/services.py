@@ -39,15 +39,17 @@ class PaymentService:
         from apps.core.models import PlatformSettings
         settings = PlatformSettings.load()
         
-        platform_commission = ticket.trip.company.calculate_commission(ticket.total_amount)
-        company_amount = ticket.total_amount - platform_commission
+        # Montant du ticket, ou du groupe pour une réservation de groupe
+        amount = ticket.payable_amount
+        platform_commission = ticket.trip.company.calculate_commission(amount)
+        company_amount = amount - platform_commission
         
         # Créer le paiement
         payment = Payment.objects.create(
             user=ticket.passenger,
             trip=ticket.trip,
             company=ticket.trip.company,
-            amount=ticket.total_amount,
+            amount=amount,
             platform_commission=platform_commission,
             company_amount=company_amount,
             payment_method=payment_method,
@@ -188,10 +190,9 @@ class PaymentService:
                 ticket = payment.ticket
                 ticket.status = Ticket.REFUNDED
                 ticket.refund_amount = refund_amount
-                ticket.save()
                 
-                # Libérer le siège
-                ticket.trip.release_seats(1)
+                # Libère aussi le siège (signal ticket_post_save)
+                ticket.save()
             
             # Logger
             ActivityLog.objects.create(
@@ -1,7 +1,7 @@
 """
 Signaux pour le modèle Payment
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from apps.payments.models import Payment
@@ -9,6 +9,19 @@ from apps.logs.models import ActivityLog
 from apps.notifications.models import Notification
 
 
+@receiver(pre_save, sender=Payment)
+def payment_pre_save(sender, instance, **kwargs):
+    """Dater la réussite du paiement (dans la même écriture)"""
+    
+    if (
+        not instance._state.adding
+        and instance.has_changed('status')
+        and instance.status == Payment.SUCCESS
+        and not instance.completed_at
+    ):
+        instance.completed_at = timezone.now()
+
+
 @receiver(post_save, sender=Payment)
 def payment_post_save(sender, instance, created, **kwargs):
     """Actions après création/modification d'un paiement"""
@@ -32,15 +45,10 @@ def payment_post_save(sender, instance, created, **kwargs):
         )
     
     else:
-        # Vérifier si le statut a changé
-        old_instance = Payment.objects.get(pk=instance.pk)
-        
-        if old_instance.status != instance.status:
+        # Vérifier si le statut a changé (état mémorisé au chargement)
+        if instance.has_changed('status'):
             # Logger le changement de statut
             if instance.status == Payment.SUCCESS:
-                instance.completed_at = timezone.now()
-                instance.save(update_fields=['completed_at'])
-                
                 ActivityLog.objects.create(
                     user=instance.user,
                     action=ActivityLog.PAYMENT_SUCCESS,
@@ -71,9 +79,10 @@ def payment_post_save(sender, instance, created, **kwargs):
                 )
                 
                 # Mettre à jour les statistiques de la compagnie
+                ticket = getattr(instance, 'ticket', None)
                 instance.company.increment_stats(
-                    ticket_count=1,
-                    revenue=float(instance.company_amount)
+                    ticket_count=ticket.get_group_tickets().count() if ticket else 1,
+                    revenue=instance.company_amount
                 )
                 
             elif instance.status == Payment.FAILED:
@@ -82,8 +82,8 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Vérifier que le ticket n'est pas déjà payé
-            if ticket.is_paid:
+            # Vérifier que le ticket (ou son groupe) n'est pas déjà payé
+            if ticket.get_group_tickets().filter(is_paid=True).exists():
                 return Response(
                     {'error': 'Ce ticket a déjà été payé'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -95,7 +95,7 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
                     user=request.user,
                     trip=ticket.trip,
                     company=ticket.trip.company,
-                    amount=ticket.total_amount,
+                    amount=ticket.payable_amount,
                     payment_method=payment_method,
                     phone_number=phone_number,
                     ip_address=self.get_client_ip(request),
@@ -47,7 +47,7 @@ class TicketAdmin(admin.ModelAdmin):
             'fields': ('payment',)
         }),
         ('QR Code', {
-            'fields': ('qr_code', 'qr_code_image'),
+            'fields': ('qr_status', 'qr_code', 'qr_code_image'),
             'classes': ('collapse',)
         }),
         ('Embarquement', {
@@ -69,7 +69,7 @@ class TicketAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = [
-        'ticket_number', 'total_amount', 'qr_code', 'qr_code_image',
+        'ticket_number', 'total_amount', 'qr_status', 'qr_code', 'qr_code_image',
         'boarding_time', 'boarded_by', 'cancelled_at',
         'created_at', 'updated_at', 'confirmed_at'
     ]
@@ -131,10 +131,18 @@ class TicketAdmin(admin.ModelAdmin):
     def confirm_tickets(self, request, queryset):
         """Confirmer les tickets"""
         from django.utils import timezone
+        from apps.tickets.services import TicketWalletService, QRCodeIssuanceService
         
-        updated = queryset.filter(status=Ticket.PENDING).update(
+        pending = queryset.filter(status=Ticket.PENDING)
+        TicketWalletService.mirror(pending.values('pk'), status=Ticket.CONFIRMED)
+        now = timezone.now()
+        updated = pending.update(
             status=Ticket.CONFIRMED,
-            confirmed_at=timezone.now()
+            confirmed_at=now,
+            qr_status=Ticket.QR_PENDING,
+            updated_at=now
         )
+        if updated:
+            QRCodeIssuanceService.schedule()
         self.message_user(request, f'{updated} ticket(s) confirmé(s)')
     confirm_tickets.short_description = 'Confirmer les tickets en attente'
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Commande de vérification des bitmaps d'occupation des sièges
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.trips.models import Trip
+from apps.tickets.services import SeatMapService
+
+
+class Command(BaseCommand):
+    help = 'Compare les bitmaps de sièges en cache avec la table tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, help='Vérifier un seul voyage')
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Reconstruire les bitmaps incohérents depuis la table tickets',
+        )
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.select_related('vehicle')
+        if options['trip']:
+            trips = trips.filter(pk=options['trip'])
+        else:
+            trips = trips.filter(
+                status__in=[Trip.SCHEDULED, Trip.BOARDING],
+                departure_datetime__gte=timezone.now()
+            )
+
+        checked = inconsistent = repaired = 0
+
+        for trip in trips.iterator():
+            report = SeatMapService.check(trip)
+            if report is None:
+                continue
+            checked += 1
+
+            if report['missing'] or report['extra']:
+                inconsistent += 1
+                self.stdout.write(self.style.WARNING(
+                    f'⚠️  Voyage {trip.pk} : manquants {report["missing"]}, en trop {report["extra"]}'
+                ))
+                if options['repair']:
+                    SeatMapService.rebuild(trip)
+                    repaired += 1
+
+            # Le compteur du voyage doit correspondre aux sièges occupés
+            if trip.total_seats - trip.available_seats != report['occupied']:
+                self.stdout.write(self.style.WARNING(
+                    f'⚠️  Voyage {trip.pk} : {trip.total_seats - trip.available_seats} place(s) '
+                    f'décomptée(s) pour {report["occupied"]} siège(s) occupé(s)'
+                ))
+
+        self.stdout.write(f'\n📊 {checked} bitmap(s) vérifié(s), {inconsistent} incohérent(s)')
+        if options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'✅ {repaired} bitmap(s) reconstruit(s)'))
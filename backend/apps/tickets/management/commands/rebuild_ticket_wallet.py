@@ -0,0 +1,14 @@
+"""
+Commande pour reconstruire les portefeuilles de tickets des voyageurs
+"""
+from django.core.management.base import BaseCommand
+from apps.tickets.services import TicketWalletService
+
+
+class Command(BaseCommand):
+    help = 'Réécrit la projection des tickets (mes tickets, à venir, historique) depuis la table tickets'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Reconstruction des portefeuilles de tickets...')
+        count = TicketWalletService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} ticket(s) projeté(s)'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='booking_group',
+            field=models.UUIDField(blank=True, db_index=True, null=True, verbose_name='groupe de réservation'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+        ('tickets', '0003_ticket_booking_group'),
+        ('trips', '0002_trip_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='ticket',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'confirmed', 'used'])), fields=('trip', 'seat_number'), name='unique_active_seat_per_trip'),
+        ),
+    ]
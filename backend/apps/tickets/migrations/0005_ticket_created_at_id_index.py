@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+        ('tickets', '0004_ticket_unique_active_seat'),
+        ('trips', '0002_trip_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at', 'id'], name='tickets_created_6039f7_idx'),
+        ),
+    ]
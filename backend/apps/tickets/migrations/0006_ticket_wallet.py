@@ -0,0 +1,78 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketWallet = apps.get_model('tickets', 'TicketWallet')
+
+    rows = Ticket.objects.order_by('created_at', 'id').values_list(
+        'id', 'passenger_id', 'trip_id', 'ticket_number',
+        'trip__departure_city__name', 'trip__arrival_city__name', 'trip__departure_datetime',
+        'seat_number', 'total_amount', 'status', 'is_paid', 'created_at'
+    )
+
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TicketWallet(
+            ticket_id=row[0],
+            passenger_id=row[1],
+            trip_id=row[2],
+            ticket_number=row[3],
+            departure_city_name=row[4],
+            arrival_city_name=row[5],
+            departure_datetime=row[6],
+            seat_number=row[7],
+            total_amount=row[8],
+            status=row[9],
+            is_paid=row[10],
+            created_at=row[11]
+        ))
+        if len(batch) == BATCH_SIZE:
+            TicketWallet.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        TicketWallet.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_ticket_created_at_id_index'),
+        ('trips', '0005_city_popularity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketWallet',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wallet_entry', serialize=False, to='tickets.ticket', verbose_name='ticket')),
+                ('ticket_number', models.CharField(max_length=20, verbose_name='numéro de ticket')),
+                ('departure_city_name', models.CharField(max_length=100, verbose_name='ville de départ')),
+                ('arrival_city_name', models.CharField(max_length=100, verbose_name="ville d'arrivée")),
+                ('departure_datetime', models.DateTimeField(verbose_name='date/heure de départ')),
+                ('seat_number', models.CharField(max_length=10, verbose_name='numéro de siège')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='montant total')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('confirmed', 'Confirmé'), ('cancelled', 'Annulé'), ('used', 'Utilisé'), ('expired', 'Expiré'), ('refunded', 'Remboursé')], max_length=20, verbose_name='statut')),
+                ('is_paid', models.BooleanField(default=False, verbose_name='payé')),
+                ('created_at', models.DateTimeField(verbose_name='créé le')),
+                ('passenger', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='passager')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.trip', verbose_name='voyage')),
+            ],
+            options={
+                'verbose_name': 'portefeuille de tickets',
+                'verbose_name_plural': 'portefeuilles de tickets',
+                'db_table': 'ticket_wallet',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['passenger', 'departure_datetime'], name='ticket_wallet_departure_idx'), models.Index(fields=['passenger', '-created_at'], name='ticket_wallet_created_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+
+    # QR code déjà émis ; les tickets confirmés sans QR code passent dans la file
+    Ticket.objects.exclude(qr_code='').update(qr_status='ready')
+    Ticket.objects.filter(status='confirmed', qr_code='').update(qr_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+        ('tickets', '0006_ticket_wallet'),
+        ('trips', '0005_city_popularity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='qr_status',
+            field=models.CharField(choices=[('none', 'Non émis'), ('pending', 'En préparation'), ('ready', 'Prêt'), ('failed', 'Échec')], default='none', max_length=10, verbose_name='état du QR code'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('qr_status', 'pending')), fields=['confirmed_at'], name='ticket_qr_pending_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+        ('tickets', '0007_ticket_qr_status'),
+        ('trips', '0005_city_popularity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['trip', 'updated_at'], name='ticket_trip_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticket_trip_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='qr_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='tentatives QR code'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('qr_status', 'failed')), fields=['updated_at'], name='ticket_qr_failed_idx'),
+        ),
+    ]
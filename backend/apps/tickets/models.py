@@ -7,10 +7,15 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
 
+from utils.tracking import FieldTrackerMixin
 
-class Ticket(models.Model):
+
+class Ticket(FieldTrackerMixin, models.Model):
     """Ticket de voyage"""
     
+    # Champs comparés par les signaux sans relire la ligne (utils.tracking)
+    tracked_fields = ('status', 'seat_number', 'is_paid', 'total_amount')
+    
     # Statuts
     PENDING = 'pending'
     CONFIRMED = 'confirmed'
@@ -28,6 +33,19 @@ class Ticket(models.Model):
         (REFUNDED, _('Remboursé')),
     ]
     
+    # Émission du QR code (pipeline Celery, hors requête)
+    QR_NONE = 'none'
+    QR_PENDING = 'pending'
+    QR_READY = 'ready'
+    QR_FAILED = 'failed'
+    
+    QR_STATUS_CHOICES = [
+        (QR_NONE, _('Non émis')),
+        (QR_PENDING, _('En préparation')),
+        (QR_READY, _('Prêt')),
+        (QR_FAILED, _('Échec')),
+    ]
+    
     # Identifiants uniques
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     ticket_number = models.CharField(
@@ -110,6 +128,14 @@ class Ticket(models.Model):
     
     is_paid = models.BooleanField(_('payé'), default=False, db_index=True)
     
+    # Réservation de groupe (tickets réservés et payés ensemble)
+    booking_group = models.UUIDField(
+        _('groupe de réservation'),
+        null=True,
+        blank=True,
+        db_index=True
+    )
+    
     # QR Code
     qr_code = models.TextField(_('QR code'), blank=True)
     qr_code_image = models.ImageField(
@@ -118,6 +144,13 @@ class Ticket(models.Model):
         null=True,
         blank=True
     )
+    qr_status = models.CharField(
+        _('état du QR code'),
+        max_length=10,
+        choices=QR_STATUS_CHOICES,
+        default=QR_NONE
+    )
+    qr_attempts = models.PositiveSmallIntegerField(_('tentatives QR code'), default=0)
     
     # Embarquement
     boarding_time = models.DateTimeField(_('heure embarquement'), null=True, blank=True)
@@ -160,9 +193,30 @@ class Ticket(models.Model):
             models.Index(fields=['passenger', 'status']),
             models.Index(fields=['status', 'is_paid']),
             models.Index(fields=['trip', 'seat_number']),
+            models.Index(fields=['created_at', 'id']),
+            # Manifeste d'embarquement : changements d'un voyage depuis une version
+            models.Index(fields=['trip', 'updated_at'], name='ticket_trip_updated_idx'),
+            # File d'attente du pipeline QR (seuls les tickets en attente sont indexés)
+            models.Index(
+                fields=['confirmed_at'],
+                condition=models.Q(qr_status='pending'),
+                name='ticket_qr_pending_idx'
+            ),
+            # Reprise des QR codes en échec
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(qr_status='failed'),
+                name='ticket_qr_failed_idx'
+            ),
         ]
-        unique_together = [
-            ['trip', 'seat_number'],
+        constraints = [
+            # Un siège ne peut être tenu que par un seul ticket actif
+            # (les tickets annulés/expirés/remboursés libèrent le siège)
+            models.UniqueConstraint(
+                fields=['trip', 'seat_number'],
+                condition=models.Q(status__in=['pending', 'confirmed', 'used']),
+                name='unique_active_seat_per_trip'
+            ),
         ]
     
     def __str__(self):
@@ -180,14 +234,10 @@ class Ticket(models.Model):
     
     @staticmethod
     def generate_ticket_number():
-        """Génère un numéro de ticket unique"""
-        import random
-        import string
-        from django.utils import timezone
+        """Génère un numéro de ticket unique (séquence + chiffre de contrôle)"""
+        from apps.core.services import IdentifierService
         
-        date_part = timezone.now().strftime('%Y%m%d')
-        random_part = ''.join(random.choices(string.digits, k=6))
-        return f"TZ{date_part}{random_part}"
+        return IdentifierService.generate_ticket_numbers()[0]
     
     @property
     def is_valid(self):
@@ -218,4 +268,72 @@ class Ticket(models.Model):
     
     @property
     def passenger_full_name(self):
-        return f"{self.passenger_first_name} {self.passenger_last_name}"
\ No newline at end of file
+        return f"{self.passenger_first_name} {self.passenger_last_name}"
+    
+    def get_group_tickets(self):
+        """Tickets de la même réservation (le ticket seul hors groupe)"""
+        if not self.booking_group:
+            return Ticket.objects.filter(pk=self.pk)
+        return Ticket.objects.filter(booking_group=self.booking_group)
+    
+    @property
+    def payable_amount(self):
+        """Montant à payer (total du groupe pour une réservation de groupe)"""
+        if not self.booking_group:
+            return self.total_amount
+        return self.get_group_tickets().aggregate(total=models.Sum('total_amount'))['total']
+
+
+
+class TicketWallet(models.Model):
+    """
+    Portefeuille dénormalisé des tickets d'un voyageur
+
+    Une ligne par ticket, avec le trajet et l'heure de départ en clair :
+    mes tickets, à venir et historique sont des lectures de l'index
+    (passager, départ) sans jointure. Tenu à jour par TicketWalletService.
+    """
+    
+    ticket = models.OneToOneField(
+        Ticket,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='wallet_entry',
+        verbose_name=_('ticket')
+    )
+    passenger = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name=_('passager')
+    )
+    trip = models.ForeignKey(
+        'trips.Trip',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('voyage')
+    )
+    
+    ticket_number = models.CharField(_('numéro de ticket'), max_length=20)
+    departure_city_name = models.CharField(_('ville de départ'), max_length=100)
+    arrival_city_name = models.CharField(_('ville d\'arrivée'), max_length=100)
+    departure_datetime = models.DateTimeField(_('date/heure de départ'))
+    seat_number = models.CharField(_('numéro de siège'), max_length=10)
+    total_amount = models.DecimalField(_('montant total'), max_digits=10, decimal_places=2)
+    status = models.CharField(_('statut'), max_length=20, choices=Ticket.STATUS_CHOICES)
+    is_paid = models.BooleanField(_('payé'), default=False)
+    created_at = models.DateTimeField(_('créé le'))
+    
+    class Meta:
+        db_table = 'ticket_wallet'
+        verbose_name = _('portefeuille de tickets')
+        verbose_name_plural = _('portefeuilles de tickets')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['passenger', 'departure_datetime'], name='ticket_wallet_departure_idx'),
+            models.Index(fields=['passenger', '-created_at'], name='ticket_wallet_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ticket_number} ({self.passenger_id})"
@@ -2,8 +2,12 @@
 Serializers pour les tickets
 """
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from apps.tickets.models import Ticket
+from apps.tickets.models import Ticket, TicketWallet
+from apps.tickets.services import SeatMapService, GroupBookingService
+from apps.trips.models import Trip
+from apps.trips.services import SeatInventory
 from apps.trips.serializers import TripListSerializer
 from apps.payments.serializers import PaymentDetailSerializer
 
@@ -25,19 +29,6 @@ class TicketCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Ce voyage ne peut pas être réservé.')
         return value
     
-    def validate_seat_number(self, value):
-        """Valider la disponibilité du siège"""
-        trip = self.initial_data.get('trip')
-        if trip:
-            # Vérifier si le siège est déjà réservé
-            if Ticket.objects.filter(
-                trip_id=trip,
-                seat_number=value,
-                status__in=[Ticket.PENDING, Ticket.CONFIRMED]
-            ).exists():
-                raise serializers.ValidationError('Ce siège est déjà réservé.')
-        return value
-    
     def validate(self, attrs):
         """Validations croisées"""
         # Vérifier qu'il reste des places
@@ -46,6 +37,17 @@ class TicketCreateSerializer(serializers.ModelSerializer):
                 'trip': 'Il n\'y a plus de places disponibles pour ce voyage.'
             })
         
+        # Vérifier la disponibilité du siège (bitmap d'occupation du voyage)
+        bitmap = SeatMapService.get_bitmap(attrs['trip'])
+        if attrs['seat_number'] not in bitmap:
+            raise serializers.ValidationError({
+                'seat_number': 'Ce siège n\'existe pas dans ce véhicule.'
+            })
+        if bitmap.is_occupied(attrs['seat_number']):
+            raise serializers.ValidationError({
+                'seat_number': 'Ce siège est déjà réservé.'
+            })
+        
         return attrs
     
     def create(self, validated_data):
@@ -63,10 +65,113 @@ class TicketCreateSerializer(serializers.ModelSerializer):
             validated_data['price'] * settings.default_commission_rate / 100
         )
         
-        ticket = Ticket.objects.create(**validated_data)
+        # La réservation de place (signal) est atomique : si le voyage s'est
+        # rempli entre la validation et la création, le ticket est annulé
+        try:
+            with transaction.atomic():
+                ticket = Ticket.objects.create(**validated_data)
+        except SeatInventory.Unavailable:
+            raise serializers.ValidationError({
+                'trip': 'Il n\'y a plus de places disponibles pour ce voyage.'
+            })
+        except IntegrityError:
+            raise serializers.ValidationError({
+                'seat_number': 'Ce siège vient d\'être réservé.'
+            })
         return ticket
 
 
+class GroupPassengerSerializer(serializers.ModelSerializer):
+    """Passager d'une réservation de groupe"""
+    
+    class Meta:
+        model = Ticket
+        fields = [
+            'passenger_first_name', 'passenger_last_name',
+            'passenger_phone', 'passenger_email', 'passenger_id_number',
+            'seat_number'
+        ]
+
+
+class GroupBookingSerializer(serializers.Serializer):
+    """Serializer pour réserver plusieurs sièges en une seule requête"""
+    
+    trip = serializers.PrimaryKeyRelatedField(queryset=Trip.objects.select_related('vehicle'))
+    passengers = GroupPassengerSerializer(many=True)
+    
+    def validate_trip(self, value):
+        """Valider que le voyage peut être réservé"""
+        if not value.can_be_booked:
+            raise serializers.ValidationError('Ce voyage ne peut pas être réservé.')
+        return value
+    
+    def validate_passengers(self, value):
+        """Valider le nombre de passagers et l'unicité des sièges"""
+        from apps.core.models import PlatformSettings
+        max_tickets = PlatformSettings.load().max_tickets_per_booking
+        
+        if not value:
+            raise serializers.ValidationError('Au moins un passager est requis.')
+        if len(value) > max_tickets:
+            raise serializers.ValidationError(
+                f'Maximum {max_tickets} tickets par réservation.'
+            )
+        
+        seat_numbers = [passenger['seat_number'] for passenger in value]
+        if len(set(seat_numbers)) != len(seat_numbers):
+            raise serializers.ValidationError('Un même siège est demandé plusieurs fois.')
+        
+        return value
+    
+    def validate(self, attrs):
+        """Validations croisées"""
+        trip = attrs['trip']
+        
+        if trip.available_seats < len(attrs['passengers']):
+            raise serializers.ValidationError({
+                'trip': 'Il n\'y a pas assez de places disponibles pour ce voyage.'
+            })
+        
+        # Disponibilité des sièges (bitmap d'occupation du voyage)
+        bitmap = SeatMapService.get_bitmap(trip)
+        unknown = [p['seat_number'] for p in attrs['passengers'] if p['seat_number'] not in bitmap]
+        if unknown:
+            raise serializers.ValidationError({
+                'passengers': f'Siège(s) inexistant(s) : {", ".join(unknown)}'
+            })
+        
+        taken = [p['seat_number'] for p in attrs['passengers'] if bitmap.is_occupied(p['seat_number'])]
+        if taken:
+            raise serializers.ValidationError({
+                'passengers': f'Siège(s) déjà réservé(s) : {", ".join(taken)}'
+            })
+        
+        return attrs
+    
+    def create(self, validated_data):
+        """Créer les tickets du groupe"""
+        request = self.context.get('request')
+        
+        from apps.core.models import PlatformSettings
+        settings = PlatformSettings.load()
+        
+        try:
+            return GroupBookingService.book(
+                trip=validated_data['trip'],
+                user=request.user,
+                passengers=validated_data['passengers'],
+                platform_fee_rate=settings.default_commission_rate
+            )
+        except SeatInventory.Unavailable:
+            raise serializers.ValidationError({
+                'trip': 'Il n\'y a pas assez de places disponibles pour ce voyage.'
+            })
+        except GroupBookingService.SeatTaken:
+            raise serializers.ValidationError({
+                'passengers': 'Un des sièges vient d\'être réservé.'
+            })
+
+
 class TicketDetailSerializer(serializers.ModelSerializer):
     """Serializer détaillé pour un ticket"""
     
@@ -84,7 +189,7 @@ class TicketDetailSerializer(serializers.ModelSerializer):
             'passenger_last_name', 'passenger_full_name', 'passenger_phone',
             'passenger_email', 'passenger_id_number', 'seat_number',
             'price', 'platform_fee', 'total_amount', 'status',
-            'status_display', 'payment', 'is_paid', 'qr_code',
+            'status_display', 'payment', 'is_paid', 'qr_status', 'qr_code',
             'qr_code_image', 'boarding_time', 'boarded_by',
             'cancelled_at', 'cancellation_reason', 'refund_amount',
             'notes', 'is_valid', 'can_be_cancelled', 'created_at',
@@ -93,7 +198,7 @@ class TicketDetailSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id', 'ticket_number', 'total_amount', 'status_display',
             'is_valid', 'can_be_cancelled', 'passenger_full_name',
-            'qr_code', 'qr_code_image', 'created_at', 'updated_at',
+            'qr_status', 'qr_code', 'qr_code_image', 'created_at', 'updated_at',
             'confirmed_at'
         ]
 
@@ -115,6 +220,23 @@ class TicketListSerializer(serializers.ModelSerializer):
         ]
 
 
+class TicketWalletSerializer(serializers.ModelSerializer):
+    """Portefeuille du voyageur (mêmes champs que TicketListSerializer, sans jointure)"""
+    
+    id = serializers.UUIDField(source='ticket_id', read_only=True)
+    departure_city = serializers.CharField(source='departure_city_name', read_only=True)
+    arrival_city = serializers.CharField(source='arrival_city_name', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = TicketWallet
+        fields = [
+            'id', 'ticket_number', 'departure_city', 'arrival_city',
+            'departure_datetime', 'seat_number', 'total_amount',
+            'status', 'status_display', 'is_paid', 'created_at'
+        ]
+
+
 class TicketCancellationSerializer(serializers.Serializer):
     """Serializer pour annuler un ticket"""
     
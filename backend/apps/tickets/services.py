@@ -0,0 +1,733 @@
+"""
+Services pour la gestion des tickets
+"""
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.core.services import IdentifierService
+from apps.tickets.models import Ticket, TicketWallet
+from apps.logs.models import ActivityLog
+from apps.trips.models import Trip
+from apps.trips.services import SeatInventory, CityPopularityService
+from utils.qr_generator import get_qr_generator
+from utils.seat_bitmap import SeatBitmap
+
+
+class SeatMapService:
+    """
+    Bitmap d'occupation des sièges par voyage (en cache)
+
+    Reconstruit depuis la table tickets en cas d'absence, puis tenu à jour
+    à chaque transition de ticket. Chaque transition validée incrémente la
+    génération du voyage ; une entrée n'est lue que si sa génération est la
+    génération courante. Une reconstruction concurrente d'une écriture, ou
+    une mise à jour qui n'obtient pas le verrou, laisse donc une entrée
+    périmée qui sera reconstruite au prochain accès, jamais un bitmap faux.
+    """
+
+    # Statuts qui occupent un siège
+    OCCUPYING_STATUSES = [Ticket.PENDING, Ticket.CONFIRMED, Ticket.USED]
+
+    CACHE_KEY = 'seat_bitmap:{trip_id}'
+    GENERATION_KEY = 'seat_bitmap_generation:{trip_id}'
+    LOCK_KEY = 'seat_bitmap_lock:{trip_id}'
+    TIMEOUT = 60 * 10
+    GENERATION_TIMEOUT = 60 * 60 * 24 * 7
+    LOCK_TIMEOUT = 5
+
+    @classmethod
+    def _cache_key(cls, trip_id):
+        return cls.CACHE_KEY.format(trip_id=trip_id)
+
+    @classmethod
+    def _generation_key(cls, trip_id):
+        return cls.GENERATION_KEY.format(trip_id=trip_id)
+
+    @staticmethod
+    def _initial_generation():
+        # Basée sur l'horloge : une génération évincée du cache ne peut pas
+        # retomber sur celle d'une entrée encore présente
+        return int(time.time() * 1000)
+
+    @classmethod
+    def _generation(cls, trip_id):
+        key = cls._generation_key(trip_id)
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, cls._initial_generation(), cls.GENERATION_TIMEOUT)
+            generation = cache.get(key)
+        return generation
+
+    @classmethod
+    def _bump_generation(cls, trip_id):
+        key = cls._generation_key(trip_id)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            generation = cls._initial_generation()
+            cache.set(key, generation, cls.GENERATION_TIMEOUT)
+            return generation
+
+    @staticmethod
+    def _seat_map(trip, seat_map=None):
+        return seat_map if seat_map is not None else trip.vehicle.get_seat_map()
+
+    @classmethod
+    def load_occupied(cls, trip_id):
+        """Sièges occupés d'un voyage d'après la table tickets"""
+        return Ticket.objects.filter(
+            trip_id=trip_id,
+            status__in=cls.OCCUPYING_STATUSES
+        ).values_list('seat_number', flat=True)
+
+    @classmethod
+    def build(cls, trip, seat_map=None):
+        """Construire le bitmap depuis la base (sans le mettre en cache)"""
+        bitmap = SeatBitmap.from_seat_map(cls._seat_map(trip, seat_map))
+        for seat_number in cls.load_occupied(trip.pk):
+            if seat_number in bitmap:
+                bitmap.occupy(seat_number)
+        return bitmap
+
+    @classmethod
+    def _store(cls, trip, bitmap, generation):
+        cache.set(
+            cls._cache_key(trip.pk),
+            {'vehicle_id': trip.vehicle_id, 'bits': bitmap.bits, 'generation': generation},
+            cls.TIMEOUT
+        )
+
+    @classmethod
+    def _is_current(cls, cached, trip, generation):
+        return (
+            cached is not None
+            and cached['vehicle_id'] == trip.vehicle_id
+            and cached.get('generation') == generation
+        )
+
+    @classmethod
+    def rebuild(cls, trip, seat_map=None, generation=None):
+        """Reconstruire et mettre en cache le bitmap d'un voyage"""
+        # Génération lue avant la base : une écriture validée pendant la
+        # lecture l'incrémente et rend l'entrée stockée périmée
+        if generation is None:
+            generation = cls._generation(trip.pk)
+        bitmap = cls.build(trip, seat_map)
+        cls._store(trip, bitmap, generation)
+        return bitmap
+
+    @classmethod
+    def get_bitmap(cls, trip, seat_map=None):
+        """Bitmap d'occupation d'un voyage (cache, sinon reconstruction)"""
+        key, generation_key = cls._cache_key(trip.pk), cls._generation_key(trip.pk)
+        values = cache.get_many([key, generation_key])
+        generation = values.get(generation_key)
+        if generation is None:
+            generation = cls._generation(trip.pk)
+
+        cached = values.get(key)
+        if not cls._is_current(cached, trip, generation):
+            return cls.rebuild(trip, seat_map, generation)
+        return SeatBitmap.from_seat_map(cls._seat_map(trip, seat_map), cached['bits'])
+
+    @classmethod
+    def invalidate(cls, trip_id):
+        """Supprimer le bitmap en cache (reconstruit au prochain accès)"""
+        cache.delete(cls._cache_key(trip_id))
+
+    @classmethod
+    def _apply(cls, trip, occupy=(), release=()):
+        # Toute entrée antérieure devient périmée, même si la mise à jour
+        # incrémentale ci-dessous n'a pas lieu
+        generation = cls._bump_generation(trip.pk)
+
+        lock_key = cls.LOCK_KEY.format(trip_id=trip.pk)
+        if not cache.add(lock_key, 1, cls.LOCK_TIMEOUT):
+            return
+
+        try:
+            # Mise à jour incrémentale seulement si l'entrée reflète toutes
+            # les transitions précédentes
+            cached = cache.get(cls._cache_key(trip.pk))
+            if not cls._is_current(cached, trip, generation - 1):
+                return
+
+            bitmap = SeatBitmap.from_seat_map(cls._seat_map(trip), cached['bits'])
+            for seat_number in release:
+                if seat_number in bitmap:
+                    bitmap.release(seat_number)
+            for seat_number in occupy:
+                if seat_number in bitmap:
+                    bitmap.occupy(seat_number)
+            cls._store(trip, bitmap, generation)
+        finally:
+            cache.delete(lock_key)
+
+    @classmethod
+    def update(cls, trip, occupy=(), release=()):
+        """Appliquer des mouvements de sièges après validation de la transaction"""
+        transaction.on_commit(lambda: cls._apply(trip, occupy, release))
+
+    @classmethod
+    def record_transition(cls, ticket, old_status, old_seat_number=None):
+        """Répercuter un changement de statut ou de siège d'un ticket"""
+        was_occupying = old_status in cls.OCCUPYING_STATUSES
+        is_occupying = ticket.status in cls.OCCUPYING_STATUSES
+        old_seat_number = old_seat_number or ticket.seat_number
+
+        occupy, release = [], []
+        if was_occupying and (not is_occupying or old_seat_number != ticket.seat_number):
+            release.append(old_seat_number)
+        if is_occupying and (not was_occupying or old_seat_number != ticket.seat_number):
+            occupy.append(ticket.seat_number)
+
+        if occupy or release:
+            cls.update(ticket.trip, occupy=occupy, release=release)
+
+    @classmethod
+    def check(cls, trip):
+        """
+        Comparer le bitmap en cache avec la table tickets
+
+        Returns:
+            dict: sièges manquants/en trop dans le cache, ou None si absent du cache
+        """
+        cached = cache.get(cls._cache_key(trip.pk))
+        if not cls._is_current(cached, trip, cls._generation(trip.pk)):
+            return None
+
+        seat_map = trip.vehicle.get_seat_map()
+        expected = cls.build(trip, seat_map)
+        actual = SeatBitmap.from_seat_map(seat_map, cached['bits'])
+
+        return {
+            'missing': [n for n in expected.occupied_numbers() if not actual.is_occupied(n)],
+            'extra': [n for n in actual.occupied_numbers() if not expected.is_occupied(n)],
+            'occupied': expected.occupied_count,
+        }
+
+
+class TicketWalletService:
+    """
+    Projection des tickets dans le portefeuille des voyageurs (TicketWallet)
+
+    Les lignes sont écrites à la création des tickets, puis mises à jour
+    champ par champ : sauvegardes de tickets (signal), mises à jour
+    ensemblistes (mirror), changement d'horaire ou de trajet d'un voyage
+    et renommage de ville.
+    """
+
+    # Champs recopiés du ticket, mis à jour à chaque modification
+    TICKET_FIELDS = ('status', 'seat_number', 'is_paid', 'total_amount')
+
+    UPSERT_FIELDS = (
+        'passenger', 'trip', 'ticket_number', 'departure_city_name', 'arrival_city_name',
+        'departure_datetime', 'seat_number', 'total_amount', 'status', 'is_paid', 'created_at'
+    )
+
+    @staticmethod
+    def entry_for(ticket):
+        trip = ticket.trip
+        return TicketWallet(
+            ticket_id=ticket.pk,
+            passenger_id=ticket.passenger_id,
+            trip_id=trip.pk,
+            ticket_number=ticket.ticket_number,
+            departure_city_name=trip.departure_city.name,
+            arrival_city_name=trip.arrival_city.name,
+            departure_datetime=trip.departure_datetime,
+            seat_number=ticket.seat_number,
+            total_amount=ticket.total_amount,
+            status=ticket.status,
+            is_paid=ticket.is_paid,
+            created_at=ticket.created_at
+        )
+
+    @classmethod
+    def add(cls, tickets):
+        """Écrire (ou réécrire) les lignes de tickets en une insertion"""
+        TicketWallet.objects.bulk_create(
+            [cls.entry_for(ticket) for ticket in tickets],
+            update_conflicts=True,
+            unique_fields=['ticket'],
+            update_fields=list(cls.UPSERT_FIELDS)
+        )
+
+    @classmethod
+    def record_change(cls, ticket, update_fields=None):
+        """Répercuter une sauvegarde de ticket (champs suivis modifiés uniquement)"""
+        changed = {
+            name: getattr(ticket, name)
+            for name in cls.TICKET_FIELDS
+            if (update_fields is None or name in update_fields) and ticket.has_changed(name)
+        }
+        if not changed:
+            return
+
+        # Ligne absente (ticket antérieur à la projection) : la recréer en entier
+        if not TicketWallet.objects.filter(ticket_id=ticket.pk).update(**changed):
+            cls.add([ticket])
+
+    @staticmethod
+    def mirror(ticket_ids, **fields):
+        """
+        Répercuter une mise à jour ensembliste des tickets
+
+        Args:
+            ticket_ids: liste d'identifiants ou queryset values('pk')
+            fields: champs de TICKET_FIELDS et leurs nouvelles valeurs
+        """
+        return TicketWallet.objects.filter(ticket_id__in=ticket_ids).update(**fields)
+
+    @staticmethod
+    def sync_trip(trip):
+        """Recopier le trajet et l'horaire d'un voyage dans ses lignes"""
+        return TicketWallet.objects.filter(trip_id=trip.pk).update(
+            departure_city_name=trip.departure_city.name,
+            arrival_city_name=trip.arrival_city.name,
+            departure_datetime=trip.departure_datetime
+        )
+
+    @staticmethod
+    def rename_city(city):
+        """Recopier le nouveau nom d'une ville"""
+        TicketWallet.objects.filter(trip__departure_city_id=city.pk).exclude(
+            departure_city_name=city.name
+        ).update(departure_city_name=city.name)
+        TicketWallet.objects.filter(trip__arrival_city_id=city.pk).exclude(
+            arrival_city_name=city.name
+        ).update(arrival_city_name=city.name)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Réécrire toutes les lignes depuis la table tickets
+
+        Returns:
+            int: nombre de tickets projetés
+        """
+        tickets = Ticket.objects.select_related(
+            'trip__departure_city', 'trip__arrival_city'
+        ).order_by('created_at', 'id')
+
+        count = 0
+        batch = []
+        for ticket in tickets.iterator(chunk_size=batch_size):
+            batch.append(ticket)
+            if len(batch) == batch_size:
+                cls.add(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cls.add(batch)
+            count += len(batch)
+        return count
+
+
+class GroupBookingService:
+    """
+    Réservation de plusieurs sièges en une seule transaction
+
+    Un seul décrément d'inventaire de N places, puis insertion groupée des
+    tickets et des journaux (bulk_create, sans signal par ticket).
+    Le paiement est initialisé une seule fois sur le ticket principal,
+    pour le montant total du groupe.
+    """
+
+    class SeatTaken(Exception):
+        """Un des sièges a été pris par une réservation concurrente"""
+
+    @staticmethod
+    def book(trip, user, passengers, platform_fee_rate):
+        """
+        Réserver les sièges d'un groupe
+
+        Args:
+            trip: Voyage réservé
+            user: Voyageur qui réserve
+            passengers: liste de dicts (informations passager + seat_number)
+            platform_fee_rate: taux de frais plateforme (%)
+
+        Returns:
+            list: Tickets créés (le premier est le ticket principal)
+
+        Raises:
+            SeatInventory.Unavailable: places insuffisantes
+            GroupBookingService.SeatTaken: siège déjà réservé
+        """
+        group_id = uuid.uuid4()
+        price = trip.base_price
+        platform_fee = (price * platform_fee_rate / 100).quantize(Decimal('0.01'))
+
+        with transaction.atomic():
+            if not SeatInventory.reserve(trip, len(passengers)):
+                raise SeatInventory.Unavailable(trip.pk)
+
+            ticket_numbers = IdentifierService.generate_ticket_numbers(len(passengers))
+            tickets = [
+                Ticket(
+                    ticket_number=ticket_number,
+                    trip=trip,
+                    passenger=user,
+                    price=price,
+                    platform_fee=platform_fee,
+                    total_amount=price + platform_fee,
+                    booking_group=group_id,
+                    **data
+                )
+                for ticket_number, data in zip(ticket_numbers, passengers)
+            ]
+
+            try:
+                with transaction.atomic():
+                    Ticket.objects.bulk_create(tickets)
+            except IntegrityError:
+                raise GroupBookingService.SeatTaken()
+
+            TicketWalletService.add(tickets)
+
+            ActivityLog.objects.bulk_create([
+                ActivityLog(
+                    user=user,
+                    action=ActivityLog.TICKET_CREATE,
+                    description=f"Nouveau ticket créé : {ticket.ticket_number}",
+                    details={
+                        'ticket_id': str(ticket.id),
+                        'ticket_number': ticket.ticket_number,
+                        'trip_id': str(trip.id),
+                        'seat_number': ticket.seat_number,
+                        'price': str(ticket.total_amount),
+                        'booking_group': str(group_id)
+                    },
+                    content_type='Ticket',
+                    object_id=str(ticket.id),
+                    severity=ActivityLog.SEVERITY_INFO
+                )
+                for ticket in tickets
+            ])
+
+            SeatMapService.update(trip, occupy=[ticket.seat_number for ticket in tickets])
+
+        return tickets
+
+    @staticmethod
+    def confirm_members(ticket):
+        """Confirmer les autres tickets du groupe du ticket principal"""
+        if not ticket.booking_group:
+            return 0
+
+        members = ticket.get_group_tickets().exclude(pk=ticket.pk).filter(status=Ticket.PENDING)
+        TicketWalletService.mirror(members.values('pk'), status=Ticket.CONFIRMED, is_paid=True)
+
+        now = timezone.now()
+        count = members.update(
+            status=Ticket.CONFIRMED,
+            is_paid=True,
+            confirmed_at=now,
+            qr_status=Ticket.QR_PENDING,
+            updated_at=now
+        )
+        if count:
+            QRCodeIssuanceService.schedule()
+
+        CityPopularityService.record_sales(ticket.trip, count, now)
+        return count
+
+    @staticmethod
+    def cancel_members(ticket, reason=''):
+        """Annuler les autres tickets du groupe et libérer leurs sièges"""
+        if not ticket.booking_group:
+            return 0
+
+        members = ticket.get_group_tickets().exclude(pk=ticket.pk).filter(
+            status__in=SeatMapService.OCCUPYING_STATUSES
+        )
+        seat_numbers = list(members.values_list('seat_number', flat=True))
+        if not seat_numbers:
+            return 0
+
+        TicketWalletService.mirror(members.values('pk'), status=Ticket.CANCELLED)
+
+        now = timezone.now()
+        count = members.update(
+            status=Ticket.CANCELLED,
+            cancelled_at=now,
+            cancellation_reason=reason,
+            updated_at=now
+        )
+
+        SeatInventory.release(ticket.trip, count)
+        SeatMapService.update(ticket.trip, release=seat_numbers)
+        return count
+
+
+class ReservationExpiryService:
+    """
+    Expiration des réservations non payées après payment_timeout_minutes
+
+    Les tickets expirés sont traités par lots bornés : une mise à jour
+    ensembliste des tickets, puis une seule libération de places par voyage.
+
+    Une réservation dont le paiement est en cours (en attente ou en
+    traitement chez le provider) n'expire pas avant IN_FLIGHT_GRACE
+    supplémentaires, groupe compris : le webhook de succès peut encore
+    arriver. Au-delà, un paiement tardif est signalé pour remboursement.
+    """
+
+    IN_FLIGHT_GRACE = timedelta(minutes=30)
+
+    @classmethod
+    def expire_batch(cls, cutoff, batch_size):
+        """
+        Expirer un lot de tickets en attente créés avant cutoff
+
+        Returns:
+            dict: {trip_id: nombre de places libérées}
+        """
+        from apps.payments.models import Payment
+
+        in_flight = Q(
+            payment__status__in=[Payment.PENDING, Payment.PROCESSING],
+            payment__created_at__gte=cutoff - cls.IN_FLIGHT_GRACE
+        )
+        in_flight_groups = Ticket.objects.filter(
+            in_flight,
+            booking_group__isnull=False
+        ).values('booking_group')
+
+        with transaction.atomic():
+            # Index (status, is_paid) ; les lignes verrouillées par le webhook
+            # de paiement (CinetPayProvider.handle_webhook) sont sautées
+            rows = list(
+                Ticket.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                    status=Ticket.PENDING,
+                    is_paid=False,
+                    created_at__lt=cutoff
+                ).exclude(in_flight).exclude(
+                    booking_group__in=in_flight_groups
+                ).order_by('created_at').values_list('id', 'trip_id', 'seat_number')[:batch_size]
+            )
+            if not rows:
+                return {}
+
+            now = timezone.now()
+            ticket_ids = [row[0] for row in rows]
+            Ticket.objects.filter(id__in=ticket_ids).update(
+                status=Ticket.EXPIRED,
+                updated_at=now
+            )
+            TicketWalletService.mirror(ticket_ids, status=Ticket.EXPIRED)
+
+            seats_by_trip = defaultdict(list)
+            for _, trip_id, seat_number in rows:
+                seats_by_trip[trip_id].append(seat_number)
+
+            # Une seule libération (UPDATE) par voyage
+            trips = Trip.objects.only('id', 'departure_city_id', 'arrival_city_id').in_bulk(seats_by_trip)
+            for trip_id, seat_numbers in seats_by_trip.items():
+                SeatInventory.release(trips[trip_id], len(seat_numbers))
+                SeatMapService.update(trips[trip_id], release=seat_numbers)
+
+        return {trip_id: len(seat_numbers) for trip_id, seat_numbers in seats_by_trip.items()}
+
+    @classmethod
+    def expire_pending(cls, batch_size=500, max_batches=20):
+        """
+        Expirer les réservations dont le délai de paiement est dépassé
+
+        Returns:
+            dict: nombre de tickets expirés et places récupérées par voyage
+        """
+        from apps.core.models import PlatformSettings
+        timeout = PlatformSettings.load().payment_timeout_minutes
+        cutoff = timezone.now() - timedelta(minutes=timeout)
+
+        reclaimed = defaultdict(int)
+        for _ in range(max_batches):
+            batch = cls.expire_batch(cutoff, batch_size)
+            for trip_id, count in batch.items():
+                reclaimed[trip_id] += count
+            if sum(batch.values()) < batch_size:
+                break
+
+        total = sum(reclaimed.values())
+        if total:
+            ActivityLog.objects.create(
+                action=ActivityLog.ADMIN_ACTION,
+                description=f"Expiration automatique : {total} réservation(s) non payée(s)",
+                details={
+                    'expired_tickets': total,
+                    'payment_timeout_minutes': timeout,
+                    'seats_reclaimed': {str(trip_id): count for trip_id, count in reclaimed.items()}
+                },
+                content_type='Ticket',
+                severity=ActivityLog.SEVERITY_INFO
+            )
+
+        return {
+            'expired_tickets': total,
+            'seats_reclaimed': {str(trip_id): count for trip_id, count in reclaimed.items()}
+        }
+
+
+class QRCodeIssuanceService:
+    """
+    Émission des QR codes hors requête, par lots
+
+    La confirmation d'un ticket le place en file (qr_status = pending) dans
+    la même écriture ; la tâche generate_ticket_qr_codes signe les tokens,
+    rend les PNG et les enregistre par lots, avec les clés et l'encodeur du
+    générateur partagé du processus. Les lots verrouillent leurs tickets
+    (skip_locked) : plusieurs workers peuvent vider la file en parallèle.
+
+    Un échec (stockage indisponible, etc.) passe le ticket en qr_status =
+    failed ; retry_failed le remet en file avec un délai doublé à chaque
+    tentative, jusqu'à MAX_ATTEMPTS.
+    """
+
+    SCHEDULE_KEY = 'ticket_qr:scheduled'
+    SCHEDULE_TIMEOUT = 10
+
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = timedelta(minutes=2)
+
+    @classmethod
+    def schedule(cls):
+        """Lancer le pipeline après validation de la transaction courante"""
+        # Cache ou broker indisponible : l'erreur est journalisée sans faire
+        # échouer la confirmation déjà validée (la tâche périodique reprend la file)
+        transaction.on_commit(cls._enqueue, robust=True)
+
+    @classmethod
+    def _enqueue(cls):
+        # Une seule tâche en file à la fois : elle traite tous les tickets en attente
+        if cache.add(cls.SCHEDULE_KEY, 1, cls.SCHEDULE_TIMEOUT):
+            from apps.tickets.tasks import generate_ticket_qr_codes
+            generate_ticket_qr_codes.delay()
+
+    @classmethod
+    def release_schedule(cls):
+        """Autoriser une nouvelle mise en file (appelé au démarrage de la tâche)"""
+        cache.delete(cls.SCHEDULE_KEY)
+
+    @staticmethod
+    def issue_batch(batch_size):
+        """
+        Émettre les QR codes d'un lot de tickets en attente
+
+        Returns:
+            dict: nombre de QR codes prêts, en échec et de tickets ignorés
+        """
+        generator = get_qr_generator()
+        ready, failed, skipped = [], [], 0
+
+        with transaction.atomic():
+            tickets = list(
+                Ticket.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                    qr_status=Ticket.QR_PENDING
+                ).select_related(
+                    'trip__departure_city', 'trip__arrival_city'
+                ).order_by('confirmed_at')[:batch_size]
+            )
+            if not tickets:
+                return {'ready': 0, 'failed': 0, 'skipped': 0}
+
+            for ticket in tickets:
+                # Annulé ou remboursé entre la confirmation et l'émission
+                if ticket.status != Ticket.CONFIRMED:
+                    ticket.qr_status = Ticket.QR_NONE
+                    skipped += 1
+                    continue
+
+                try:
+                    token = generator.sign_ticket(ticket)
+                    png = generator.render_png(token)
+                    if ticket.qr_code_image:
+                        ticket.qr_code_image.delete(save=False)
+                    ticket.qr_code_image.save(f'qr_{ticket.ticket_number}.png', ContentFile(png), save=False)
+                except Exception as e:
+                    ticket.qr_status = Ticket.QR_FAILED
+                    ticket.qr_attempts += 1
+                    failed.append((ticket, str(e)))
+                    continue
+
+                ticket.qr_code = token
+                ticket.qr_status = Ticket.QR_READY
+                ticket.qr_attempts = 0
+                ready.append(ticket)
+
+            now = timezone.now()
+            for ticket in tickets:
+                ticket.updated_at = now
+            # Sans signal : seuls les champs du QR code changent
+            Ticket.objects.bulk_update(
+                tickets, ['qr_code', 'qr_code_image', 'qr_status', 'qr_attempts', 'updated_at']
+            )
+
+            if failed:
+                ActivityLog.objects.create(
+                    action=ActivityLog.ADMIN_ACTION,
+                    description=f"Échec de génération de {len(failed)} QR code(s)",
+                    details={
+                        'tickets': {ticket.ticket_number: error for ticket, error in failed},
+                        'abandoned': [
+                            ticket.ticket_number for ticket, _ in failed
+                            if ticket.qr_attempts >= QRCodeIssuanceService.MAX_ATTEMPTS
+                        ]
+                    },
+                    content_type='Ticket',
+                    severity=ActivityLog.SEVERITY_ERROR
+                )
+
+        return {'ready': len(ready), 'failed': len(failed), 'skipped': skipped}
+
+    @classmethod
+    def issue_pending(cls, batch_size=100, max_batches=50):
+        """
+        Vider la file des QR codes en attente
+
+        Returns:
+            dict: totaux des lots traités
+        """
+        totals = {'ready': 0, 'failed': 0, 'skipped': 0}
+        for _ in range(max_batches):
+            batch = cls.issue_batch(batch_size)
+            for key, count in batch.items():
+                totals[key] += count
+            if sum(batch.values()) < batch_size:
+                break
+        return totals
+
+    @classmethod
+    def retry_failed(cls):
+        """
+        Remettre en file les QR codes en échec dont le délai de reprise est écoulé
+
+        Le délai double à chaque tentative (RETRY_DELAY, 2x, 4x...) ; au-delà
+        de MAX_ATTEMPTS le ticket reste en échec (réémission manuelle).
+
+        Returns:
+            int: nombre de tickets remis en file
+        """
+        now = timezone.now()
+        requeued = 0
+        for attempts in range(1, cls.MAX_ATTEMPTS):
+            requeued += Ticket.objects.filter(
+                qr_status=Ticket.QR_FAILED,
+                status=Ticket.CONFIRMED,
+                qr_attempts=attempts,
+                updated_at__lte=now - cls.RETRY_DELAY * 2 ** (attempts - 1)
+            ).update(qr_status=Ticket.QR_PENDING, updated_at=now)
+
+        if requeued:
+            cls.schedule()
+        return requeued
@@ -7,33 +7,40 @@ from django.utils import timezone
 from apps.tickets.models import Ticket
 from apps.logs.models import ActivityLog
 from apps.notifications.models import Notification
+from apps.trips.services import SeatInventory, CityPopularityService
+from apps.tickets.services import SeatMapService, TicketWalletService, QRCodeIssuanceService
 
 
 @receiver(pre_save, sender=Ticket)
 def ticket_pre_save(sender, instance, **kwargs):
     """Actions avant sauvegarde d'un ticket"""
     
-    # Si le statut passe à confirmé, définir confirmed_at
-    if instance.pk:
-        try:
-            old_instance = Ticket.objects.get(pk=instance.pk)
-            if old_instance.status != Ticket.CONFIRMED and instance.status == Ticket.CONFIRMED:
-                instance.confirmed_at = timezone.now()
-            
-            # Si annulé, définir cancelled_at
-            if old_instance.status != Ticket.CANCELLED and instance.status == Ticket.CANCELLED:
-                instance.cancelled_at = timezone.now()
-        except Ticket.DoesNotExist:
-            pass
+    if instance._state.adding or not instance.has_changed('status'):
+        return
+    
+    # Si le statut passe à confirmé, définir confirmed_at et mettre le QR code en file
+    if instance.status == Ticket.CONFIRMED:
+        instance.confirmed_at = timezone.now()
+        if instance.qr_status != Ticket.QR_READY:
+            instance.qr_status = Ticket.QR_PENDING
+    
+    # Si annulé, définir cancelled_at
+    if instance.status == Ticket.CANCELLED:
+        instance.cancelled_at = timezone.now()
 
 
 @receiver(post_save, sender=Ticket)
-def ticket_post_save(sender, instance, created, **kwargs):
+def ticket_post_save(sender, instance, created, update_fields=None, **kwargs):
     """Actions après création/modification d'un ticket"""
     
     if created:
-        # Décrémenter les places disponibles du voyage
-        instance.trip.reserve_seats(1)
+        # Décrémenter les places disponibles du voyage (annule la création si complet)
+        if not instance.trip.reserve_seats(1):
+            raise SeatInventory.Unavailable(instance.trip_id)
+        
+        SeatMapService.record_transition(instance, old_status=None)
+        CityPopularityService.record_ticket_transition(instance, old_status=None)
+        TicketWalletService.add([instance])
         
         # Logger la création
         ActivityLog.objects.create(
@@ -53,19 +60,40 @@ def ticket_post_save(sender, instance, created, **kwargs):
         )
     
     else:
-        # Vérifier si le statut a changé
-        old_instance = Ticket.objects.get(pk=instance.pk)
+        TicketWalletService.record_change(instance, update_fields)
+        
+        # État précédent mémorisé au chargement (pas de relecture en base)
+        status_changed = instance.has_changed('status')
+        old_status = instance.previous_value('status') if status_changed else instance.status
+        
+        # Mettre à jour le bitmap des sièges (statut ou siège modifié)
+        if status_changed or instance.has_changed('seat_number'):
+            SeatMapService.record_transition(
+                instance,
+                old_status=old_status,
+                old_seat_number=instance.previous_value('seat_number')
+            )
         
-        if old_instance.status != instance.status:
+        # Vérifier si le statut a changé
+        if status_changed:
+            CityPopularityService.record_ticket_transition(instance, old_status)
+            
+            # Le ticket ne retient plus de siège (annulé, expiré, remboursé)
+            if (
+                old_status in SeatMapService.OCCUPYING_STATUSES
+                and instance.status not in SeatMapService.OCCUPYING_STATUSES
+            ):
+                instance.trip.release_seats(1)
+            
             # Logger le changement de statut
             ActivityLog.objects.create(
                 user=instance.passenger,
                 action=ActivityLog.TICKET_CONFIRM if instance.status == Ticket.CONFIRMED else ActivityLog.TICKET_CANCEL,
-                description=f"Ticket {instance.ticket_number} : {old_instance.get_status_display()} → {instance.get_status_display()}",
+                description=f"Ticket {instance.ticket_number} : {dict(Ticket.STATUS_CHOICES).get(old_status, old_status)} → {instance.get_status_display()}",
                 details={
                     'ticket_id': str(instance.id),
                     'ticket_number': instance.ticket_number,
-                    'old_status': old_instance.status,
+                    'old_status': old_status,
                     'new_status': instance.status
                 },
                 content_type='Ticket',
@@ -75,6 +103,9 @@ def ticket_post_save(sender, instance, created, **kwargs):
             
             # Créer notification selon le statut
             if instance.status == Ticket.CONFIRMED:
+                if instance.qr_status == Ticket.QR_PENDING:
+                    QRCodeIssuanceService.schedule()
+                
                 Notification.objects.create(
                     user=instance.passenger,
                     notification_type=Notification.EMAIL,
@@ -89,9 +120,6 @@ def ticket_post_save(sender, instance, created, **kwargs):
                 )
             
             elif instance.status == Ticket.CANCELLED:
-                # Libérer le siège
-                instance.trip.release_seats(1)
-                
                 Notification.objects.create(
                     user=instance.passenger,
                     notification_type=Notification.EMAIL,
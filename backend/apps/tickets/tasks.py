@@ -0,0 +1,44 @@
+"""
+Tâches Celery pour les tickets
+"""
+from celery import shared_task
+from apps.tickets.services import ReservationExpiryService, QRCodeIssuanceService
+
+
+@shared_task
+def expire_pending_tickets(batch_size=500, max_batches=20):
+    """
+    Expirer les réservations non payées (tâche périodique)
+    
+    Libère les places retenues par les tickets en attente au-delà de
+    PlatformSettings.payment_timeout_minutes.
+    """
+    return ReservationExpiryService.expire_pending(
+        batch_size=batch_size,
+        max_batches=max_batches
+    )
+
+
+@shared_task
+def generate_ticket_qr_codes(batch_size=100, max_batches=50):
+    """
+    Émettre les QR codes des tickets confirmés en attente (qr_status = pending)
+    
+    Lancée après chaque confirmation et chaque minute par celery beat pour
+    reprendre les tickets dont la mise en file aurait échoué.
+    """
+    QRCodeIssuanceService.release_schedule()
+    return QRCodeIssuanceService.issue_pending(
+        batch_size=batch_size,
+        max_batches=max_batches
+    )
+
+
+@shared_task
+def retry_failed_ticket_qr_codes():
+    """
+    Remettre en file les QR codes en échec (tâche périodique)
+    
+    Reprise avec délai croissant, bornée à QRCodeIssuanceService.MAX_ATTEMPTS.
+    """
+    return QRCodeIssuanceService.retry_failed()
@@ -8,18 +8,20 @@ from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db import transaction
 
-from apps.tickets.models import Ticket
+from apps.tickets.models import Ticket, TicketWallet
 from apps.tickets.serializers import (
     TicketCreateSerializer,
+    GroupBookingSerializer,
     TicketDetailSerializer,
     TicketListSerializer,
+    TicketWalletSerializer,
     TicketCancellationSerializer,
     TicketVerificationSerializer
 )
 from apps.users.permissions import IsVoyageur, CanManageTicket
 from apps.logs.models import ActivityLog
 from utils.pagination import StandardResultsSetPagination
-from utils.qr_generator import QRCodeGenerator
+from utils.qr_generator import get_qr_generator
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 
@@ -35,11 +37,23 @@ class TicketViewSet(viewsets.ModelViewSet):
     search_fields = ['ticket_number', 'passenger_first_name', 'passenger_last_name']
     ordering_fields = ['created_at', 'trip__departure_datetime']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', '-id')
+    # Le portefeuille (TicketWallet) a pour clé ticket_id et son propre index par action
+    wallet_cursor_ordering = {
+        'my_tickets': ('-created_at', '-ticket_id'),
+        'history': ('-departure_datetime', '-ticket_id'),
+    }
+    
+    def get_cursor_ordering(self):
+        """Ordre du curseur selon l'action (tickets ou portefeuille)"""
+        return self.wallet_cursor_ordering.get(self.action, self.cursor_ordering)
     
     def get_serializer_class(self):
         """Retourner le serializer approprié"""
         if self.action == 'create':
             return TicketCreateSerializer
+        elif self.action == 'group':
+            return GroupBookingSerializer
         elif self.action == 'list':
             return TicketListSerializer
         elif self.action == 'cancel':
@@ -72,7 +86,7 @@ class TicketViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Permissions dynamiques"""
-        if self.action == 'create':
+        if self.action in ['create', 'group']:
             return [IsVoyageur()]
         elif self.action in ['update', 'partial_update', 'destroy']:
             return [CanManageTicket()]
@@ -96,6 +110,27 @@ class TicketViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], url_path='group')
+    @transaction.atomic
+    def group(self, request):
+        """Réserver plusieurs sièges en une seule requête (famille, groupe)"""
+        serializer = self.get_serializer(data=request.data)
+        
+        if serializer.is_valid():
+            tickets = serializer.save()
+            lead_ticket = tickets[0]
+            
+            return Response({
+                'message': f'{len(tickets)} ticket(s) réservé(s) avec succès',
+                'booking_group': str(lead_ticket.booking_group),
+                'total_amount': str(sum(ticket.total_amount for ticket in tickets)),
+                # Le paiement du groupe s'initialise avec le ticket principal
+                'payment_ticket_id': str(lead_ticket.id),
+                'tickets': TicketDetailSerializer(tickets, many=True).data
+            }, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['post'], url_path='cancel')
     def cancel(self, request, pk=None):
         """Annuler un ticket"""
@@ -165,16 +200,9 @@ class TicketViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Confirmer le ticket
+        # Confirmer le ticket (le QR code est émis par le pipeline, qr_status = pending)
         ticket.status = Ticket.CONFIRMED
         ticket.confirmed_at = timezone.now()
-        
-        # Générer le QR code sécurisé
-        qr_generator = QRCodeGenerator()
-        qr_data = qr_generator.generate_qr_code(ticket)
-        
-        ticket.qr_code = qr_data['token']
-        ticket.qr_code_image = qr_data['image']
         ticket.save()
         
         # Logger la confirmation
@@ -202,7 +230,7 @@ class TicketViewSet(viewsets.ModelViewSet):
         serializer = TicketVerificationSerializer(data=request.data)
         
         if serializer.is_valid():
-            qr_generator = QRCodeGenerator()
+            qr_generator = get_qr_generator()
             
             try:
                 # Décoder et vérifier le QR code
@@ -255,8 +283,8 @@ class TicketViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='my-tickets')
     def my_tickets(self, request):
-        """Tickets de l'utilisateur connecté"""
-        queryset = self.get_queryset().filter(passenger=request.user)
+        """Tickets de l'utilisateur connecté (portefeuille, index passager/création)"""
+        queryset = TicketWallet.objects.filter(passenger=request.user)
         
         # Filtrer par statut si fourni
         status_filter = request.query_params.get('status')
@@ -265,36 +293,36 @@ class TicketViewSet(viewsets.ModelViewSet):
         
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = TicketListSerializer(page, many=True)
+            serializer = TicketWalletSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = TicketListSerializer(queryset, many=True)
+        serializer = TicketWalletSerializer(queryset, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='upcoming')
     def upcoming(self, request):
-        """Tickets à venir de l'utilisateur"""
-        queryset = self.get_queryset().filter(
+        """Tickets à venir de l'utilisateur (portefeuille, index passager/départ)"""
+        queryset = TicketWallet.objects.filter(
             passenger=request.user,
             status__in=[Ticket.PENDING, Ticket.CONFIRMED],
-            trip__departure_datetime__gte=timezone.now()
-        ).order_by('trip__departure_datetime')
+            departure_datetime__gte=timezone.now()
+        ).order_by('departure_datetime')
         
-        serializer = TicketListSerializer(queryset, many=True)
+        serializer = TicketWalletSerializer(queryset, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='history')
     def history(self, request):
-        """Historique des tickets de l'utilisateur"""
-        queryset = self.get_queryset().filter(
+        """Historique des tickets de l'utilisateur (portefeuille, index passager/départ)"""
+        queryset = TicketWallet.objects.filter(
             passenger=request.user,
-            trip__departure_datetime__lt=timezone.now()
-        ).order_by('-trip__departure_datetime')
+            departure_datetime__lt=timezone.now()
+        ).order_by('-departure_datetime')
         
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = TicketListSerializer(page, many=True)
+            serializer = TicketWalletSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = TicketListSerializer(queryset, many=True)
+        serializer = TicketWalletSerializer(queryset, many=True)
         return Response(serializer.data)
\ No newline at end of file
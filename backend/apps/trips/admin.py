@@ -6,6 +6,7 @@ from django.utils.html import format_html
 from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from apps.trips.models import Trip, City
+from apps.trips.services import TripSearchIndexService, CityPopularityService
 
 
 @admin.register(City)
@@ -150,18 +151,27 @@ class TripAdmin(admin.ModelAdmin):
     
     def cancel_trips(self, request, queryset):
         """Annuler les voyages sélectionnés"""
+        before = CityPopularityService.trip_city_counts(queryset)
         updated = queryset.update(status=Trip.CANCELLED)
+        TripSearchIndexService.sync_trips(queryset)
+        CityPopularityService.record_bulk_change(queryset, before)
         self.message_user(request, f'{updated} voyage(s) annulé(s)')
     cancel_trips.short_description = 'Annuler les voyages sélectionnés'
     
     def activate_trips(self, request, queryset):
         """Activer les voyages"""
+        before = CityPopularityService.trip_city_counts(queryset)
         updated = queryset.update(is_active=True)
+        TripSearchIndexService.sync_trips(queryset)
+        CityPopularityService.record_bulk_change(queryset, before)
         self.message_user(request, f'{updated} voyage(s) activé(s)')
     activate_trips.short_description = 'Activer les voyages'
     
     def deactivate_trips(self, request, queryset):
         """Désactiver les voyages"""
+        before = CityPopularityService.trip_city_counts(queryset)
         updated = queryset.update(is_active=False)
+        TripSearchIndexService.sync_trips(queryset)
+        CityPopularityService.record_bulk_change(queryset, before)
         self.message_user(request, f'{updated} voyage(s) désactivé(s)')
     deactivate_trips.short_description = 'Désactiver les voyages'
\ No newline at end of file
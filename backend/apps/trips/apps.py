@@ -5,3 +5,7 @@ class TripsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.trips'
     verbose_name = 'Trips'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import apps.trips.signals
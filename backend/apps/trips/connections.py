@@ -0,0 +1,350 @@
+"""
+Recherche d'itinéraires avec correspondances
+
+Les voyages réservables (TripSearchIndex) d'un jour sont chargés en mémoire
+sous forme de grille horaire, rafraîchie par deltas (updated_at), puis
+parcourue sans requête : balayage inverse des connexions pour borner les
+villes encore utiles, puis énumération des itinéraires dans le temps.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from apps.trips.models import TripSearchIndex
+from apps.trips.services import build_search_result
+
+
+Connection = namedtuple('Connection', [
+    'trip_id', 'departure_city_id', 'arrival_city_id',
+    'departure', 'arrival', 'price', 'available_seats'
+])
+
+CONNECTION_FIELDS = (
+    'trip_id', 'departure_city_id', 'arrival_city_id',
+    'departure_datetime', 'arrival_datetime', 'base_price', 'available_seats'
+)
+
+
+class DayTimetable:
+    """
+    Grille horaire d'un jour (date de départ locale)
+
+    Les départs sont groupés par ville et triés par heure ; une mise à jour
+    ne retrie que les villes touchées. Les listes sont remplacées (jamais
+    modifiées sur place) : une recherche en cours garde une vue cohérente.
+    """
+
+    def __init__(self, day):
+        self.day = day
+        self.connections = {}
+        self.city_trips = {}
+        self.departures = {}
+        self.ordered = ()
+        self.watermark = None
+        self.refreshed_at = None
+
+    def apply(self, rows, live_ids=None):
+        """
+        Appliquer des lignes de l'index (ajouts/modifications)
+
+        Args:
+            rows: tuples (CONNECTION_FIELDS..., updated_at)
+            live_ids: identifiants encore indexés ce jour (retire les autres)
+
+        Returns:
+            int: nombre de voyages ajoutés, modifiés ou retirés
+        """
+        dirty = set()
+        changes = 0
+
+        for row in rows:
+            connection = Connection(*row[:-1])
+            previous = self.connections.get(connection.trip_id)
+            if previous != connection:
+                if previous is not None:
+                    self._detach(previous, dirty)
+                self.connections[connection.trip_id] = connection
+                self.city_trips.setdefault(connection.departure_city_id, set()).add(connection.trip_id)
+                dirty.add(connection.departure_city_id)
+                changes += 1
+
+            if self.watermark is None or row[-1] > self.watermark:
+                self.watermark = row[-1]
+
+        if live_ids is not None:
+            for trip_id in set(self.connections) - live_ids:
+                self._detach(self.connections.pop(trip_id), dirty)
+                changes += 1
+
+        for city_id in dirty:
+            connections = sorted(
+                (self.connections[trip_id] for trip_id in self.city_trips.get(city_id, ())),
+                key=attrgetter('departure')
+            )
+            if connections:
+                self.departures[city_id] = (
+                    [connection.departure for connection in connections],
+                    connections
+                )
+            else:
+                self.departures.pop(city_id, None)
+
+        if changes:
+            self.ordered = tuple(sorted(self.connections.values(), key=attrgetter('departure')))
+        return changes
+
+    def _detach(self, connection, dirty):
+        trips = self.city_trips.get(connection.departure_city_id)
+        if trips is not None:
+            trips.discard(connection.trip_id)
+        dirty.add(connection.departure_city_id)
+
+
+class Timetable:
+    """
+    Grilles horaires en mémoire du processus, par jour
+
+    Une grille est chargée au premier accès puis rafraîchie au plus toutes
+    les REFRESH_INTERVAL secondes : seules les lignes de l'index modifiées
+    depuis le dernier rafraîchissement sont relues, plus la liste des
+    identifiants du jour pour détecter les retraits.
+    """
+
+    REFRESH_INTERVAL = 15
+    # Recouvrement du delta : une transaction validée après la lecture peut
+    # porter un updated_at légèrement antérieur au dernier vu
+    WATERMARK_OVERLAP = timedelta(seconds=30)
+    MAX_DAYS = 14
+
+    _days = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_day(cls, day):
+        """Grille horaire à jour d'un jour donné"""
+        with cls._lock:
+            table = cls._days.get(day)
+            if table is None:
+                table = DayTimetable(day)
+                cls._days[day] = table
+                while len(cls._days) > cls.MAX_DAYS:
+                    cls._days.popitem(last=False)
+            else:
+                cls._days.move_to_end(day)
+
+            if table.refreshed_at is None or time.monotonic() - table.refreshed_at >= cls.REFRESH_INTERVAL:
+                cls.refresh(table)
+            return table
+
+    @classmethod
+    def refresh(cls, table):
+        """Charger (ou mettre à jour par delta) la grille d'un jour"""
+        queryset = TripSearchIndex.objects.filter(departure_date=table.day)
+
+        if table.watermark is None:
+            table.apply(queryset.values_list(*CONNECTION_FIELDS, 'updated_at'))
+        else:
+            changed = queryset.filter(updated_at__gte=table.watermark - cls.WATERMARK_OVERLAP)
+            table.apply(
+                changed.values_list(*CONNECTION_FIELDS, 'updated_at'),
+                live_ids=set(queryset.values_list('trip_id', flat=True))
+            )
+
+        table.refreshed_at = time.monotonic()
+
+    @classmethod
+    def clear(cls):
+        """Vider les grilles en mémoire (rechargées au prochain accès)"""
+        with cls._lock:
+            cls._days.clear()
+
+
+class ConnectionSearchService:
+    """
+    Recherche d'itinéraires directs ou avec une ou deux correspondances
+
+    Une correspondance doit laisser au moins min_layover et au plus max_wait
+    entre l'arrivée et le départ suivant. Les itinéraires commencent le jour
+    demandé ; les étapes suivantes peuvent partir le lendemain.
+    """
+
+    SORT_ARRIVAL = 'arrival'
+    SORT_PRICE = 'price'
+
+    MAX_TRANSFERS = 2
+
+    @classmethod
+    def search(cls, departure_city_id, arrival_city_id, departure_date, passengers=1,
+               search_start=None, max_transfers=2, min_layover=timedelta(minutes=30),
+               max_wait=timedelta(hours=6), sort=SORT_ARRIVAL, limit=5):
+        """
+        Meilleurs itinéraires par heure d'arrivée ou par prix total
+
+        Returns:
+            list: itinéraires (étapes au format TripListSerializer)
+        """
+        if departure_city_id == arrival_city_id:
+            return []
+
+        first_day = Timetable.get_day(departure_date)
+        next_day = Timetable.get_day(departure_date + timedelta(days=1))
+
+        max_legs = min(max_transfers, cls.MAX_TRANSFERS) + 1
+        connections = [
+            connection
+            for connection in first_day.ordered + next_day.ordered
+            if connection.available_seats >= passengers
+        ]
+        latest = cls._latest_departures(connections, arrival_city_id, max_legs, min_layover)
+
+        if departure_city_id not in latest[max_legs]:
+            return []
+
+        if search_start is None:
+            search_start = timezone.make_aware(
+                datetime.combine(departure_date, datetime.min.time()),
+                timezone.get_current_timezone()
+            )
+
+        merged = {}
+
+        def departures(city_id):
+            # Les départs du jour précèdent tous ceux du lendemain
+            if city_id not in merged:
+                first_times, first = first_day.departures.get(city_id, ((), ()))
+                next_times, following = next_day.departures.get(city_id, ((), ()))
+                merged[city_id] = (list(first_times) + list(next_times), list(first) + list(following))
+            return merged[city_id]
+
+        if sort == cls.SORT_PRICE:
+            key = lambda legs, price: (price, legs[-1].arrival, len(legs))
+        else:
+            key = lambda legs, price: (legs[-1].arrival, price, len(legs))
+
+        best = []
+
+        def offer(legs, price):
+            entry = (key(legs, price), tuple(legs))
+            if len(best) == limit and entry[0] >= best[-1][0]:
+                return
+            best.insert(bisect_right([item[0] for item in best], entry[0]), entry)
+            del best[limit:]
+
+        def pruned(connection, price):
+            # Une étape ne peut qu'augmenter l'heure d'arrivée et le prix
+            if len(best) < limit:
+                return False
+            bound = best[-1][0]
+            if sort == cls.SORT_PRICE:
+                return price > bound[0]
+            return connection.arrival > bound[0]
+
+        def extend(legs, price, visited):
+            last = legs[-1]
+            if last.arrival_city_id == arrival_city_id:
+                offer(legs, price)
+                return
+
+            legs_left = max_legs - len(legs)
+            times, candidates = departures(last.arrival_city_id)
+            start = bisect_left(times, last.arrival + min_layover)
+            end = bisect_right(times, last.arrival + max_wait)
+
+            for connection in candidates[start:end]:
+                if not cls._usable(connection, legs_left, visited, latest, arrival_city_id, passengers, min_layover):
+                    continue
+                total = price + connection.price
+                if pruned(connection, total):
+                    continue
+                extend(legs + [connection], total, visited | {connection.arrival_city_id})
+
+        for connection in first_day.departures.get(departure_city_id, ((), ()))[1]:
+            if connection.departure < search_start:
+                continue
+            if not cls._usable(connection, max_legs, {departure_city_id}, latest, arrival_city_id, passengers, min_layover):
+                continue
+            if pruned(connection, connection.price):
+                continue
+            extend([connection], connection.price, {departure_city_id, connection.arrival_city_id})
+
+        return cls._build_results([legs for _, legs in best], passengers)
+
+    @staticmethod
+    def _latest_departures(connections, arrival_city_id, max_legs, min_layover):
+        """
+        Dernier départ utile de chaque ville, par nombre d'étapes restantes
+
+        Balayage des connexions par départ décroissant : latest[n][ville] est
+        le départ le plus tardif depuis cette ville qui atteint encore la
+        destination en n étapes au plus (borne optimiste : max_wait ignoré).
+        """
+        latest = [{} for _ in range(max_legs + 1)]
+
+        for connection in reversed(connections):
+            city_id = connection.departure_city_id
+            if connection.arrival_city_id == arrival_city_id:
+                for legs in range(1, max_legs + 1):
+                    latest[legs].setdefault(city_id, connection.departure)
+                continue
+
+            for legs in range(2, max_legs + 1):
+                onward = latest[legs - 1].get(connection.arrival_city_id)
+                if onward is not None and onward >= connection.arrival + min_layover:
+                    latest[legs].setdefault(city_id, connection.departure)
+
+        return latest
+
+    @staticmethod
+    def _usable(connection, legs_left, visited, latest, arrival_city_id, passengers, min_layover):
+        """L'étape peut-elle encore mener à la destination"""
+        if connection.available_seats < passengers or connection.arrival_city_id in visited:
+            return False
+        if connection.arrival_city_id == arrival_city_id:
+            return True
+        if legs_left <= 1:
+            return False
+        onward = latest[legs_left - 1].get(connection.arrival_city_id)
+        return onward is not None and onward >= connection.arrival + min_layover
+
+    @staticmethod
+    def _build_results(itineraries, passengers):
+        """Compléter les itinéraires retenus avec les données pré-sérialisées"""
+        trip_ids = {connection.trip_id for legs in itineraries for connection in legs}
+        rows = {
+            trip_id: build_search_result(payload, available_seats, total_seats)
+            for trip_id, payload, available_seats, total_seats in TripSearchIndex.objects.filter(
+                trip_id__in=trip_ids
+            ).values_list('trip_id', 'payload', 'available_seats', 'total_seats')
+        }
+
+        datetime_field = serializers.DateTimeField()
+        results = []
+        for legs in itineraries:
+            # Voyage retiré de l'index depuis le dernier rafraîchissement
+            if any(connection.trip_id not in rows for connection in legs):
+                continue
+
+            total_price = sum((connection.price for connection in legs), 0)
+            results.append({
+                'departure_datetime': datetime_field.to_representation(legs[0].departure),
+                'arrival_datetime': datetime_field.to_representation(legs[-1].arrival),
+                'duration_minutes': int((legs[-1].arrival - legs[0].departure).total_seconds() // 60),
+                'transfers': len(legs) - 1,
+                'transfer_cities': [connection.arrival_city_id for connection in legs[:-1]],
+                'layovers_minutes': [
+                    int((following.departure - previous.arrival).total_seconds() // 60)
+                    for previous, following in zip(legs, legs[1:])
+                ],
+                'price_per_passenger': str(total_price),
+                'total_price': str(total_price * passengers),
+                'available_seats': min(rows[connection.trip_id]['available_seats'] for connection in legs),
+                'legs': [rows[connection.trip_id] for connection in legs],
+            })
+
+        return results
@@ -0,0 +1,115 @@
+"""
+Commande de benchmark de la réservation de places sous contention
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.trips.models import Trip
+from apps.trips.services import SeatInventory, TripSearchIndexService
+
+
+def legacy_reserve(trip, count=1):
+    """Ancienne implémentation (lecture-modification-écriture en Python)"""
+    if trip.available_seats >= count:
+        trip.available_seats -= count
+        trip.reserved_seats += count
+        trip.save(update_fields=['available_seats', 'reserved_seats'])
+        return True
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare l\'ancienne réservation de places et le moteur atomique '
+        'sur un voyage très sollicité (les compteurs du voyage sont restaurés)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, required=True, help='ID du voyage utilisé')
+        parser.add_argument('--threads', type=int, default=16, help='Nombre de clients concurrents')
+        parser.add_argument('--attempts', type=int, default=20, help='Réservations par client')
+        parser.add_argument('--seats', type=int, help='Places initiales (défaut : capacité du voyage)')
+
+    def handle(self, *args, **options):
+        try:
+            trip = Trip.objects.get(pk=options['trip'])
+        except Trip.DoesNotExist:
+            raise CommandError(f'Voyage {options["trip"]} introuvable')
+
+        threads = options['threads']
+        attempts = options['attempts']
+        seats = options['seats'] or trip.total_seats
+        if seats > trip.total_seats:
+            raise CommandError(f'Le voyage n\'a que {trip.total_seats} places')
+        original = (trip.available_seats, trip.reserved_seats)
+
+        self.stdout.write(
+            f'🚌 Voyage {trip.pk} : {seats} places, '
+            f'{threads} clients x {attempts} tentatives\n'
+        )
+
+        engines = [
+            ('Ancienne (read-modify-write)', legacy_reserve),
+            ('Atomique (UPDATE conditionnel)', SeatInventory.reserve),
+        ]
+
+        try:
+            for label, reserve in engines:
+                Trip.objects.filter(pk=trip.pk).update(available_seats=seats, reserved_seats=0)
+
+                successes, errors, elapsed = self._run(trip.pk, reserve, threads, attempts)
+                final = Trip.objects.get(pk=trip.pk)
+
+                # Places réellement décomptées vs réservations acceptées
+                oversold = max(0, successes - seats)
+                lost_updates = final.available_seats - max(0, seats - successes)
+
+                self.stdout.write(f'📊 {label}')
+                self.stdout.write(f'   Débit : {threads * attempts / elapsed:.0f} réservations/s ({elapsed:.2f}s)')
+                self.stdout.write(f'   Réservations acceptées : {successes} (erreurs : {errors})')
+                self.stdout.write(f'   Places restantes : {final.available_seats}')
+
+                if oversold or lost_updates:
+                    self.stdout.write(self.style.ERROR(
+                        f'   ❌ Survente : {oversold} place(s), mises à jour perdues : {lost_updates}\n'
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS('   ✅ Aucune survente\n'))
+        finally:
+            Trip.objects.filter(pk=trip.pk).update(
+                available_seats=original[0],
+                reserved_seats=original[1]
+            )
+            TripSearchIndexService.sync_trip(Trip.objects.get(pk=trip.pk))
+
+    def _run(self, trip_id, reserve, threads, attempts):
+        """Lancer les clients concurrents et mesurer le temps total"""
+        barrier = threading.Barrier(threads)
+        successes = [0] * threads
+        errors = [0] * threads
+
+        def worker(index):
+            try:
+                barrier.wait()
+                for _ in range(attempts):
+                    try:
+                        # Lecture fraîche à chaque tentative, comme instance.trip dans le signal
+                        if reserve(Trip.objects.get(pk=trip_id), 1):
+                            successes[index] += 1
+                    except Exception:
+                        errors[index] += 1
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return sum(successes), sum(errors), elapsed
@@ -0,0 +1,14 @@
+"""
+Commande pour reconstruire le classement de popularité des villes
+"""
+from django.core.management.base import BaseCommand
+from apps.trips.services import CityPopularityService
+
+
+class Command(BaseCommand):
+    help = 'Recalcule le classement des villes (voyages, tickets vendus, ventes récentes)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Reconstruction du classement des villes...')
+        count = CityPopularityService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} ville(s) classée(s)'))
@@ -0,0 +1,14 @@
+"""
+Commande pour reconstruire l'index de recherche des voyages
+"""
+from django.core.management.base import BaseCommand
+from apps.trips.services import TripSearchIndexService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit l\'index de recherche route/jour des voyages réservables'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Reconstruction de l\'index de recherche...')
+        count = TripSearchIndexService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} voyage(s) indexé(s)'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-17 01:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSearchIndex',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='trips.trip', verbose_name='voyage')),
+                ('departure_date', models.DateField(verbose_name='date de départ (locale)')),
+                ('departure_datetime', models.DateTimeField(verbose_name='date/heure de départ')),
+                ('available_seats', models.PositiveIntegerField(verbose_name='places disponibles')),
+                ('total_seats', models.PositiveIntegerField(verbose_name='places totales')),
+                ('payload', models.JSONField(default=dict, verbose_name='données pré-sérialisées')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='modifié le')),
+                ('arrival_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.city', verbose_name="ville d'arrivée")),
+                ('departure_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.city', verbose_name='ville de départ')),
+            ],
+            options={
+                'verbose_name': 'index de recherche voyage',
+                'verbose_name_plural': 'index de recherche voyages',
+                'db_table': 'trip_search_index',
+                'ordering': ['departure_datetime'],
+                'indexes': [models.Index(fields=['departure_city', 'arrival_city', 'departure_date', 'departure_datetime'], name='trip_search_route_day_idx')],
+            },
+        ),
+    ]
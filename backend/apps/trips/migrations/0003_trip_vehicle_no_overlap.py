@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+# Un véhicule ne peut pas avoir deux voyages actifs (ni annulés ni terminés)
+# qui se chevauchent. int8range(vehicle_id, vehicle_id, '[]') permet l'égalité
+# sur le véhicule avec l'opérateur && natif de GiST (sans l'extension btree_gist).
+CREATE_CONSTRAINT = """
+    ALTER TABLE trips ADD CONSTRAINT trips_vehicle_no_overlap
+    EXCLUDE USING gist (
+        int8range(vehicle_id, vehicle_id, '[]') WITH &&,
+        tstzrange(departure_datetime, estimated_arrival_datetime, '[)') WITH &&
+    ) WHERE (status NOT IN ('cancelled', 'completed'))
+"""
+
+FIND_OVERLAPS = """
+    SELECT a.id, b.id FROM trips a
+    JOIN trips b ON a.vehicle_id = b.vehicle_id AND a.id < b.id
+    WHERE a.status NOT IN ('cancelled', 'completed')
+      AND b.status NOT IN ('cancelled', 'completed')
+      AND a.departure_datetime < b.estimated_arrival_datetime
+      AND b.departure_datetime < a.estimated_arrival_datetime
+    LIMIT 20
+"""
+
+DROP_CONSTRAINT = 'ALTER TABLE trips DROP CONSTRAINT IF EXISTS trips_vehicle_no_overlap'
+
+
+def create_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FIND_OVERLAPS)
+        overlaps = cursor.fetchall()
+
+    if overlaps:
+        pairs = ', '.join(f'{a}/{b}' for a, b in overlaps)
+        raise RuntimeError(
+            f'Voyages en chevauchement sur un même véhicule ({pairs}) : '
+            f'réaffecter ou annuler ces voyages avant de migrer.'
+        )
+
+    schema_editor.execute(CREATE_CONSTRAINT)
+
+
+def drop_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_trip_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['vehicle', 'departure_datetime'], name='trips_vehicle_1c1ed0_idx'),
+        ),
+        migrations.RunPython(create_constraint, drop_constraint),
+    ]
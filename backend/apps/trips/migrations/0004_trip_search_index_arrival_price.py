@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    TripSearchIndex = apps.get_model('trips', 'TripSearchIndex')
+
+    trip = Trip.objects.filter(pk=OuterRef('trip_id'))
+    TripSearchIndex.objects.update(
+        arrival_datetime=Subquery(trip.values('estimated_arrival_datetime')[:1]),
+        base_price=Subquery(trip.values('base_price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_trip_vehicle_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripsearchindex',
+            name='arrival_datetime',
+            field=models.DateTimeField(null=True, verbose_name="date/heure d'arrivée estimée"),
+        ),
+        migrations.AddField(
+            model_name='tripsearchindex',
+            name='base_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='prix de base'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tripsearchindex',
+            name='arrival_datetime',
+            field=models.DateTimeField(verbose_name="date/heure d'arrivée estimée"),
+        ),
+        migrations.AlterField(
+            model_name='tripsearchindex',
+            name='base_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='prix de base'),
+        ),
+        migrations.AddIndex(
+            model_name='tripsearchindex',
+            index=models.Index(fields=['departure_date', 'updated_at'], name='trip_search_day_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_trip_search_index_arrival_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityPopularity',
+            fields=[
+                ('city', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='trips.city', verbose_name='ville')),
+                ('trip_count', models.IntegerField(default=0, verbose_name='voyages (départs + arrivées)')),
+                ('tickets_sold', models.IntegerField(default=0, verbose_name='tickets vendus')),
+                ('recent_bookings', models.FloatField(default=0, verbose_name='ventes récentes (pondérées)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='modifié le')),
+            ],
+            options={
+                'verbose_name': 'popularité ville',
+                'verbose_name_plural': 'popularité villes',
+                'db_table': 'city_popularity',
+                'indexes': [models.Index(fields=['-trip_count'], name='city_pop_trips_idx'), models.Index(fields=['-tickets_sold'], name='city_pop_sold_idx'), models.Index(fields=['-recent_bookings'], name='city_pop_recent_idx')],
+            },
+        ),
+    ]
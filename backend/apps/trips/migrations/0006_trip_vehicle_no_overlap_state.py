@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:06
+
+import apps.trips.models
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_city_popularity'),
+    ]
+
+    # La contrainte existe déjà en base (0003, SQL brut) : seul l'état du
+    # modèle la déclare désormais, pour les bases créées sans migrations
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='trip',
+                    constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ['cancelled', 'completed']), _negated=True), expressions=[(apps.trips.models.Int8Range('vehicle_id', 'vehicle_id', models.Value('[]')), '&&'), (apps.trips.models.TsTzRange('departure_datetime', 'estimated_arrival_datetime', models.Value('[)')), '&&')], name='trips_vehicle_no_overlap'),
+                ),
+            ],
+        ),
+    ]
@@ -1,12 +1,28 @@
 """
 Modèle Trip pour gérer les voyages
 """
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField, RangeOperators
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
+from utils.tracking import FieldTrackerMixin
+
+
+class Int8Range(models.Func):
+    """int8range(début, fin, bornes)"""
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+
+class TsTzRange(models.Func):
+    """tstzrange(début, fin, bornes)"""
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
 
 class City(models.Model):
     """Villes desservies"""
@@ -45,9 +61,12 @@ class City(models.Model):
         return self.name
 
 
-class Trip(models.Model):
+class Trip(FieldTrackerMixin, models.Model):
     """Voyage proposé par une compagnie"""
     
+    # Trajet, statut et horaire comparés par les signaux (classement, portefeuilles)
+    tracked_fields = ('departure_city', 'arrival_city', 'status', 'is_active', 'departure_datetime')
+    
     # Statuts
     SCHEDULED = 'scheduled'
     BOARDING = 'boarding'
@@ -207,12 +226,27 @@ class Trip(models.Model):
             models.Index(fields=['company', 'status']),
             models.Index(fields=['departure_datetime', 'status']),
             models.Index(fields=['status', 'is_active']),
+            models.Index(fields=['vehicle', 'departure_datetime']),
         ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(available_seats__lte=models.F('total_seats')),
                 name='available_seats_not_exceed_total'
             ),
+            # Un véhicule ne peut pas avoir deux voyages actifs qui se chevauchent.
+            # int8range(vehicle_id, vehicle_id, '[]') permet l'égalité sur le
+            # véhicule avec l'opérateur && natif de GiST (sans btree_gist).
+            ExclusionConstraint(
+                name='trips_vehicle_no_overlap',
+                expressions=[
+                    (Int8Range('vehicle_id', 'vehicle_id', models.Value('[]')), RangeOperators.OVERLAPS),
+                    (
+                        TsTzRange('departure_datetime', 'estimated_arrival_datetime', models.Value('[)')),
+                        RangeOperators.OVERLAPS
+                    ),
+                ],
+                condition=~models.Q(status__in=['cancelled', 'completed'])
+            ),
         ]
     
     def __str__(self):
@@ -253,20 +287,121 @@ class Trip(models.Model):
         return ((self.total_seats - self.available_seats) / self.total_seats) * 100
     
     def reserve_seats(self, count=1):
-        """Réserve des places"""
-        if self.available_seats >= count:
-            self.available_seats -= count
-            self.reserved_seats += count
-            self.save(update_fields=['available_seats', 'reserved_seats'])
-            return True
-        return False
+        """Réserve des places (UPDATE conditionnel atomique)"""
+        from apps.trips.services import SeatInventory
+        
+        reserved = SeatInventory.reserve(self, count)
+        self.refresh_from_db(fields=['available_seats', 'reserved_seats'])
+        return reserved
     
     def release_seats(self, count=1):
-        """Libère des places"""
-        self.available_seats += count
-        self.reserved_seats = max(0, self.reserved_seats - count)
-        self.save(update_fields=['available_seats', 'reserved_seats'])
+        """Libère des places (UPDATE atomique)"""
+        from apps.trips.services import SeatInventory
+        
+        SeatInventory.release(self, count)
+        self.refresh_from_db(fields=['available_seats', 'reserved_seats'])
     
     def calculate_commission(self):
         """Calcule la commission de la plateforme"""
-        return self.company.calculate_commission(self.total_revenue)
\ No newline at end of file
+        return self.company.calculate_commission(self.total_revenue)
+
+class TripSearchIndex(models.Model):
+    """
+    Index de recherche précalculé (une ligne compacte par voyage réservable)
+    
+    Clé de lecture : (ville de départ, ville d'arrivée, date locale).
+    Le payload contient la sortie de TripListSerializer hors champs de places,
+    qui sont gardés en colonnes pour être mis à jour sans re-sérialisation.
+    """
+    
+    trip = models.OneToOneField(
+        Trip,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+        verbose_name=_('voyage')
+    )
+    
+    departure_city = models.ForeignKey(
+        City,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('ville de départ')
+    )
+    
+    arrival_city = models.ForeignKey(
+        City,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('ville d\'arrivée')
+    )
+    
+    departure_date = models.DateField(_('date de départ (locale)'))
+    departure_datetime = models.DateTimeField(_('date/heure de départ'))
+    arrival_datetime = models.DateTimeField(_('date/heure d\'arrivée estimée'))
+    
+    base_price = models.DecimalField(_('prix de base'), max_digits=10, decimal_places=2)
+    available_seats = models.PositiveIntegerField(_('places disponibles'))
+    total_seats = models.PositiveIntegerField(_('places totales'))
+    
+    payload = models.JSONField(_('données pré-sérialisées'), default=dict)
+    
+    updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
+    
+    class Meta:
+        db_table = 'trip_search_index'
+        verbose_name = _('index de recherche voyage')
+        verbose_name_plural = _('index de recherche voyages')
+        ordering = ['departure_datetime']
+        indexes = [
+            models.Index(
+                fields=['departure_city', 'arrival_city', 'departure_date', 'departure_datetime'],
+                name='trip_search_route_day_idx'
+            ),
+            models.Index(
+                fields=['departure_date', 'updated_at'],
+                name='trip_search_day_updated_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Index {self.trip_id} - {self.departure_date}"
+
+
+class CityPopularity(models.Model):
+    """
+    Popularité des villes, maintenue incrémentalement
+    
+    Mise à jour à la création/annulation des voyages et à la vente des
+    tickets (voir CityPopularityService) : le classement est une simple
+    lecture des k premières lignes d'un index.
+    """
+    
+    city = models.OneToOneField(
+        City,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+        verbose_name=_('ville')
+    )
+    
+    trip_count = models.IntegerField(_('voyages (départs + arrivées)'), default=0)
+    tickets_sold = models.IntegerField(_('tickets vendus'), default=0)
+    
+    # Somme des poids 2^((t - repère) / demi-vie) des ventes (décroissance vers l'avant)
+    recent_bookings = models.FloatField(_('ventes récentes (pondérées)'), default=0)
+    
+    updated_at = models.DateTimeField(_('modifié le'), auto_now=True)
+    
+    class Meta:
+        db_table = 'city_popularity'
+        verbose_name = _('popularité ville')
+        verbose_name_plural = _('popularité villes')
+        indexes = [
+            models.Index(fields=['-trip_count'], name='city_pop_trips_idx'),
+            models.Index(fields=['-tickets_sold'], name='city_pop_sold_idx'),
+            models.Index(fields=['-recent_bookings'], name='city_pop_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Popularité {self.city_id}"
@@ -2,12 +2,18 @@
 Serializers pour les voyages
 """
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from apps.trips.models import Trip, City
+from apps.trips.connections import ConnectionSearchService
+from apps.trips.services import TripSchedulingService, VehicleScheduleService
 from apps.fleet.serializers import VehicleListSerializer
 from apps.companies.serializers import CompanyListSerializer
 
 
+VEHICLE_OVERLAP_ERROR = 'Ce véhicule est déjà affecté à un voyage sur ce créneau.'
+
+
 class CitySerializer(serializers.ModelSerializer):
     """Serializer pour les villes"""
     
@@ -65,6 +71,16 @@ class TripCreateSerializer(serializers.ModelSerializer):
                 'vehicle': 'Ce véhicule n\'est pas disponible.'
             })
         
+        # Vérifier que le véhicule n'est pas déjà affecté sur ce créneau
+        if VehicleScheduleService.overlapping_trips(
+            attrs['vehicle'],
+            attrs['departure_datetime'],
+            attrs['estimated_arrival_datetime']
+        ).exists():
+            raise serializers.ValidationError({
+                'vehicle': VEHICLE_OVERLAP_ERROR
+            })
+        
         return attrs
     
     def create(self, validated_data):
@@ -75,10 +91,123 @@ class TripCreateSerializer(serializers.ModelSerializer):
         validated_data['company'] = request.user.company
         validated_data['created_by'] = request.user
         
-        trip = Trip.objects.create(**validated_data)
+        try:
+            with transaction.atomic():
+                trip = Trip.objects.create(**validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({
+                'vehicle': VEHICLE_OVERLAP_ERROR
+            })
         return trip
 
 
+class TripBulkScheduleSerializer(serializers.ModelSerializer):
+    """Serializer pour programmer des départs récurrents en une requête"""
+    
+    start_date = serializers.DateField(write_only=True)
+    end_date = serializers.DateField(write_only=True)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        required=False,
+        write_only=True,
+        help_text='Jours de la semaine (0 = lundi ... 6 = dimanche), tous par défaut'
+    )
+    departure_times = serializers.ListField(
+        child=serializers.TimeField(),
+        min_length=1,
+        write_only=True
+    )
+    
+    class Meta:
+        model = Trip
+        fields = [
+            'vehicle', 'departure_city', 'arrival_city',
+            'departure_location', 'arrival_location',
+            'estimated_duration', 'distance_km', 'base_price',
+            'allows_cancellation', 'cancellation_deadline_hours',
+            'notes', 'driver_notes',
+            'start_date', 'end_date', 'weekdays', 'departure_times'
+        ]
+    
+    def validate(self, attrs):
+        """Validations croisées et développement du calendrier"""
+        
+        if attrs['departure_city'] == attrs['arrival_city']:
+            raise serializers.ValidationError({
+                'arrival_city': 'La ville d\'arrivée doit être différente de la ville de départ.'
+            })
+        
+        if attrs['end_date'] < attrs['start_date']:
+            raise serializers.ValidationError({
+                'end_date': 'La date de fin doit être après la date de début.'
+            })
+        
+        # Vérifier que le véhicule appartient à la compagnie
+        request = self.context.get('request')
+        if request and request.user.company:
+            if attrs['vehicle'].company != request.user.company:
+                raise serializers.ValidationError({
+                    'vehicle': 'Ce véhicule n\'appartient pas à votre compagnie.'
+                })
+        
+        if not attrs['vehicle'].is_available:
+            raise serializers.ValidationError({
+                'vehicle': 'Ce véhicule n\'est pas disponible.'
+            })
+        
+        occurrences = TripSchedulingService.expand(
+            start_date=attrs.pop('start_date'),
+            end_date=attrs.pop('end_date'),
+            weekdays=set(attrs.pop('weekdays', None) or range(7)),
+            departure_times=attrs.pop('departure_times'),
+            duration_minutes=attrs['estimated_duration']
+        )
+        
+        if not occurrences:
+            raise serializers.ValidationError('Aucun départ ne correspond à ce calendrier.')
+        
+        if len(occurrences) > TripSchedulingService.MAX_OCCURRENCES:
+            raise serializers.ValidationError(
+                f'Maximum {TripSchedulingService.MAX_OCCURRENCES} départs par programmation.'
+            )
+        
+        if occurrences[0][0] <= timezone.now():
+            raise serializers.ValidationError({
+                'start_date': 'Tous les départs doivent être dans le futur.'
+            })
+        
+        # Disponibilité du véhicule pour toutes les occurrences (une seule lecture)
+        conflicts = VehicleScheduleService.find_conflicts(attrs['vehicle'], occurrences)
+        if conflicts:
+            raise serializers.ValidationError({
+                'vehicle': [
+                    f'Véhicule déjà occupé le {timezone.localtime(departure).strftime("%d/%m/%Y à %H:%M")}.'
+                    for departure in conflicts[:10]
+                ]
+            })
+        
+        attrs['occurrences'] = occurrences
+        return attrs
+    
+    def create(self, validated_data):
+        """Créer tous les voyages du calendrier"""
+        request = self.context.get('request')
+        occurrences = validated_data.pop('occurrences')
+        
+        try:
+            return TripSchedulingService.bulk_schedule(
+                company=request.user.company,
+                user=request.user,
+                template=validated_data,
+                occurrences=occurrences
+            )
+        except IntegrityError:
+            # Contrainte d'exclusion : créneau pris entre la validation et l'insertion
+            raise serializers.ValidationError({
+                'vehicle': VEHICLE_OVERLAP_ERROR
+            })
+
+
 class TripDetailSerializer(serializers.ModelSerializer):
     """Serializer détaillé pour un voyage"""
     
@@ -133,6 +262,43 @@ class TripUpdateSerializer(serializers.ModelSerializer):
         if value <= timezone.now():
             raise serializers.ValidationError('La date de départ doit être dans le futur.')
         return value
+    
+    def validate(self, attrs):
+        """Vérifier le créneau du véhicule si les horaires ou le statut changent"""
+        trip = self.instance
+        start = attrs.get('departure_datetime', trip.departure_datetime)
+        end = attrs.get('estimated_arrival_datetime', trip.estimated_arrival_datetime)
+        status = attrs.get('status', trip.status)
+        
+        if end <= start:
+            raise serializers.ValidationError({
+                'estimated_arrival_datetime': 'L\'heure d\'arrivée doit être après l\'heure de départ.'
+            })
+        
+        rescheduled = (
+            start != trip.departure_datetime or
+            end != trip.estimated_arrival_datetime or
+            trip.status in [Trip.CANCELLED, Trip.COMPLETED]
+        )
+        if status not in [Trip.CANCELLED, Trip.COMPLETED] and rescheduled:
+            if VehicleScheduleService.overlapping_trips(
+                trip.vehicle, start, end, exclude_trip_ids=[trip.pk]
+            ).exists():
+                raise serializers.ValidationError({
+                    'departure_datetime': VEHICLE_OVERLAP_ERROR
+                })
+        
+        return attrs
+    
+    def update(self, instance, validated_data):
+        """Mettre à jour un voyage"""
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({
+                'departure_datetime': VEHICLE_OVERLAP_ERROR
+            })
 
 
 class TripListSerializer(serializers.ModelSerializer):
@@ -167,4 +333,61 @@ class TripSearchSerializer(serializers.Serializer):
         if value < timezone.now().date():
             # On accepte aujourd'hui, mais pas hier
             raise serializers.ValidationError('La date de départ ne peut pas être dans le passé.')
-        return value
\ No newline at end of file
+        return value
+
+class TripConnectionSearchSerializer(TripSearchSerializer):
+    """Serializer pour la recherche d'itinéraires avec correspondances"""
+    
+    SORT_CHOICES = [
+        (ConnectionSearchService.SORT_ARRIVAL, 'Arrivée la plus tôt'),
+        (ConnectionSearchService.SORT_PRICE, 'Prix le plus bas'),
+    ]
+    
+    max_transfers = serializers.IntegerField(
+        required=False, default=2, min_value=0, max_value=ConnectionSearchService.MAX_TRANSFERS
+    )
+    min_layover = serializers.IntegerField(required=False, default=30, min_value=0, max_value=240)
+    max_wait = serializers.IntegerField(required=False, default=360, min_value=15, max_value=1440)
+    sort = serializers.ChoiceField(
+        choices=SORT_CHOICES, required=False, default=ConnectionSearchService.SORT_ARRIVAL
+    )
+    limit = serializers.IntegerField(required=False, default=5, min_value=1, max_value=20)
+    
+    def validate(self, data):
+        """Vérifier la cohérence des temps de correspondance (en minutes)"""
+        if data['max_wait'] < data['min_layover']:
+            raise serializers.ValidationError({
+                'max_wait': 'L\'attente maximale doit être supérieure à la correspondance minimale.'
+            })
+        return data
+
+
+class TripFareCalendarSerializer(serializers.Serializer):
+    """Serializer pour le calendrier des prix d'une route"""
+    
+    MAX_DAYS = 62
+    
+    departure_city = serializers.IntegerField(required=True)
+    arrival_city = serializers.IntegerField(required=True)
+    start_date = serializers.DateField(required=True)
+    end_date = serializers.DateField(required=True)
+    passengers = serializers.IntegerField(required=False, default=1, min_value=1, max_value=10)
+    
+    def validate(self, data):
+        """Vérifier la période demandée"""
+        if data['start_date'] < timezone.localdate():
+            raise serializers.ValidationError({
+                'start_date': 'La date de début ne peut pas être dans le passé.'
+            })
+        
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({
+                'end_date': 'La date de fin doit être postérieure à la date de début.'
+            })
+        
+        if (data['end_date'] - data['start_date']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({
+                'end_date': f'La période ne peut pas dépasser {self.MAX_DAYS} jours.'
+            })
+        
+        return data
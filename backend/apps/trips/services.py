@@ -0,0 +1,1106 @@
+"""
+Services pour la gestion des voyages
+"""
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from apps.trips.models import City, CityPopularity, Trip, TripSearchIndex
+from utils.autocomplete import PrefixTrie, TrigramIndex, normalize
+from utils.intervals import IntervalIndex, find_overlapping
+
+
+# Champs de TripListSerializer qui dépendent des places (gardés hors payload)
+SEAT_FIELDS = ('available_seats', 'total_seats', 'occupancy_rate')
+
+
+def build_search_result(payload, available_seats, total_seats):
+    """Fusionner le payload pré-sérialisé avec les compteurs de places"""
+    result = dict(payload)
+    result['available_seats'] = available_seats
+    result['total_seats'] = total_seats
+    result['occupancy_rate'] = (
+        ((total_seats - available_seats) / total_seats) * 100 if total_seats else 0
+    )
+    return result
+
+
+class TripSearchIndexService:
+    """
+    Maintenance incrémentale de l'index de recherche route/jour
+
+    Une ligne par voyage réservable (programmé et actif), mise à jour à chaque
+    création/modification/annulation de voyage et à chaque mouvement de places.
+    """
+
+    @staticmethod
+    def is_indexable(trip):
+        """Un voyage n'est indexé que s'il est réservable"""
+        return trip.is_active and trip.status == Trip.SCHEDULED
+
+    @staticmethod
+    def local_date(value):
+        """Date locale (fuseau courant) d'une date/heure"""
+        return timezone.localtime(value).date()
+
+    @staticmethod
+    def build_payload(trip):
+        """Pré-sérialiser un voyage (sans les champs de places)"""
+        from apps.trips.serializers import TripListSerializer
+
+        data = dict(TripListSerializer(trip).data)
+        for field in SEAT_FIELDS:
+            data.pop(field, None)
+        return data
+
+    @classmethod
+    def sync_trip(cls, trip):
+        """Créer, mettre à jour ou retirer l'entrée d'un voyage"""
+        TripSearchCache.bump_version(trip.departure_city_id, trip.arrival_city_id)
+
+        if not cls.is_indexable(trip):
+            cls.remove_trip(trip.pk)
+            return None
+
+        entry, _ = TripSearchIndex.objects.update_or_create(
+            trip_id=trip.pk,
+            defaults={
+                'departure_city_id': trip.departure_city_id,
+                'arrival_city_id': trip.arrival_city_id,
+                'departure_date': cls.local_date(trip.departure_datetime),
+                'departure_datetime': trip.departure_datetime,
+                'arrival_datetime': trip.estimated_arrival_datetime,
+                'base_price': trip.base_price,
+                'available_seats': trip.available_seats,
+                'total_seats': trip.total_seats,
+                'payload': cls.build_payload(trip),
+            }
+        )
+        return entry
+
+    @classmethod
+    def sync_trips(cls, queryset):
+        """Resynchroniser un ensemble de voyages (actions admin, reconstruction)"""
+        queryset = queryset.select_related('company', 'departure_city', 'arrival_city')
+        count = 0
+        for trip in queryset.iterator():
+            cls.sync_trip(trip)
+            count += 1
+        return count
+
+    @classmethod
+    def index_new_trips(cls, trips):
+        """Indexer en une insertion des voyages créés en masse (bulk_create)"""
+        entries = [
+            TripSearchIndex(
+                trip_id=trip.pk,
+                departure_city_id=trip.departure_city_id,
+                arrival_city_id=trip.arrival_city_id,
+                departure_date=cls.local_date(trip.departure_datetime),
+                departure_datetime=trip.departure_datetime,
+                arrival_datetime=trip.estimated_arrival_datetime,
+                base_price=trip.base_price,
+                available_seats=trip.available_seats,
+                total_seats=trip.total_seats,
+                payload=cls.build_payload(trip),
+            )
+            for trip in trips
+            if cls.is_indexable(trip)
+        ]
+        TripSearchIndex.objects.bulk_create(entries)
+
+        for departure_city_id, arrival_city_id in {
+            (trip.departure_city_id, trip.arrival_city_id) for trip in trips
+        }:
+            TripSearchCache.bump_version(departure_city_id, arrival_city_id)
+        return len(entries)
+
+    @staticmethod
+    def update_seats(trip_id, available_seats):
+        """Mettre à jour uniquement le compteur de places (sans re-sérialisation)"""
+        return TripSearchIndex.objects.filter(trip_id=trip_id).update(
+            available_seats=available_seats,
+            updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def remove_trip(trip_id):
+        """Retirer un voyage de l'index"""
+        return TripSearchIndex.objects.filter(trip_id=trip_id).delete()[0]
+
+    @classmethod
+    def rebuild(cls):
+        """Reconstruire entièrement l'index depuis la table trips"""
+        TripSearchIndex.objects.all().delete()
+        return cls.sync_trips(
+            Trip.objects.filter(
+                status=Trip.SCHEDULED,
+                is_active=True,
+                departure_datetime__gte=timezone.now()
+            )
+        )
+
+    @classmethod
+    def search(cls, departure_city_id, arrival_city_id, departure_date, passengers=1, search_start=None):
+        """
+        Rechercher les voyages d'une route pour un jour donné
+
+        Une seule lecture sur la clé (départ, arrivée, date) filtrée sur les
+        places disponibles : pas de jointure ni de sérialisation.
+
+        Returns:
+            list: Résultats au format TripListSerializer
+        """
+        queryset = TripSearchIndex.objects.filter(
+            departure_city_id=departure_city_id,
+            arrival_city_id=arrival_city_id,
+            departure_date=departure_date,
+            available_seats__gte=passengers
+        )
+
+        if search_start is not None:
+            queryset = queryset.filter(departure_datetime__gte=search_start)
+
+        rows = queryset.order_by('departure_datetime').values_list(
+            'payload', 'available_seats', 'total_seats'
+        )
+
+        return [
+            build_search_result(payload, available_seats, total_seats)
+            for payload, available_seats, total_seats in rows
+        ]
+
+    @staticmethod
+    def fare_calendar(departure_city_id, arrival_city_id, start_date, end_date, passengers=1, search_start=None):
+        """
+        Prix minimum et disponibilités par jour sur une période
+
+        Une seule requête groupée sur la clé (départ, arrivée, date) de
+        l'index, dont les places sont tenues à jour à chaque réservation.
+
+        Returns:
+            list: une entrée par jour de la période (jours sans voyage inclus)
+        """
+        bookable = Q(available_seats__gte=passengers)
+        queryset = TripSearchIndex.objects.filter(
+            departure_city_id=departure_city_id,
+            arrival_city_id=arrival_city_id,
+            departure_date__range=(start_date, end_date)
+        )
+
+        if search_start is not None:
+            queryset = queryset.filter(departure_datetime__gte=search_start)
+
+        rows = {
+            row['departure_date']: row
+            for row in queryset.values('departure_date').annotate(
+                min_price=Min('base_price', filter=bookable),
+                trip_count=Count('trip_id', filter=bookable),
+                available_seats=Sum('available_seats', filter=bookable)
+            ).order_by()
+        }
+
+        calendar = []
+        day = start_date
+        while day <= end_date:
+            row = rows.get(day)
+            calendar.append({
+                'date': day,
+                'min_price': str(row['min_price']) if row and row['min_price'] is not None else None,
+                'trip_count': row['trip_count'] if row else 0,
+                'available_seats': (row['available_seats'] or 0) if row else 0,
+            })
+            day += timedelta(days=1)
+
+        return calendar
+
+
+class TripSearchCache:
+    """
+    Cache des réponses de recherche, versionné par route
+
+    Chaque route (départ, arrivée) porte un compteur de version d'inventaire
+    incrémenté à chaque changement de voyage ou de places. La version fait
+    partie de la clé : les entrées périmées ne sont plus jamais lues et
+    expirent d'elles-mêmes, sans parcours ni suppression de clés.
+    """
+
+    VERSION_KEY = 'trip_search_version:{departure}:{arrival}'
+    RESPONSE_KEY = 'trip_search:{departure}:{arrival}:{date}:{passengers}:{page}:{page_size}:v{version}'
+    CALENDAR_KEY = 'trip_fares:{departure}:{arrival}:{start}:{end}:{passengers}:v{version}'
+
+    # Durée de vie des réponses (plus courte le jour même : les départs passés sortent)
+    TIMEOUT = 300
+    TODAY_TIMEOUT = 60
+
+    @classmethod
+    def _version_key(cls, departure_city_id, arrival_city_id):
+        return cls.VERSION_KEY.format(departure=departure_city_id, arrival=arrival_city_id)
+
+    @staticmethod
+    def _initial_version():
+        # Basée sur l'horloge : une version évincée du cache ne peut pas
+        # retomber sur une valeur déjà utilisée par d'anciennes réponses
+        return int(time.time() * 1000)
+
+    @classmethod
+    def get_version(cls, departure_city_id, arrival_city_id):
+        """Version d'inventaire courante d'une route"""
+        key = cls._version_key(departure_city_id, arrival_city_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, cls._initial_version(), None)
+            version = cache.get(key)
+        return version
+
+    @classmethod
+    def bump_version(cls, departure_city_id, arrival_city_id):
+        """Invalider toutes les réponses en cache d'une route"""
+        key = cls._version_key(departure_city_id, arrival_city_id)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            version = cls._initial_version()
+            cache.set(key, version, None)
+            return version
+
+    @classmethod
+    def make_key(cls, departure_city_id, arrival_city_id, departure_date, passengers, page, page_size):
+        """Clé de réponse pour la version courante de la route"""
+        return cls.RESPONSE_KEY.format(
+            departure=departure_city_id,
+            arrival=arrival_city_id,
+            date=departure_date.isoformat(),
+            passengers=passengers,
+            page=page,
+            page_size=page_size,
+            version=cls.get_version(departure_city_id, arrival_city_id)
+        )
+
+    @classmethod
+    def make_calendar_key(cls, departure_city_id, arrival_city_id, start_date, end_date, passengers):
+        """Clé du calendrier des prix pour la version courante de la route"""
+        return cls.CALENDAR_KEY.format(
+            departure=departure_city_id,
+            arrival=arrival_city_id,
+            start=start_date.isoformat(),
+            end=end_date.isoformat(),
+            passengers=passengers,
+            version=cls.get_version(departure_city_id, arrival_city_id)
+        )
+
+    @staticmethod
+    def get(key):
+        return cache.get(key)
+
+    @classmethod
+    def set(cls, key, data, is_today=False):
+        cache.set(key, data, cls.TODAY_TIMEOUT if is_today else cls.TIMEOUT)
+
+
+class SeatInventory:
+    """
+    Moteur d'inventaire des places sans verrou de ligne
+
+    Chaque mouvement est un UPDATE conditionnel unique exécuté par la base
+    (available_seats = available_seats - n WHERE available_seats >= n) :
+    pas de lecture préalable, donc ni mise à jour perdue ni survente, et
+    les réservations concurrentes d'un même voyage ne se sérialisent pas
+    sur un SELECT ... FOR UPDATE.
+    """
+
+    class Unavailable(Exception):
+        """Places insuffisantes sur un voyage d'un lot"""
+
+    @staticmethod
+    def _route_changed(trip):
+        # Invalider le cache après commit : un lecteur concurrent ne doit pas
+        # mettre en cache l'ancien inventaire sous la nouvelle version
+        departure_city_id, arrival_city_id = trip.departure_city_id, trip.arrival_city_id
+        transaction.on_commit(
+            lambda: TripSearchCache.bump_version(departure_city_id, arrival_city_id)
+        )
+
+    @classmethod
+    def reserve(cls, trip, count=1):
+        """
+        Réserver des places de manière atomique
+
+        Returns:
+            bool: True si les places ont été réservées, False si insuffisantes
+        """
+        updated = Trip.objects.filter(
+            pk=trip.pk,
+            available_seats__gte=count
+        ).update(
+            available_seats=F('available_seats') - count,
+            reserved_seats=F('reserved_seats') + count,
+            updated_at=timezone.now()
+        )
+
+        if not updated:
+            return False
+
+        TripSearchIndex.objects.filter(trip_id=trip.pk).update(
+            available_seats=Greatest(F('available_seats') - count, 0),
+            updated_at=timezone.now()
+        )
+        cls._route_changed(trip)
+        return True
+
+    @classmethod
+    def release(cls, trip, count=1):
+        """Libérer des places (bornées par la capacité du voyage)"""
+        updated = Trip.objects.filter(pk=trip.pk).update(
+            available_seats=Least(F('available_seats') + count, F('total_seats')),
+            reserved_seats=Greatest(F('reserved_seats') - count, 0),
+            updated_at=timezone.now()
+        )
+
+        if updated:
+            TripSearchIndex.objects.filter(trip_id=trip.pk).update(
+                available_seats=Least(F('available_seats') + count, F('total_seats')),
+                updated_at=timezone.now()
+            )
+            cls._route_changed(trip)
+        return bool(updated)
+
+    @classmethod
+    def reserve_batch(cls, items):
+        """
+        Réserver des places sur plusieurs voyages en tout-ou-rien
+
+        Args:
+            items: itérable de tuples (trip, nombre de places)
+
+        Returns:
+            bool: True si toutes les réservations ont réussi, sinon aucune n'est appliquée
+        """
+        # Regrouper par voyage et verrouiller dans un ordre stable (pas d'interblocage)
+        counts = {}
+        trips = {}
+        for trip, count in items:
+            counts[trip.pk] = counts.get(trip.pk, 0) + count
+            trips[trip.pk] = trip
+
+        try:
+            with transaction.atomic():
+                for trip_id in sorted(counts):
+                    if not cls.reserve(trips[trip_id], counts[trip_id]):
+                        raise cls.Unavailable(trip_id)
+        except cls.Unavailable:
+            return False
+
+        return True
+
+
+class VehicleScheduleService:
+    """
+    Détection des doubles affectations de véhicules
+
+    Garantie en base par une contrainte d'exclusion GiST sur
+    (véhicule, [départ, arrivée estimée)) pour les voyages ni annulés ni
+    terminés (Postgres) ; ce service fait la même vérification côté
+    application pour renvoyer des erreurs lisibles avant l'insertion.
+    """
+
+    @staticmethod
+    def blocking_trips():
+        """Voyages qui immobilisent leur véhicule"""
+        return Trip.objects.exclude(status__in=[Trip.CANCELLED, Trip.COMPLETED])
+
+    @classmethod
+    def overlapping_trips(cls, vehicle, start, end, exclude_trip_ids=()):
+        """Voyages du véhicule qui chevauchent [start, end)"""
+        return cls.blocking_trips().filter(
+            vehicle=vehicle,
+            departure_datetime__lt=end,
+            estimated_arrival_datetime__gt=start
+        ).exclude(pk__in=exclude_trip_ids)
+
+    @classmethod
+    def free_vehicles(cls, queryset, start, end):
+        """Véhicules d'un queryset sans voyage sur [start, end)"""
+        busy = cls.blocking_trips().filter(
+            departure_datetime__lt=end,
+            estimated_arrival_datetime__gt=start
+        ).values('vehicle_id')
+        return queryset.exclude(pk__in=busy)
+
+    @classmethod
+    def find_conflicts(cls, vehicle, occurrences, exclude_trip_ids=()):
+        """
+        Occurrences qui chevauchent un voyage du véhicule ou une autre occurrence
+
+        Une seule lecture des voyages du véhicule sur la fenêtre couverte,
+        chargée dans un arbre d'intervalles.
+
+        Args:
+            occurrences: tuples (départ, arrivée estimée)
+
+        Returns:
+            list: départs en conflit (triés)
+        """
+        if not occurrences:
+            return []
+
+        window_start = min(start for start, _ in occurrences)
+        window_end = max(end for _, end in occurrences)
+
+        index = IntervalIndex(
+            cls.overlapping_trips(
+                vehicle, window_start, window_end, exclude_trip_ids
+            ).values_list('departure_datetime', 'estimated_arrival_datetime', 'pk')
+        )
+
+        conflicts = {start for start, end in occurrences if index.overlaps(start, end)}
+        conflicts.update(
+            start for start, _, _ in find_overlapping(
+                [(start, end, None) for start, end in occurrences]
+            )
+        )
+        return sorted(conflicts)
+
+
+class TripSchedulingService:
+    """
+    Programmation en masse de départs récurrents
+
+    Le calendrier (jours de semaine, heures, période) est développé en
+    occurrences, la disponibilité du véhicule est vérifiée pour toutes en
+    une seule lecture (VehicleScheduleService), puis les voyages sont
+    insérés en une fois.
+    """
+
+    # Plafond d'occurrences par demande
+    MAX_OCCURRENCES = 500
+
+    @staticmethod
+    def expand(start_date, end_date, weekdays, departure_times, duration_minutes):
+        """
+        Développer un calendrier en occurrences (fuseau horaire courant)
+
+        Returns:
+            list: tuples (départ, arrivée estimée) triés par départ
+        """
+        current_tz = timezone.get_current_timezone()
+        duration = timedelta(minutes=duration_minutes)
+        occurrences = []
+
+        day = start_date
+        while day <= end_date:
+            if day.weekday() in weekdays:
+                for departure_time in departure_times:
+                    departure = timezone.make_aware(datetime.combine(day, departure_time), current_tz)
+                    occurrences.append((departure, departure + duration))
+            day += timedelta(days=1)
+
+        return sorted(occurrences)
+
+    @staticmethod
+    def bulk_schedule(company, user, template, occurrences):
+        """
+        Créer les voyages d'un calendrier en une transaction
+
+        Args:
+            company: Compagnie propriétaire
+            user: Utilisateur qui programme
+            template: champs communs des voyages (véhicule, villes, prix...)
+            occurrences: tuples (départ, arrivée estimée)
+
+        Returns:
+            list: Voyages créés
+        """
+        from apps.companies.models import Company
+        from apps.logs.models import ActivityLog
+
+        vehicle = template['vehicle']
+
+        with transaction.atomic():
+            trips = Trip.objects.bulk_create([
+                Trip(
+                    company=company,
+                    created_by=user,
+                    departure_datetime=departure,
+                    estimated_arrival_datetime=arrival,
+                    total_seats=vehicle.total_seats,
+                    available_seats=vehicle.total_seats,
+                    is_recurring=True,
+                    **template
+                )
+                for departure, arrival in occurrences
+            ])
+
+            Company.objects.filter(pk=company.pk).update(
+                total_trips=F('total_trips') + len(trips)
+            )
+
+            first, last = trips[0], trips[-1]
+            ActivityLog.objects.create(
+                user=user,
+                action=ActivityLog.TRIP_CREATE,
+                description=(
+                    f"Programmation de {len(trips)} voyage(s) : "
+                    f"{first.departure_city.name} → {first.arrival_city.name}"
+                ),
+                details={
+                    'trip_count': len(trips),
+                    'trip_ids': [str(trip.id) for trip in trips],
+                    'departure': first.departure_city.name,
+                    'arrival': first.arrival_city.name,
+                    'first_departure': first.departure_datetime.isoformat(),
+                    'last_departure': last.departure_datetime.isoformat(),
+                    'vehicle': vehicle.registration_number,
+                    'price': str(first.base_price)
+                },
+                content_type='Trip',
+                severity=ActivityLog.SEVERITY_INFO
+            )
+
+            TripSearchIndexService.index_new_trips(trips)
+            CityPopularityService.record_trips_added(trips)
+
+        return trips
+
+
+class CityPopularityService:
+    """
+    Maintenance incrémentale du classement des villes (CityPopularity)
+
+    - trip_count : voyages actifs non annulés, comptés une fois au départ et
+      une fois à l'arrivée (pas de produit de jointures)
+    - tickets_sold : tickets confirmés ou utilisés
+    - recent_bookings : ventes en décroissance exponentielle « vers l'avant » :
+      chaque vente ajoute 2^((t - LANDMARK) / HALF_LIFE), l'ordre des villes
+      est donc stable dans le temps sans jamais réécrire les scores
+    """
+
+    SOLD_STATUSES = ['confirmed', 'used']
+
+    HALF_LIFE = timedelta(days=7)
+    # Les poids restent représentables (float) pendant ~1000 demi-vies
+    LANDMARK = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+    BY_TRIPS = 'trips'
+    BY_SALES = 'sales'
+    BY_RECENT = 'recent'
+    ORDERING = {
+        BY_TRIPS: '-trip_count',
+        BY_SALES: '-tickets_sold',
+        BY_RECENT: '-recent_bookings',
+    }
+
+    @staticmethod
+    def counts(is_active, status):
+        return bool(is_active) and status != Trip.CANCELLED
+
+    @classmethod
+    def is_counted(cls, trip):
+        """Un voyage compte s'il est actif et non annulé"""
+        return cls.counts(trip.is_active, trip.status)
+
+    @classmethod
+    def previous_route_state(cls, trip):
+        """
+        État avant la sauvegarde en cours : (ville de départ, ville d'arrivée, compté)
+
+        Lu dans l'instantané de FieldTrackerMixin, sans relire la ligne ; un
+        champ inchangé (ou non chargé) garde sa valeur courante.
+        """
+        def previous(name):
+            if trip.has_changed(name):
+                return trip.previous_value(name)
+            return getattr(trip, trip._meta.get_field(name).attname)
+
+        return (
+            previous('departure_city'),
+            previous('arrival_city'),
+            cls.counts(previous('is_active'), previous('status'))
+        )
+
+    @classmethod
+    def weight(cls, when=None):
+        """Poids d'une vente à l'instant donné"""
+        when = when or timezone.now()
+        return 2 ** ((when - cls.LANDMARK) / cls.HALF_LIFE)
+
+    @staticmethod
+    def _ensure_rows(city_ids):
+        CityPopularity.objects.bulk_create(
+            [CityPopularity(city_id=city_id) for city_id in city_ids],
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def adjust_trips(cls, deltas):
+        """Appliquer des variations du nombre de voyages par ville"""
+        deltas = {city_id: delta for city_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        cls._ensure_rows(deltas)
+        for city_id, delta in deltas.items():
+            CityPopularity.objects.filter(city_id=city_id).update(
+                trip_count=Greatest(F('trip_count') + delta, 0),
+                updated_at=timezone.now()
+            )
+
+    @classmethod
+    def record_trip_change(cls, old_state, trip):
+        """Répercuter la création ou la modification d'un voyage"""
+        deltas = Counter()
+        if old_state and old_state[2]:
+            deltas[old_state[0]] -= 1
+            deltas[old_state[1]] -= 1
+
+        if cls.is_counted(trip):
+            deltas[trip.departure_city_id] += 1
+            deltas[trip.arrival_city_id] += 1
+
+        cls.adjust_trips(deltas)
+
+    @classmethod
+    def record_trip_removal(cls, trip):
+        """Répercuter la suppression d'un voyage"""
+        if cls.is_counted(trip):
+            deltas = Counter()
+            deltas[trip.departure_city_id] -= 1
+            deltas[trip.arrival_city_id] -= 1
+            cls.adjust_trips(deltas)
+
+    @classmethod
+    def trip_city_counts(cls, queryset):
+        """Contribution d'un ensemble de voyages au classement, par ville"""
+        counts = Counter()
+        for departure_city_id, arrival_city_id in queryset.filter(
+            is_active=True
+        ).exclude(status=Trip.CANCELLED).values_list('departure_city_id', 'arrival_city_id'):
+            counts[departure_city_id] += 1
+            counts[arrival_city_id] += 1
+        return counts
+
+    @classmethod
+    def record_bulk_change(cls, queryset, before):
+        """Répercuter une mise à jour ensembliste (queryset.update, sans signal)"""
+        deltas = cls.trip_city_counts(queryset)
+        deltas.subtract(before)
+        cls.adjust_trips(deltas)
+
+    @classmethod
+    def record_trips_added(cls, trips):
+        """Répercuter des voyages créés en masse (bulk_create, sans signal)"""
+        deltas = Counter()
+        for trip in trips:
+            if cls.is_counted(trip):
+                deltas[trip.departure_city_id] += 1
+                deltas[trip.arrival_city_id] += 1
+        cls.adjust_trips(deltas)
+
+    @classmethod
+    def record_sales(cls, trip, count=1, when=None):
+        """
+        Ajouter (count > 0) ou retirer (count < 0) des ventes sur un voyage
+
+        Args:
+            when: date de la vente (confirmed_at) pour retrouver son poids
+        """
+        if count:
+            cls._apply_sales(trip, count, cls.weight(when) * count)
+
+    @classmethod
+    def remove_sales(cls, trip, sold_at):
+        """Retirer en une fois des ventes annulées (sold_at : dates de confirmation)"""
+        if sold_at:
+            cls._apply_sales(trip, -len(sold_at), -sum(cls.weight(when) for when in sold_at))
+
+    @classmethod
+    def _apply_sales(cls, trip, count, weight):
+        city_ids = {trip.departure_city_id, trip.arrival_city_id}
+        cls._ensure_rows(city_ids)
+        CityPopularity.objects.filter(city_id__in=city_ids).update(
+            tickets_sold=Greatest(F('tickets_sold') + count, 0),
+            recent_bookings=Greatest(F('recent_bookings') + weight, 0.0),
+            updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def sold_at(confirmed_at, created_at):
+        """
+        Date de vente servant au poids d'un ticket
+
+        confirmed_at est vide pour les tickets confirmés avant l'ajout du
+        champ : on retient alors created_at, stable, et non « maintenant »,
+        pour que le retrait d'une vente annule exactement son ajout (et
+        que rebuild retrouve les mêmes poids).
+        """
+        return confirmed_at or created_at
+
+    @classmethod
+    def record_ticket_transition(cls, ticket, old_status):
+        """Répercuter un changement de statut de ticket (vente ou annulation)"""
+        was_sold = old_status in cls.SOLD_STATUSES
+        is_sold = ticket.status in cls.SOLD_STATUSES
+        if was_sold != is_sold:
+            cls.record_sales(
+                ticket.trip,
+                1 if is_sold else -1,
+                cls.sold_at(ticket.confirmed_at, ticket.created_at)
+            )
+
+    @classmethod
+    def top(cls, by=BY_TRIPS, limit=10):
+        """Les villes actives les mieux classées (lecture des k premières lignes)"""
+        ordering = cls.ORDERING[by]
+        return list(
+            CityPopularity.objects.filter(
+                city__is_active=True,
+                **{f'{ordering.lstrip("-")}__gt': 0}
+            ).select_related('city').order_by(ordering, 'city__name')[:limit]
+        )
+
+    @classmethod
+    def recent_score(cls, popularity, now=None):
+        """Ventes récentes ramenées à l'instant présent (équivalent en ventes)"""
+        return popularity.recent_bookings / cls.weight(now)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recalculer entièrement le classement depuis les voyages et tickets"""
+        from apps.tickets.models import Ticket
+
+        trips = cls.trip_city_counts(Trip.objects.all())
+
+        sold = Counter()
+        recent = Counter()
+        for departure_city_id, arrival_city_id, confirmed_at, created_at in Ticket.objects.filter(
+            status__in=cls.SOLD_STATUSES
+        ).values_list(
+            'trip__departure_city_id', 'trip__arrival_city_id', 'confirmed_at', 'created_at'
+        ).iterator():
+            weight = cls.weight(cls.sold_at(confirmed_at, created_at))
+            for city_id in {departure_city_id, arrival_city_id}:
+                sold[city_id] += 1
+                recent[city_id] += weight
+
+        CityPopularity.objects.all().delete()
+        CityPopularity.objects.bulk_create([
+            CityPopularity(
+                city_id=city_id,
+                trip_count=trips[city_id],
+                tickets_sold=sold[city_id],
+                recent_bookings=recent[city_id]
+            )
+            for city_id in set(trips) | set(sold)
+        ])
+        return len(set(trips) | set(sold))
+
+
+CityIndex = namedtuple('CityIndex', ['trie', 'trigrams', 'entries', 'names', 'by_name', 'rank', 'built_at'])
+
+
+class CityAutocompleteService:
+    """
+    Autocomplétion des villes sans accès à la base
+
+    Index en mémoire du processus : trie des noms normalisés (nom complet et
+    chaque mot, sans accents) et trigrammes pour les fautes de frappe.
+    Construit au premier appel ; toute modification de ville incrémente une
+    version en cache, vérifiée au plus toutes les VERSION_CHECK_INTERVAL
+    secondes par chaque processus.
+    """
+
+    VERSION_KEY = 'city_autocomplete_version'
+    VERSION_CHECK_INTERVAL = 30
+    # Reconstruction périodique pour suivre le classement de popularité
+    MAX_AGE = 60 * 60
+    TRIGRAM_THRESHOLD = 0.3
+    MAX_RESULTS = 20
+
+    _index = None
+    _version = None
+    _checked_at = float('-inf')
+    _lock = threading.Lock()
+
+    @classmethod
+    def build(cls):
+        """Construire l'index des villes actives"""
+        from apps.trips.serializers import CitySerializer
+
+        popularity = dict(CityPopularity.objects.values_list('city_id', 'trip_count'))
+        trie = PrefixTrie(max_per_node=cls.MAX_RESULTS)
+        trigram_index = TrigramIndex()
+        entries, names, by_name = {}, {}, defaultdict(list)
+
+        for city in City.objects.filter(is_active=True):
+            name = normalize(city.name)
+            entries[city.pk] = CitySerializer(city).data
+            names[city.pk] = name
+            by_name[name].append(city.pk)
+
+            words = name.split()
+            for position in range(len(words)):
+                trie.insert(' '.join(words[position:]), city.pk)
+            trigram_index.insert(name, city.pk)
+
+        def rank(city_id):
+            return (-popularity.get(city_id, 0), names[city_id])
+
+        trie.finalize(rank)
+        return CityIndex(trie, trigram_index, entries, names, dict(by_name), rank, time.monotonic())
+
+    @classmethod
+    def get_index(cls):
+        """Index courant (reconstruit si une ville a changé)"""
+        now = time.monotonic()
+        if cls._index is not None and now - cls._checked_at < cls.VERSION_CHECK_INTERVAL:
+            return cls._index
+
+        with cls._lock:
+            version = cache.get(cls.VERSION_KEY)
+            if (
+                cls._index is None
+                or version != cls._version
+                or now - cls._index.built_at >= cls.MAX_AGE
+            ):
+                cls._index = cls.build()
+                cls._version = version
+            cls._checked_at = now
+            return cls._index
+
+    @classmethod
+    def invalidate(cls):
+        """Signaler une modification de ville à tous les processus"""
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_KEY, int(time.time() * 1000), None)
+        cls._checked_at = float('-inf')
+
+    @classmethod
+    def search(cls, query, limit=8):
+        """
+        Villes correspondant à une saisie partielle
+
+        Ordre : nom exact, début du nom, début d'un mot du nom, puis
+        similarité trigramme ; à égalité, les villes les plus desservies.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        index = cls.get_index()
+        limit = min(limit, cls.MAX_RESULTS)
+
+        exact = index.by_name.get(query, [])
+        prefixed = sorted(
+            index.trie.search(query),
+            key=lambda city_id: (not index.names[city_id].startswith(query), index.rank(city_id))
+        )
+
+        results = []
+        for city_id in list(exact) + prefixed:
+            if city_id not in results:
+                results.append(city_id)
+
+        if len(results) < limit:
+            for similarity, city_id in sorted(
+                index.trigrams.search(query, cls.TRIGRAM_THRESHOLD),
+                key=lambda match: (-match[0], index.rank(match[1]))
+            ):
+                if city_id not in results:
+                    results.append(city_id)
+
+        return [index.entries[city_id] for city_id in results[:limit]]
+
+
+class TripCancellationService:
+    """
+    Annulation d'un voyage et de ses tickets en opérations ensemblistes
+
+    Les tickets sont annulés par un seul UPDATE (sans signal par ticket),
+    journaux et notifications sont insérés en masse et les places libérées
+    en une fois. L'envoi des notifications est confié à Celery par lots,
+    la progression est suivie dans le cache sous un identifiant de tâche.
+    """
+
+    CANCELLABLE_STATUSES = ['pending', 'confirmed']
+    NOTIFICATION_CHUNK_SIZE = 100
+
+    JOB_KEY = 'trip_cancellation:{job_id}'
+    COUNTER_KEY = 'trip_cancellation:{job_id}:{counter}'
+    TRIP_JOB_KEY = 'trip_cancellation_trip:{trip_id}'
+    JOB_TIMEOUT = 60 * 60 * 24
+
+    @classmethod
+    def cancel(cls, trip, user, reason=''):
+        """
+        Annuler un voyage, ses tickets actifs et planifier les notifications
+
+        Returns:
+            dict: tâche d'envoi des notifications (voir get_job)
+        """
+        from apps.logs.models import ActivityLog
+        from apps.notifications.models import Notification
+        from apps.tickets.models import Ticket
+        from apps.tickets.services import SeatMapService, TicketWalletService
+
+        with transaction.atomic():
+            trip.status = Trip.CANCELLED
+            trip.notes = f"{trip.notes}\nAnnulation: {reason}"
+            trip.save()
+
+            tickets = list(
+                Ticket.objects.select_for_update().filter(
+                    trip=trip,
+                    status__in=cls.CANCELLABLE_STATUSES
+                ).values_list(
+                    'id', 'ticket_number', 'passenger_id', 'passenger_email',
+                    'seat_number', 'status', 'confirmed_at', 'created_at'
+                )
+            )
+
+            now = timezone.now()
+            cancellation_reason = f"Voyage annulé par la compagnie: {reason}"
+            Ticket.objects.filter(id__in=[ticket[0] for ticket in tickets]).update(
+                status=Ticket.CANCELLED,
+                cancelled_at=now,
+                cancellation_reason=cancellation_reason,
+                updated_at=now
+            )
+
+            if tickets:
+                TicketWalletService.mirror([ticket[0] for ticket in tickets], status=Ticket.CANCELLED)
+                SeatInventory.release(trip, len(tickets))
+                SeatMapService.update(trip, release=[ticket[4] for ticket in tickets])
+                CityPopularityService.remove_sales(trip, [
+                    CityPopularityService.sold_at(confirmed_at, created_at)
+                    for _, _, _, _, _, status, confirmed_at, created_at in tickets
+                    if status in CityPopularityService.SOLD_STATUSES
+                ])
+
+            ActivityLog.objects.bulk_create([
+                ActivityLog(
+                    user=user,
+                    action=ActivityLog.TRIP_CANCEL,
+                    description=f"Annulation voyage : {trip.departure_city.name} → {trip.arrival_city.name}",
+                    details={
+                        'trip_id': str(trip.id),
+                        'reason': reason,
+                        'cancelled_tickets': len(tickets)
+                    },
+                    content_type='Trip',
+                    object_id=str(trip.id),
+                    severity=ActivityLog.SEVERITY_WARNING
+                )
+            ] + [
+                ActivityLog(
+                    user_id=passenger_id,
+                    action=ActivityLog.TICKET_CANCEL,
+                    description=f"Ticket {ticket_number} : annulé (voyage annulé)",
+                    details={
+                        'ticket_id': str(ticket_id),
+                        'ticket_number': ticket_number,
+                        'old_status': status,
+                        'new_status': Ticket.CANCELLED
+                    },
+                    content_type='Ticket',
+                    object_id=str(ticket_id),
+                    severity=ActivityLog.SEVERITY_INFO
+                )
+                for ticket_id, ticket_number, passenger_id, _, _, status, _, _ in tickets
+            ])
+
+            departure = timezone.localtime(trip.departure_datetime).strftime('%d/%m/%Y à %H:%M')
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    user_id=passenger_id,
+                    notification_type=Notification.EMAIL,
+                    category=Notification.TRIP_CANCELLED,
+                    title='Voyage annulé',
+                    message=(
+                        f"Votre voyage {trip.departure_city.name} → {trip.arrival_city.name} "
+                        f"du {departure} a été annulé. Raison: {reason}"
+                    ),
+                    metadata={
+                        'trip_id': str(trip.id),
+                        'ticket_id': str(ticket_id)
+                    },
+                    recipient_email=passenger_email
+                )
+                for ticket_id, _, passenger_id, passenger_email, _, _, _, _ in tickets
+            ])
+
+            job = cls._create_job(trip, len(tickets), len(notifications))
+            notification_ids = [notification.id for notification in notifications]
+            transaction.on_commit(lambda: cls._dispatch(job['job_id'], notification_ids))
+
+        return job
+
+    @classmethod
+    def _dispatch(cls, job_id, notification_ids):
+        from apps.trips.tasks import notify_trip_cancellation
+
+        for start in range(0, len(notification_ids), cls.NOTIFICATION_CHUNK_SIZE):
+            notify_trip_cancellation.delay(
+                job_id,
+                notification_ids[start:start + cls.NOTIFICATION_CHUNK_SIZE]
+            )
+
+    @classmethod
+    def _create_job(cls, trip, cancelled_tickets, notifications):
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'trip_id': str(trip.id),
+            'cancelled_tickets': cancelled_tickets,
+            'notifications': notifications,
+            'created_at': timezone.now().isoformat(),
+        }
+        cache.set(cls.JOB_KEY.format(job_id=job['job_id']), job, cls.JOB_TIMEOUT)
+        cache.set(cls.TRIP_JOB_KEY.format(trip_id=trip.id), job['job_id'], cls.JOB_TIMEOUT)
+        return cls._with_progress(job)
+
+    @classmethod
+    def record_progress(cls, job_id, sent=0, failed=0):
+        """Comptabiliser un lot de notifications traité"""
+        for counter, value in (('sent', sent), ('failed', failed)):
+            if not value:
+                continue
+            key = cls.COUNTER_KEY.format(job_id=job_id, counter=counter)
+            cache.add(key, 0, cls.JOB_TIMEOUT)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                cache.set(key, value, cls.JOB_TIMEOUT)
+
+    @classmethod
+    def _with_progress(cls, job):
+        sent = cache.get(cls.COUNTER_KEY.format(job_id=job['job_id'], counter='sent'), 0)
+        failed = cache.get(cls.COUNTER_KEY.format(job_id=job['job_id'], counter='failed'), 0)
+        return {
+            **job,
+            'sent': sent,
+            # Échecs confiés aux nouvelles tentatives de send_email_notification
+            'retrying': failed,
+            'status': 'completed' if sent + failed >= job['notifications'] else 'running',
+        }
+
+    @classmethod
+    def get_job(cls, job_id):
+        """État d'une tâche d'annulation, ou None si inconnue/expirée"""
+        job = cache.get(cls.JOB_KEY.format(job_id=job_id))
+        return cls._with_progress(job) if job else None
+
+    @classmethod
+    def get_trip_job(cls, trip_id):
+        """Dernière tâche d'annulation d'un voyage"""
+        job_id = cache.get(cls.TRIP_JOB_KEY.format(trip_id=trip_id))
+        return cls.get_job(job_id) if job_id else None
@@ -0,0 +1,68 @@
+"""
+Signaux pour le modèle Trip
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.trips.models import City, Trip
+from apps.trips.services import (
+    TripSearchIndexService,
+    TripSearchCache,
+    CityPopularityService,
+    CityAutocompleteService
+)
+from apps.tickets.services import TicketWalletService
+
+
+# Champs modifiés par reserve_seats/release_seats
+SEAT_UPDATE_FIELDS = {'available_seats', 'reserved_seats'}
+
+
+def is_seat_update(update_fields):
+    return bool(update_fields) and set(update_fields) <= SEAT_UPDATE_FIELDS
+
+
+# Champs recopiés dans les portefeuilles de tickets
+SCHEDULE_FIELDS = ('departure_city', 'arrival_city', 'departure_datetime')
+
+
+@receiver(post_save, sender=Trip)
+def trip_post_save(sender, instance, created, update_fields=None, **kwargs):
+    """Maintenir l'index et le cache de recherche à jour"""
+    
+    # Simple mouvement de places : mise à jour du compteur uniquement
+    if is_seat_update(update_fields):
+        TripSearchIndexService.update_seats(instance.pk, instance.available_seats)
+        TripSearchCache.bump_version(instance.departure_city_id, instance.arrival_city_id)
+        return
+    
+    TripSearchIndexService.sync_trip(instance)
+    
+    # État précédent lu dans l'instantané du modèle (FieldTrackerMixin), sans relecture
+    CityPopularityService.record_trip_change(
+        None if created else CityPopularityService.previous_route_state(instance),
+        instance
+    )
+    
+    if not created and any(instance.has_changed(name) for name in SCHEDULE_FIELDS):
+        TicketWalletService.sync_trip(instance)
+
+
+@receiver(post_delete, sender=Trip)
+def trip_post_delete(sender, instance, **kwargs):
+    """Retirer le voyage du classement des villes"""
+    CityPopularityService.record_trip_removal(instance)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def city_changed(sender, instance, **kwargs):
+    """Reconstruire l'index d'autocomplétion après validation"""
+    transaction.on_commit(CityAutocompleteService.invalidate)
+
+
+@receiver(post_save, sender=City)
+def city_renamed(sender, instance, created, **kwargs):
+    """Recopier le nom de la ville dans les portefeuilles de tickets"""
+    if not created:
+        TicketWalletService.rename_city(instance)
@@ -0,0 +1,18 @@
+"""
+Tâches Celery pour les voyages
+"""
+from celery import shared_task
+from apps.notifications.services import NotificationDispatchService
+from apps.trips.services import TripCancellationService
+
+
+@shared_task
+def notify_trip_cancellation(job_id, notification_ids):
+    """
+    Envoyer un lot de notifications d'annulation de voyage
+    
+    Les échecs sont confiés à send_email_notification (nouvelles tentatives).
+    """
+    sent, failed = NotificationDispatchService.send_email_batch(notification_ids)
+    TripCancellationService.record_progress(job_id, sent=len(sent), failed=len(failed))
+    return {'sent': len(sent), 'failed': len(failed)}
@@ -10,12 +10,23 @@ from django.db.models import Q, Count, Sum, F
 from datetime import datetime, timedelta
 
 from apps.trips.models import Trip, City
+from apps.trips.connections import ConnectionSearchService
+from apps.trips.services import (
+    TripSearchIndexService,
+    TripSearchCache,
+    CityPopularityService,
+    CityAutocompleteService,
+    TripCancellationService
+)
 from apps.trips.serializers import (
     TripCreateSerializer,
+    TripBulkScheduleSerializer,
     TripDetailSerializer,
     TripUpdateSerializer,
     TripListSerializer,
     TripSearchSerializer,
+    TripConnectionSearchSerializer,
+    TripFareCalendarSerializer,
     CitySerializer
 )
 from apps.users.permissions import IsApprovedCompagnie, CanManageTrip
@@ -36,17 +47,24 @@ class TripViewSet(viewsets.ModelViewSet):
     search_fields = ['departure_city__name', 'arrival_city__name', 'departure_location']
     ordering_fields = ['departure_datetime', 'base_price', 'created_at']
     ordering = ['departure_datetime']
+    cursor_ordering = ('departure_datetime', 'id')
     
     def get_serializer_class(self):
         """Retourner le serializer approprié"""
         if self.action == 'create':
             return TripCreateSerializer
+        elif self.action == 'bulk_schedule':
+            return TripBulkScheduleSerializer
         elif self.action in ['update', 'partial_update']:
             return TripUpdateSerializer
         elif self.action == 'list':
             return TripListSerializer
         elif self.action == 'search':
             return TripSearchSerializer
+        elif self.action == 'connections':
+            return TripConnectionSearchSerializer
+        elif self.action == 'fare_calendar':
+            return TripFareCalendarSerializer
         return TripDetailSerializer
     
     def get_queryset(self):
@@ -79,12 +97,14 @@ class TripViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Permissions dynamiques"""
-        if self.action == 'create':
+        if self.action in ['create', 'bulk_schedule']:
             return [IsApprovedCompagnie()]
         elif self.action in ['update', 'partial_update', 'destroy', 'cancel']:
             return [CanManageTrip()]
-        elif self.action in ['list', 'retrieve', 'search']:
-            return [AllowAny()] if self.action == 'search' else [IsAuthenticated()]
+        elif self.action == 'cancellation_status':
+            return [IsAuthenticated(), CanManageTrip()]
+        elif self.action in ['list', 'retrieve', 'search', 'connections', 'fare_calendar']:
+            return [AllowAny()] if self.action in ['search', 'connections', 'fare_calendar'] else [IsAuthenticated()]
         return [IsAuthenticated()]
     
     def perform_create(self, serializer):
@@ -112,6 +132,22 @@ class TripViewSet(viewsets.ModelViewSet):
         trip.company.total_trips += 1
         trip.company.save(update_fields=['total_trips'])
     
+    @action(detail=False, methods=['post'], url_path='bulk-schedule')
+    def bulk_schedule(self, request):
+        """Programmer des départs récurrents (jours, heures, période)"""
+        serializer = self.get_serializer(data=request.data)
+        
+        if serializer.is_valid():
+            trips = serializer.save()
+            
+            return Response({
+                'message': f'{len(trips)} voyage(s) programmé(s) avec succès',
+                'count': len(trips),
+                'trips': TripListSerializer(trips, many=True).data
+            }, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'], url_path='search', permission_classes=[AllowAny])
     def search(self, request):
         """Rechercher des voyages"""
@@ -142,28 +178,123 @@ class TripViewSet(viewsets.ModelViewSet):
             if end_of_day < now:
                 return Response([])
 
-            queryset = Trip.objects.filter(
+            # Réponse en cache pour la version d'inventaire courante de la route
+            cache_key = TripSearchCache.make_key(
+                departure_city,
+                arrival_city,
+                departure_date,
+                passengers,
+                request.query_params.get(self.paginator.page_query_param, 1),
+                self.paginator.get_page_size(request)
+            )
+            cached = TripSearchCache.get(cache_key)
+            if cached is not None:
+                return Response(cached)
+            
+            # Lecture directe dans l'index route/jour (pas de jointure ni de sérialisation)
+            results = TripSearchIndexService.search(
                 departure_city_id=departure_city,
                 arrival_city_id=arrival_city,
-                departure_datetime__range=(search_start, end_of_day),
-                status=Trip.SCHEDULED,
-                is_active=True,
-                available_seats__gte=passengers
-            ).select_related('company', 'vehicle', 'departure_city', 'arrival_city').order_by('departure_datetime')
+                departure_date=departure_date,
+                passengers=passengers,
+                search_start=search_start
+            )
             
-            page = self.paginate_queryset(queryset)
+            page = self.paginate_queryset(results)
             if page is not None:
-                serializer = TripListSerializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
+                response = self.get_paginated_response(page)
+            else:
+                response = Response(results)
+            
+            TripSearchCache.set(cache_key, response.data, is_today=departure_date == now.date())
+            return response
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], url_path='connections', permission_classes=[AllowAny])
+    def connections(self, request):
+        """Rechercher des itinéraires avec correspondances (1 ou 2 changements)"""
+        serializer = TripConnectionSearchSerializer(data=request.query_params)
+        
+        if serializer.is_valid():
+            data = serializer.validated_data
+            departure_date = data['departure_date']
+            now = timezone.now()
+            
+            # Le jour même, seuls les départs à venir sont proposés
+            search_start = now if departure_date == timezone.localdate() else None
+            
+            results = ConnectionSearchService.search(
+                departure_city_id=data['departure_city'],
+                arrival_city_id=data['arrival_city'],
+                departure_date=departure_date,
+                passengers=data['passengers'],
+                search_start=search_start,
+                max_transfers=data['max_transfers'],
+                min_layover=timedelta(minutes=data['min_layover']),
+                max_wait=timedelta(minutes=data['max_wait']),
+                sort=data['sort'],
+                limit=data['limit']
+            )
+            
+            return Response({
+                'count': len(results),
+                'sort': data['sort'],
+                'results': results
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], url_path='fare-calendar', permission_classes=[AllowAny])
+    def fare_calendar(self, request):
+        """Prix minimum, nombre de voyages et places disponibles par jour d'une route"""
+        serializer = TripFareCalendarSerializer(data=request.query_params)
+        
+        if serializer.is_valid():
+            data = serializer.validated_data
+            today = timezone.localdate()
+            
+            cache_key = TripSearchCache.make_calendar_key(
+                data['departure_city'],
+                data['arrival_city'],
+                data['start_date'],
+                data['end_date'],
+                data['passengers']
+            )
+            cached = TripSearchCache.get(cache_key)
+            if cached is not None:
+                return Response(cached)
+            
+            calendar = TripSearchIndexService.fare_calendar(
+                departure_city_id=data['departure_city'],
+                arrival_city_id=data['arrival_city'],
+                start_date=data['start_date'],
+                end_date=data['end_date'],
+                passengers=data['passengers'],
+                # Les départs déjà passés du jour ne sont pas proposés
+                search_start=timezone.now() if data['start_date'] == today else None
+            )
+            
+            response = Response({
+                'departure_city': data['departure_city'],
+                'arrival_city': data['arrival_city'],
+                'passengers': data['passengers'],
+                'days': calendar
+            })
             
-            serializer = TripListSerializer(queryset, many=True)
-            return Response(serializer.data)
+            TripSearchCache.set(cache_key, response.data, is_today=data['start_date'] == today)
+            return response
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=True, methods=['post'], url_path='cancel')
     def cancel(self, request, pk=None):
-        """Annuler un voyage"""
+        """
+        Annuler un voyage
+        
+        Les tickets sont annulés en masse ; les notifications des passagers
+        partent en arrière-plan (suivi via cancellation-status).
+        """
         trip = self.get_object()
         reason = request.data.get('reason', '')
         
@@ -179,59 +310,28 @@ class TripViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        trip.status = Trip.CANCELLED
-        trip.notes = f"{trip.notes}\nAnnulation: {reason}"
-        trip.save()
-        
-        # Logger l'annulation
-        ActivityLog.objects.create(
-            user=request.user,
-            action=ActivityLog.TRIP_CANCEL,
-            description=f"Annulation voyage : {trip.departure_city.name} → {trip.arrival_city.name}",
-            details={
-                'trip_id': str(trip.id),
-                'reason': reason
-            },
-            content_type='Trip',
-            object_id=str(trip.id),
-            severity=ActivityLog.SEVERITY_WARNING
-        )
-        
-        # Notifier les passagers avec tickets confirmés
-        from apps.tickets.models import Ticket
-        from apps.notifications.models import Notification
-        
-        tickets = Ticket.objects.filter(
-            trip=trip,
-            status=Ticket.CONFIRMED
-        ).select_related('passenger')
-        
-        for ticket in tickets:
-            # Changer le statut du ticket
-            ticket.status = Ticket.CANCELLED
-            ticket.cancelled_at = timezone.now()
-            ticket.cancellation_reason = f"Voyage annulé par la compagnie: {reason}"
-            ticket.save()
-            
-            # Créer une notification
-            Notification.objects.create(
-                user=ticket.passenger,
-                notification_type=Notification.EMAIL,
-                category=Notification.TRIP_CANCELLED,
-                title='Voyage annulé',
-                message=f"Votre voyage {trip.departure_city.name} → {trip.arrival_city.name} du {trip.departure_datetime.strftime('%d/%m/%Y à %H:%M')} a été annulé. Raison: {reason}",
-                metadata={
-                    'trip_id': str(trip.id),
-                    'ticket_id': str(ticket.id)
-                },
-                recipient_email=ticket.passenger_email
-            )
+        job = TripCancellationService.cancel(trip, request.user, reason)
         
         return Response({
             'message': 'Voyage annulé avec succès',
             'trip': TripDetailSerializer(trip).data,
-            'cancelled_tickets': tickets.count()
-        })
+            'cancelled_tickets': job['cancelled_tickets'],
+            'job': job
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'], url_path='cancellation-status')
+    def cancellation_status(self, request, pk=None):
+        """Suivi de l'envoi des notifications d'annulation"""
+        trip = self.get_object()
+        job = TripCancellationService.get_trip_job(trip.pk)
+        
+        if job is None:
+            return Response(
+                {'error': 'Aucune annulation en cours pour ce voyage'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(job)
     
     @action(detail=True, methods=['post'], url_path='assign-agents')
     def assign_agents(self, request, pk=None):
@@ -270,20 +370,15 @@ class TripViewSet(viewsets.ModelViewSet):
         """Récupérer les sièges disponibles"""
         trip = self.get_object()
         
-        from apps.tickets.models import Ticket
-        
-        # Récupérer les sièges réservés
-        reserved_seats = Ticket.objects.filter(
-            trip=trip,
-            status__in=[Ticket.PENDING, Ticket.CONFIRMED, Ticket.USED]
-        ).values_list('seat_number', flat=True)
+        from apps.tickets.services import SeatMapService
         
         # Récupérer la configuration des sièges du véhicule
         seat_map = trip.vehicle.get_seat_map()
         
-        # Marquer les sièges réservés
+        # Marquer les sièges réservés (bitmap d'occupation, un test binaire par siège)
+        bitmap = SeatMapService.get_bitmap(trip, seat_map)
         for seat in seat_map.get('seats', []):
-            seat['is_available'] = str(seat['number']) not in reserved_seats
+            seat['is_available'] = not bitmap.is_occupied(seat['number'])
         
         return Response({
             'trip_id': str(trip.id),
@@ -333,15 +428,46 @@ class CityViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [SearchFilter]
     search_fields = ['name', 'country']
     
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request):
+        """Autocomplétion des villes (insensible aux accents, index en mémoire)"""
+        query = request.query_params.get('q', '')
+        
+        try:
+            limit = int(request.query_params.get('limit', 8))
+        except ValueError:
+            return Response(
+                {'error': 'limit doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(CityAutocompleteService.search(query, limit=max(limit, 1)))
+    
     @action(detail=False, methods=['get'], url_path='popular')
     def popular(self, request):
-        """Villes les plus populaires (basé sur les voyages)"""
-        from django.db.models import Q, Count
+        """
+        Villes les plus populaires
+        
+        ?by=trips (voyages, défaut), sales (tickets vendus) ou recent
+        (ventes récentes pondérées). Lecture directe du classement maintenu
+        par CityPopularityService.
+        """
+        by = request.query_params.get('by', CityPopularityService.BY_TRIPS)
+        if by not in CityPopularityService.ORDERING:
+            return Response(
+                {'error': f"by doit valoir : {', '.join(CityPopularityService.ORDERING)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ranking = CityPopularityService.top(by=by, limit=10)
+        now = timezone.now()
         
-        cities = City.objects.filter(is_active=True).annotate(
-            trip_count=Count('departures', filter=Q(departures__is_active=True)) + 
-                      Count('arrivals', filter=Q(arrivals__is_active=True))
-        ).order_by('-trip_count')[:10]
+        results = []
+        for popularity in ranking:
+            data = CitySerializer(popularity.city).data
+            data['trip_count'] = popularity.trip_count
+            data['tickets_sold'] = popularity.tickets_sold
+            data['recent_bookings'] = round(CityPopularityService.recent_score(popularity, now), 2)
+            results.append(data)
         
-        serializer = CitySerializer(cities, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(results)
@@ -268,6 +268,23 @@ class CanScanTicket(permissions.BasePermission):
         )
 
 
+class CanMonitorBoarding(permissions.BasePermission):
+    """Permission pour suivre l'embarquement (progression, manifeste)"""
+
+    message = "Vous n'avez pas accès au suivi de l'embarquement."
+
+    def has_permission(self, request, view):
+        # Admins : tous les voyages ; embarqueurs et compagnies : ceux de leur compagnie
+        if not (request.user and request.user.is_authenticated):
+            return False
+        if request.user.role == 'admin':
+            return True
+        return (
+            request.user.role in ['embarqueur', 'compagnie'] and
+            request.user.company is not None
+        )
+
+
 class CanManageClaim(permissions.BasePermission):
     """Permission pour gérer une réclamation"""
     
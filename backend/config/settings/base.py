@@ -235,6 +235,22 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60
 
+# Tâches périodiques (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    'expire-pending-tickets': {
+        'task': 'apps.tickets.tasks.expire_pending_tickets',
+        'schedule': 60.0,  # Chaque minute
+    },
+    'generate-ticket-qr-codes': {
+        'task': 'apps.tickets.tasks.generate_ticket_qr_codes',
+        'schedule': 60.0,  # Rattrapage des QR codes en attente
+    },
+    'retry-failed-ticket-qr-codes': {
+        'task': 'apps.tickets.tasks.retry_failed_ticket_qr_codes',
+        'schedule': 120.0,  # Reprise des QR codes en échec
+    },
+}
+
 # DRF Spectacular (Swagger)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Ticket Zen API',
@@ -262,6 +278,15 @@ SPECTACULAR_SETTINGS = {
 # QR Code Configuration
 QR_CODE_RSA_PRIVATE_KEY_PATH = BASE_DIR / 'keys' / 'private_key.pem'
 QR_CODE_RSA_PUBLIC_KEY_PATH = BASE_DIR / 'keys' / 'public_key.pem'
+QR_CODE_ED25519_PRIVATE_KEY_PATH = BASE_DIR / 'keys' / 'ed25519_private_key.pem'
+QR_CODE_ED25519_PUBLIC_KEY_PATH = BASE_DIR / 'keys' / 'ed25519_public_key.pem'
+# Clés publiques des rotations précédentes (QR codes déjà émis)
+QR_CODE_PREVIOUS_KEYS_DIR = BASE_DIR / 'keys' / 'previous'
+# Clé des manifestes hors ligne, épinglée sur les appareils (hors rotation)
+QR_CODE_MANIFEST_PRIVATE_KEY_PATH = BASE_DIR / 'keys' / 'manifest_private_key.pem'
+QR_CODE_MANIFEST_PUBLIC_KEY_PATH = BASE_DIR / 'keys' / 'manifest_public_key.pem'
+# Format des nouveaux tokens : 'compact' (Ed25519) ou 'jwt' (RS256 historique)
+QR_CODE_TOKEN_FORMAT = config('QR_CODE_TOKEN_FORMAT', default='compact')
 QR_CODE_EXPIRATION_HOURS = 24
 
 # Payment Configuration
@@ -0,0 +1,109 @@
+"""
+Index en mémoire pour l'autocomplétion (préfixes et trigrammes)
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+
+NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Minuscules sans accents ni ponctuation ("San-Pédro" -> "san pedro")"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def trigrams(text):
+    """Trigrammes d'un texte normalisé (mots complétés par des espaces, comme pg_trgm)"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrieNode:
+    __slots__ = ('children', 'ids', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+        self.top = ()
+
+
+class PrefixTrie:
+    """
+    Trie de préfixes dont chaque nœud garde ses meilleures entrées
+
+    Les identifiants sont classés une fois pour toutes à la construction
+    (finalize) : une recherche coûte O(longueur du préfixe).
+    """
+
+    def __init__(self, max_per_node=20):
+        self.max_per_node = max_per_node
+        self.root = TrieNode()
+
+    def insert(self, key, item_id):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, TrieNode())
+            node.ids.add(item_id)
+
+    def finalize(self, rank):
+        """Figer le classement des entrées de chaque nœud (rank : clé de tri)"""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            node.top = tuple(sorted(node.ids, key=rank)[:self.max_per_node])
+            node.ids = set()
+            stack.extend(node.children.values())
+
+    def search(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.top
+
+
+class TrigramIndex:
+    """Index inversé trigramme -> identifiants, similarité de Jaccard"""
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.sizes = {}
+
+    def insert(self, text, item_id):
+        grams = trigrams(text)
+        self.sizes[item_id] = len(grams)
+        for gram in grams:
+            self.postings[gram].add(item_id)
+
+    def search(self, text, threshold=0.3):
+        """
+        Entrées similaires au texte
+
+        Returns:
+            list: tuples (similarité, identifiant), similarité décroissante
+        """
+        grams = trigrams(text)
+        if not grams:
+            return []
+
+        shared = defaultdict(int)
+        for gram in grams:
+            for item_id in self.postings.get(gram, ()):
+                shared[item_id] += 1
+
+        matches = []
+        for item_id, count in shared.items():
+            similarity = count / (len(grams) + self.sizes[item_id] - count)
+            if similarity >= threshold:
+                matches.append((similarity, item_id))
+
+        matches.sort(key=lambda match: -match[0])
+        return matches
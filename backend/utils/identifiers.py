@@ -0,0 +1,37 @@
+"""
+Identifiants lisibles à chiffre de contrôle (préfixe + date + compteur + Luhn)
+"""
+
+
+def luhn_check_digit(digits):
+    """Chiffre de contrôle de Luhn (détecte toute faute de frappe isolée et la plupart des inversions)"""
+    total = 0
+    for position, char in enumerate(reversed(digits)):
+        value = int(char)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def format_identifier(prefix, day, counter, width):
+    """
+    Composer un identifiant : préfixe, date AAAAMMJJ, compteur sur width chiffres, contrôle
+
+    Le compteur est pris modulo 10**width : deux identifiants d'un même jour
+    ne se répètent qu'au-delà de 10**width émissions dans la journée.
+    """
+    digits = f'{day:%Y%m%d}{counter % 10 ** width:0{width}d}'
+    return f'{prefix}{digits}{luhn_check_digit(digits)}'
+
+
+def is_valid_identifier(value, prefix, width):
+    """Vérifier la forme et le chiffre de contrôle d'un identifiant"""
+    if not value or not value.startswith(prefix):
+        return False
+    digits = value[len(prefix):]
+    if len(digits) != 8 + width + 1 or not digits.isdigit():
+        return False
+    return luhn_check_digit(digits[:-1]) == digits[-1]
@@ -0,0 +1,94 @@
+"""
+Index d'intervalles pour la détection de chevauchements
+"""
+
+
+class IntervalIndex:
+    """
+    Arbre d'intervalles statique sur des intervalles semi-ouverts [début, fin)
+
+    Les intervalles sont triés par début et forment un arbre binaire
+    implicite (milieu de chaque tranche) dont chaque nœud connaît la fin
+    maximale de son sous-arbre : une recherche coûte O(log n + k).
+    """
+
+    def __init__(self, intervals=()):
+        # intervals : tuples (début, fin, valeur)
+        self.items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.max_end = [None] * len(self.items)
+        self._build(0, len(self.items) - 1)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, lo, hi):
+        if lo > hi:
+            return None
+
+        mid = (lo + hi) // 2
+        max_end = self.items[mid][1]
+        for child_end in (self._build(lo, mid - 1), self._build(mid + 1, hi)):
+            if child_end is not None and child_end > max_end:
+                max_end = child_end
+
+        self.max_end[mid] = max_end
+        return max_end
+
+    def _search(self, lo, hi, start, end, found):
+        if lo > hi:
+            return
+
+        mid = (lo + hi) // 2
+        # Aucun intervalle du sous-arbre ne se termine après le début recherché
+        if self.max_end[mid] <= start:
+            return
+
+        self._search(lo, mid - 1, start, end, found)
+
+        item_start, item_end = self.items[mid][0], self.items[mid][1]
+        if item_start < end and item_end > start:
+            found.append(self.items[mid])
+
+        # Le sous-arbre droit commence au plus tôt à item_start
+        if item_start < end:
+            self._search(mid + 1, hi, start, end, found)
+
+    def overlapping(self, start, end):
+        """Intervalles qui chevauchent [start, end)"""
+        found = []
+        self._search(0, len(self.items) - 1, start, end, found)
+        return found
+
+    def overlaps(self, start, end):
+        """Au moins un intervalle chevauche-t-il [start, end)"""
+        return bool(self.overlapping(start, end))
+
+
+def find_overlapping(intervals):
+    """
+    Intervalles d'une liste qui en chevauchent un autre de la même liste
+
+    Balayage des intervalles triés par début en O(n log n).
+
+    Args:
+        intervals: tuples (début, fin, valeur)
+
+    Returns:
+        list: intervalles en conflit (ordre de début)
+    """
+    conflicts = []
+    latest = None
+    latest_reported = False
+
+    for item in sorted(intervals, key=lambda item: (item[0], item[1])):
+        if latest is not None and item[0] < latest[1]:
+            if not latest_reported:
+                conflicts.append(latest)
+                latest_reported = True
+            conflicts.append(item)
+            if item[1] > latest[1]:
+                latest, latest_reported = item, True
+        else:
+            latest, latest_reported = item, False
+
+    return conflicts
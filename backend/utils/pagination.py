@@ -1,20 +1,139 @@
 """
 Classes de pagination personnalisées
 """
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
+from django.db import connections
+from django.db.models import QuerySet
 from collections import OrderedDict
+import json
+
+
+def estimate_count(queryset):
+    """
+    Estimer le nombre de lignes d'un queryset sans COUNT(*)
+    
+    Postgres : reltuples de pg_class pour une table non filtrée, sinon
+    l'estimation du planificateur (EXPLAIN). Autres bases : comptage exact.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            # reltuples vaut -1 tant que la table n'a jamais été analysée
+            if row and row[0] >= 0:
+                return row[0]
+        
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Pagination par curseur (keyset) sur un index ordonné
+    
+    Chaque page est une lecture d'index à partir de la dernière position :
+    une page profonde coûte autant que la première. Le total est optionnel
+    (?count=exact ou ?count=estimate).
+    """
+    
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+    
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.count = None
+        self.count_is_estimate = False
+    
+    def get_ordering(self, request, queryset, view):
+        """Toujours l'ordre de la vue (le curseur dépend de l'index utilisé)"""
+        return tuple(self.ordering)
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count = estimate_count(queryset)
+            self.count_is_estimate = True
+        
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        """Retourner une réponse avec liens de curseur (total si demandé)"""
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_is_estimate'] = self.count_is_estimate
+        response['page_size'] = self.page_size
+        response['results'] = data
+        return Response(response)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
-    """Pagination standard avec métadonnées enrichies"""
+    """
+    Pagination standard avec métadonnées enrichies
+    
+    Les vues qui définissent `cursor_ordering` (ou `get_cursor_ordering()`
+    quand l'ordre dépend de l'action) acceptent aussi ?pagination=cursor
+    (voir KeysetCursorPagination).
+    """
     
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+    mode_query_param = 'pagination'
+    
+    cursor_paginator = None
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        """Pagination par page, ou par curseur si demandé et supporté par la vue"""
+        self.cursor_paginator = None
+        get_cursor_ordering = getattr(view, 'get_cursor_ordering', None)
+        if get_cursor_ordering is not None:
+            cursor_ordering = get_cursor_ordering()
+        else:
+            cursor_ordering = getattr(view, 'cursor_ordering', None)
+        
+        if (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            and cursor_ordering
+            and isinstance(queryset, QuerySet)
+        ):
+            self.cursor_paginator = KeysetCursorPagination(cursor_ordering)
+            self.request = request
+            page = self.cursor_paginator.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.cursor_paginator.display_page_controls
+            return page
+        
+        return super().paginate_queryset(queryset, request, view)
+    
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
     
     def get_paginated_response(self, data):
         """Retourner une réponse avec métadonnées complètes"""
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        
         return Response(OrderedDict([
             ('count', self.page.paginator.count),
             ('next', self.get_next_link()),
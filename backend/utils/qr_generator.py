@@ -1,41 +1,275 @@
 """
-Générateur de QR codes sécurisés avec JWT RS256
+Générateur de QR codes sécurisés (token compact Ed25519, JWT RS256 historique)
 """
 import jwt
 import qrcode
 import io
 import base64
+import glob
+import hashlib
+import struct
+import tempfile
+import uuid
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.utils import timezone
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
 from cryptography.hazmat.backends import default_backend
+from collections import namedtuple
 import os
+import threading
+import time
 
 
-class QRCodeGenerator:
-    """Classe pour générer et valider des QR codes sécurisés"""
+# Clés de signature courantes, et clés de vérification : la clé courante
+# (dérivée de la clé privée) puis les clés publiques des rotations précédentes
+# La clé des manifestes (Ed25519) est distincte et n'est jamais tournée avec
+# celles des QR codes : c'est elle que les appareils épinglent
+QRKeys = namedtuple('QRKeys', [
+    'private_key', 'public_key', 'ed25519_private_key', 'ed25519_public_key',
+    'ed25519_key_id', 'ed25519_verify_keys', 'rsa_verify_keys',
+    'manifest_private_key', 'manifest_public_key', 'signature'
+])
+
+# Token compact : préfixe + base32 (mode alphanumérique du QR code) de
+# identifiant de clé (1 octet), UUID du ticket (16 octets), voyage, émission,
+# expiration + signature Ed25519
+COMPACT_PREFIX = 'TZ2:'
+COMPACT_CLAIMS = struct.Struct('>B16sQII')
+# Premiers tokens compacts, sans identifiant de clé (toutes les clés sont essayées)
+LEGACY_COMPACT_CLAIMS = struct.Struct('>16sQII')
+ED25519_SIGNATURE_SIZE = 64
+
+
+def key_id(public_key):
+    """Identifiant (1 octet) d'une clé Ed25519 : premier octet du SHA-256 de la clé brute"""
+    raw = public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return hashlib.sha256(raw).digest()[0]
+
+
+def decode_compact_token(token, public_keys, now=None):
+    """
+    Vérifier un token compact (TZ2:) et le présenter comme un payload JWT
     
-    def __init__(self):
-        """Initialiser le générateur avec les clés RSA"""
-        self.private_key_path = settings.QR_CODE_RSA_PRIVATE_KEY_PATH
-        self.public_key_path = settings.QR_CODE_RSA_PUBLIC_KEY_PATH
-        
-        # Créer les clés si elles n'existent pas
-        if not os.path.exists(self.private_key_path) or not os.path.exists(self.public_key_path):
-            self._generate_rsa_keys()
+    Utilisable hors ligne : seules les clés publiques Ed25519 sont nécessaires
+    (clé courante et clés des rotations précédentes, choisies par identifiant).
+    """
+    encoded = token[len(COMPACT_PREFIX):]
+    try:
+        raw = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+    except (ValueError, TypeError):
+        raise Exception('QR code invalide : encodage incorrect')
+    
+    if len(raw) == COMPACT_CLAIMS.size + ED25519_SIGNATURE_SIZE:
+        claims_format = COMPACT_CLAIMS
+        candidates = [key for key in public_keys if key_id(key) == raw[0]]
+    elif len(raw) == LEGACY_COMPACT_CLAIMS.size + ED25519_SIGNATURE_SIZE:
+        claims_format = LEGACY_COMPACT_CLAIMS
+        candidates = list(public_keys)
+    else:
+        raise Exception('QR code invalide : longueur incorrecte')
+    
+    claims, signature = raw[:claims_format.size], raw[claims_format.size:]
+    for public_key in candidates:
+        try:
+            public_key.verify(signature, claims)
+            break
+        except InvalidSignature:
+            continue
+    else:
+        raise Exception('Signature QR code invalide - possible fraude')
+    
+    ticket_id, trip_id, issued_at, exp = claims_format.unpack(claims)[-4:]
+    if (now or timezone.now()).timestamp() > exp:
+        raise Exception('QR code expiré')
+    
+    return {
+        'ticket_id': str(uuid.UUID(bytes=ticket_id)),
+        'trip_id': str(trip_id),
+        'issued_at': issued_at,
+        'exp': exp,
+        'iss': 'TicketZen',
+        'type': 'ticket_qr'
+    }
+
+
+class QRKeyRegistry:
+    """
+    Clés des QR codes (Ed25519 et RSA), chargées une fois par processus
+
+    Les fichiers PEM ne sont relus que s'ils ont changé (date de modification
+    et taille), vérifiés au plus toutes les CHECK_INTERVAL secondes : une
+    rotation des clés est prise en compte sans redémarrer les workers.
+
+    Une rotation (rotate) archive les clés publiques courantes dans
+    QR_CODE_PREVIOUS_KEYS_DIR (*.pub) : les QR codes déjà émis restent
+    vérifiables. La clé des manifestes, épinglée sur les appareils, n'est
+    pas concernée. Tous les fichiers sont écrits puis renommés (jamais lus
+    à moitié écrits).
+    """
+    
+    CHECK_INTERVAL = 5
+    
+    _keys = None
+    _checked_at = float('-inf')
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get(cls):
+        """Clés courantes (rechargées si les fichiers ont changé)"""
+        if cls._keys is None or time.monotonic() - cls._checked_at >= cls.CHECK_INTERVAL:
+            with cls._lock:
+                if cls._keys is None or time.monotonic() - cls._checked_at >= cls.CHECK_INTERVAL:
+                    cls._refresh()
+        return cls._keys
+    
+    @classmethod
+    def reload(cls):
+        """Forcer la relecture des fichiers au prochain accès"""
+        with cls._lock:
+            cls._keys = None
+            cls._checked_at = float('-inf')
+    
+    @staticmethod
+    def _paths():
+        return (
+            settings.QR_CODE_RSA_PRIVATE_KEY_PATH,
+            settings.QR_CODE_RSA_PUBLIC_KEY_PATH,
+            settings.QR_CODE_ED25519_PRIVATE_KEY_PATH,
+            settings.QR_CODE_ED25519_PUBLIC_KEY_PATH,
+            settings.QR_CODE_MANIFEST_PRIVATE_KEY_PATH,
+            settings.QR_CODE_MANIFEST_PUBLIC_KEY_PATH,
+        )
+    
+    @staticmethod
+    def _previous_paths(kind):
+        """Clés publiques archivées d'un type ('ed25519' ou 'rsa'), les plus récentes d'abord"""
+        pattern = os.path.join(settings.QR_CODE_PREVIOUS_KEYS_DIR, f'{kind}_*.pub')
+        return sorted(glob.glob(pattern), reverse=True)
+    
+    @staticmethod
+    def _signature(paths):
+        try:
+            return tuple((path, stat.st_mtime_ns, stat.st_size) for path, stat in zip(paths, map(os.stat, paths)))
+        except FileNotFoundError:
+            return None
+    
+    @classmethod
+    def _refresh(cls):
+        paths = cls._paths()
+        rsa_private, rsa_public, ed_private, ed_public, manifest_private, manifest_public = paths
+        previous_ed = cls._previous_paths('ed25519')
+        previous_rsa = cls._previous_paths('rsa')
+        
+        signature = cls._signature(paths + tuple(previous_ed) + tuple(previous_rsa))
+        if signature is None:
+            # Rotation en cours : garder les clés chargées jusqu'aux nouveaux fichiers
+            if cls._keys is not None:
+                cls._checked_at = time.monotonic()
+                return
+            # Créer les clés si elles n'existent pas
+            if not (os.path.exists(rsa_private) and os.path.exists(rsa_public)):
+                cls.generate_keys(rsa_private, rsa_public)
+            if not (os.path.exists(ed_private) and os.path.exists(ed_public)):
+                cls.generate_ed25519_keys(ed_private, ed_public)
+            if not (os.path.exists(manifest_private) and os.path.exists(manifest_public)):
+                cls.generate_ed25519_keys(manifest_private, manifest_public)
+            signature = cls._signature(paths + tuple(previous_ed) + tuple(previous_rsa))
+        
+        if cls._keys is None or cls._keys.signature != signature:
+            private_key = cls._load_private_key(rsa_private)
+            ed25519_private_key = cls._load_private_key(ed_private)
+            manifest_private_key = cls._load_private_key(manifest_private)
+            # La clé courante est dérivée de la clé privée : une paire de
+            # fichiers en cours de remplacement ne peut pas être désassortie
+            ed25519_public_key = ed25519_private_key.public_key()
+            cls._keys = QRKeys(
+                private_key=private_key,
+                public_key=cls._load_public_key(rsa_public),
+                ed25519_private_key=ed25519_private_key,
+                ed25519_public_key=ed25519_public_key,
+                ed25519_key_id=key_id(ed25519_public_key),
+                ed25519_verify_keys=cls._unique(
+                    [ed25519_public_key] + [cls._load_public_key(path) for path in previous_ed]
+                ),
+                rsa_verify_keys=cls._unique(
+                    [private_key.public_key()] + [cls._load_public_key(path) for path in previous_rsa]
+                ),
+                manifest_private_key=manifest_private_key,
+                manifest_public_key=manifest_private_key.public_key(),
+                signature=signature
+            )
+        cls._checked_at = time.monotonic()
+    
+    @staticmethod
+    def _unique(public_keys):
+        """Clés distinctes, dans l'ordre (la clé courante en premier)"""
+        keys, seen = [], set()
+        for public_key in public_keys:
+            pem = QRKeyRegistry._public_pem(public_key)
+            if pem not in seen:
+                seen.add(pem)
+                keys.append(public_key)
+        return tuple(keys)
+    
+    @staticmethod
+    def _public_pem(public_key):
+        return public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+    
+    @staticmethod
+    def _write_atomic(path, data):
+        """Écrire un fichier de clé d'un coup : fichier temporaire puis renommage"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix='.pem')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    @classmethod
+    def rotate(cls):
+        """
+        Remplacer les paires de clés des QR codes en gardant les clés publiques courantes
         
-        # Charger les clés
-        self.private_key = self._load_private_key()
-        self.public_key = self._load_public_key()
+        Les clés publiques en service sont archivées (QR_CODE_PREVIOUS_KEYS_DIR)
+        avant l'écriture des nouvelles : les QR codes déjà émis restent
+        vérifiables jusqu'à la suppression de l'archive. La clé des manifestes,
+        épinglée sur les appareils, n'est pas remplacée.
+        """
+        rsa_private, rsa_public, ed_private, ed_public = cls._paths()[:4]
+        stamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        
+        for kind, private_path in (('rsa', rsa_private), ('ed25519', ed_private)):
+            if os.path.exists(private_path):
+                public_key = cls._load_private_key(private_path).public_key()
+                cls._write_atomic(
+                    os.path.join(settings.QR_CODE_PREVIOUS_KEYS_DIR, f'{kind}_{stamp}.pub'),
+                    cls._public_pem(public_key)
+                )
+        
+        cls.generate_keys(rsa_private, rsa_public)
+        cls.generate_ed25519_keys(ed_private, ed_public)
+        cls.reload()
     
-    def _generate_rsa_keys(self):
+    @staticmethod
+    def generate_keys(private_key_path, public_key_path):
         """Générer une paire de clés RSA"""
-        # Créer le dossier keys s'il n'existe pas
-        os.makedirs(os.path.dirname(self.private_key_path), exist_ok=True)
-        
         # Générer la clé privée
         private_key = rsa.generate_private_key(
             public_exponent=65537,
@@ -43,42 +277,87 @@ class QRCodeGenerator:
             backend=default_backend()
         )
         
-        # Sauvegarder la clé privée
-        with open(self.private_key_path, 'wb') as f:
-            f.write(private_key.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            ))
-        
-        # Extraire et sauvegarder la clé publique
-        public_key = private_key.public_key()
-        with open(self.public_key_path, 'wb') as f:
-            f.write(public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            ))
+        # Sauvegarder la clé privée puis la clé publique (écritures atomiques)
+        QRKeyRegistry._write_atomic(private_key_path, private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+        QRKeyRegistry._write_atomic(public_key_path, QRKeyRegistry._public_pem(private_key.public_key()))
         
         print(f"✅ Clés RSA générées avec succès:")
-        print(f"   - Clé privée: {self.private_key_path}")
-        print(f"   - Clé publique: {self.public_key_path}")
+        print(f"   - Clé privée: {private_key_path}")
+        print(f"   - Clé publique: {public_key_path}")
+    
+    @staticmethod
+    def generate_ed25519_keys(private_key_path, public_key_path):
+        """Générer une paire de clés Ed25519 (tokens compacts)"""
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        QRKeyRegistry._write_atomic(private_key_path, private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+        QRKeyRegistry._write_atomic(public_key_path, QRKeyRegistry._public_pem(private_key.public_key()))
+        
+        print(f"✅ Clés Ed25519 générées avec succès:")
+        print(f"   - Clé privée: {private_key_path}")
+        print(f"   - Clé publique: {public_key_path}")
     
-    def _load_private_key(self):
+    @staticmethod
+    def _load_private_key(path):
         """Charger la clé privée"""
-        with open(self.private_key_path, 'rb') as f:
+        with open(path, 'rb') as f:
             return serialization.load_pem_private_key(
                 f.read(),
                 password=None,
                 backend=default_backend()
             )
     
-    def _load_public_key(self):
+    @staticmethod
+    def _load_public_key(path):
         """Charger la clé publique"""
-        with open(self.public_key_path, 'rb') as f:
+        with open(path, 'rb') as f:
             return serialization.load_pem_public_key(
                 f.read(),
                 backend=default_backend()
             )
+
+
+class QRCodeGenerator:
+    """Classe pour générer et valider des QR codes sécurisés"""
+    
+    def __init__(self):
+        """Initialiser le générateur (clés fournies par QRKeyRegistry)"""
+        self.private_key_path = settings.QR_CODE_RSA_PRIVATE_KEY_PATH
+        self.public_key_path = settings.QR_CODE_RSA_PUBLIC_KEY_PATH
+        
+        # Charge (ou crée) les clés au premier usage dans le processus
+        QRKeyRegistry.get()
+        
+        # Encodeur QR réutilisé d'un ticket à l'autre, un par thread
+        self._local = threading.local()
+    
+    @property
+    def private_key(self):
+        return QRKeyRegistry.get().private_key
+    
+    @property
+    def public_key(self):
+        return QRKeyRegistry.get().public_key
+    
+    @property
+    def _qr(self):
+        qr = getattr(self._local, 'qr', None)
+        if qr is None:
+            qr = qrcode.QRCode(
+                version=1,
+                error_correction=qrcode.constants.ERROR_CORRECT_H,
+                box_size=10,
+                border=4,
+            )
+            self._local.qr = qr
+        return qr
     
     def generate_qr_code(self, ticket):
         """
@@ -94,9 +373,48 @@ class QRCodeGenerator:
                 'image_base64': Image encodée en base64
             }
         """
-        # Créer le payload JWT
+        token = self.sign_ticket(ticket)
+        png = self.render_png(token)
+        
+        return {
+            'token': token,
+            'image': ContentFile(png, name=f'qr_{ticket.ticket_number}.png'),
+            'image_base64': base64.b64encode(png).decode()
+        }
+    
+    def sign_ticket(self, ticket):
+        """Token du ticket au format configuré (QR_CODE_TOKEN_FORMAT)"""
+        if getattr(settings, 'QR_CODE_TOKEN_FORMAT', 'compact') == 'jwt':
+            return self.sign_ticket_jwt(ticket)
+        return self.sign_ticket_compact(ticket)
+    
+    @staticmethod
+    def _expiration(ticket):
         expiration_hours = getattr(settings, 'QR_CODE_EXPIRATION_HOURS', 24)
-        expiration_date = ticket.trip.departure_datetime + timedelta(hours=expiration_hours)
+        return ticket.trip.departure_datetime + timedelta(hours=expiration_hours)
+    
+    def sign_ticket_compact(self, ticket):
+        """
+        Token compact signé Ed25519 (~160 caractères alphanumériques)
+        
+        Seuls l'identifiant du ticket, le voyage et les dates sont inclus :
+        le reste (passager, siège, trajet) est lu en base ou dans le manifeste.
+        """
+        keys = QRKeyRegistry.get()
+        claims = COMPACT_CLAIMS.pack(
+            keys.ed25519_key_id,
+            uuid.UUID(str(ticket.id)).bytes,
+            ticket.trip_id,
+            int(timezone.now().timestamp()),
+            int(self._expiration(ticket).timestamp())
+        )
+        signature = keys.ed25519_private_key.sign(claims)
+        encoded = base64.b32encode(claims + signature).decode().rstrip('=')
+        return f'{COMPACT_PREFIX}{encoded}'
+    
+    def sign_ticket_jwt(self, ticket):
+        """Signer (RS256) le token JWT historique d'un ticket"""
+        expiration_date = self._expiration(ticket)
         
         payload = {
             'ticket_id': str(ticket.id),
@@ -113,72 +431,46 @@ class QRCodeGenerator:
             'type': 'ticket_qr'
         }
         
-        # Signer le token avec RS256
-        token = jwt.encode(
+        return jwt.encode(
             payload,
             self.private_key,
             algorithm='RS256'
         )
-        
-        # Générer l'image QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        
+    
+    def render_png(self, token):
+        """Rendre le QR code d'un token en PNG (octets)"""
+        qr = self._qr
+        qr.clear()
+        # Version recalculée pour chaque token (make(fit=True) l'aurait figée)
+        qr.version = None
         qr.add_data(token)
         qr.make(fit=True)
         
-        # Créer l'image
         img = qr.make_image(fill_color="black", back_color="white")
         
-        # Sauvegarder dans un buffer
         buffer = io.BytesIO()
         img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Encoder en base64 pour l'affichage
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        
-        # Créer un fichier Django
-        buffer.seek(0)
-        image_file = ContentFile(buffer.read(), name=f'qr_{ticket.ticket_number}.png')
-        
-        return {
-            'token': token,
-            'image': image_file,
-            'image_base64': image_base64
-        }
+        return buffer.getvalue()
     
     def decode_qr_code(self, token):
         """
         Décoder et valider un QR code
         
         Args:
-            token: JWT token à décoder
+            token: token compact (TZ2:) ou JWT RS256 historique
         
         Returns:
             dict: Payload décodé
         
         Raises:
-            jwt.ExpiredSignatureError: Si le token a expiré
-            jwt.InvalidTokenError: Si le token est invalide
+            Exception: token expiré, signature invalide ou token illisible
         """
+        if token.startswith(COMPACT_PREFIX):
+            return self._decode_compact(token)
+        
         try:
-            # Décoder le token avec la clé publique
-            payload = jwt.decode(
-                token,
-                self.public_key,
-                algorithms=['RS256'],
-                options={
-                    'verify_signature': True,
-                    'verify_exp': True,
-                    'verify_iss': True
-                },
-                issuer='TicketZen'
-            )
+            # Décoder le token avec la clé publique (courante, puis précédentes)
+            payload = self._decode_jwt(token, QRKeyRegistry.get().rsa_verify_keys)
             
             # Vérifier le type
             if payload.get('type') != 'ticket_qr':
@@ -195,6 +487,30 @@ class QRCodeGenerator:
         except jwt.InvalidTokenError as e:
             raise Exception(f'QR code invalide : {str(e)}')
     
+    @staticmethod
+    def _decode_jwt(token, public_keys):
+        """Décoder un JWT RS256 avec la première clé dont la signature correspond"""
+        for index, public_key in enumerate(public_keys):
+            try:
+                return jwt.decode(
+                    token,
+                    public_key,
+                    algorithms=['RS256'],
+                    options={
+                        'verify_signature': True,
+                        'verify_exp': True,
+                        'verify_iss': True
+                    },
+                    issuer='TicketZen'
+                )
+            except jwt.InvalidSignatureError:
+                if index == len(public_keys) - 1:
+                    raise
+    
+    def _decode_compact(self, token):
+        """Vérifier un token compact (clé courante ou d'une rotation précédente)"""
+        return decode_compact_token(token, QRKeyRegistry.get().ed25519_verify_keys)
+    
     def verify_ticket_qr(self, token, ticket):
         """
         Vérifier qu'un QR code correspond à un ticket
@@ -222,7 +538,8 @@ class QRCodeGenerator:
                     'decoded_data': decoded_data
                 }
             
-            if ticket.ticket_number != decoded_data.get('ticket_number'):
+            # Numéro absent des tokens compacts (l'identifiant signé suffit)
+            if 'ticket_number' in decoded_data and ticket.ticket_number != decoded_data['ticket_number']:
                 return {
                     'is_valid': False,
                     'error_message': 'Numéro de ticket invalide',
@@ -328,7 +645,7 @@ class QRCodeGenerator:
     @staticmethod
     def generate_test_token():
         """Générer un token de test pour le développement"""
-        generator = QRCodeGenerator()
+        generator = get_qr_generator()
         
         # Payload de test
         payload = {
@@ -355,6 +672,17 @@ class QRCodeGenerator:
         return token
 
 
+_shared_generator = None
+
+
+def get_qr_generator():
+    """Générateur/vérificateur partagé du processus (clés de QRKeyRegistry)"""
+    global _shared_generator
+    if _shared_generator is None:
+        _shared_generator = QRCodeGenerator()
+    return _shared_generator
+
+
 # Fonction helper pour générer les clés au démarrage
 def ensure_rsa_keys_exist():
     """S'assurer que les clés RSA existent"""
@@ -1,18 +1,26 @@
 """
 Service de validation de QR codes avec cache et protection anti-fraude
 """
+import base64
+import json
+import uuid
+
+import jwt
 from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
 from apps.logs.models import ActivityLog
-from utils.qr_generator import QRCodeGenerator
+from utils.qr_generator import COMPACT_PREFIX, QRCodeGenerator, decode_compact_token, get_qr_generator
 
 
 class QRCodeValidator:
     """Service avancé de validation de QR codes"""
     
     def __init__(self):
-        self.generator = QRCodeGenerator()
+        self.generator = get_qr_generator()
     
     def validate_and_track(self, token, ticket, boarding_agent, device_info=None):
         """
@@ -213,101 +221,166 @@ class QRCodeValidator:
 
 
 class OfflineQRValidator:
-    """Validateur QR pour mode hors ligne"""
+    """
+    Validateur QR pour mode hors ligne, à partir du manifeste signé du voyage
+
+    Aucune dépendance au serveur ni au cache : la signature du manifeste,
+    celle des QR codes et les statuts des tickets sont vérifiés localement
+    (même algorithme que l'application de l'embarqueur).
+    """
     
-    def __init__(self):
-        self.generator = QRCodeGenerator()
+    # Codes statut du manifeste (BoardingManifestService.STATUS_CODES)
+    PENDING = 'P'
+    CONFIRMED = 'C'
+    USED = 'U'
     
-    def validate_offline(self, token, trip_data):
+    def load_manifest(self, signed, public_key):
         """
-        Valider un QR code en mode offline avec données du voyage en cache
+        Vérifier et décoder un manifeste complet
+        
+        Le manifeste n'est accepté que signé par la clé des manifestes
+        épinglée sur l'appareil : les clés des QR codes qu'il transporte
+        (tournées régulièrement) ne font foi qu'après cette vérification.
         
         Args:
-            token: JWT token
-            trip_data: Données du voyage (préchargées)
+            signed: {'manifest': JSON, 'signature': base64}
+            public_key: clé Ed25519 des manifestes épinglée sur l'appareil (obligatoire)
+        
+        Returns:
+            dict: manifeste avec les tickets indexés par identifiant
+        """
+        if public_key is None:
+            raise Exception('Clé de vérification épinglée requise')
+        self._verify(signed, public_key)
+        
+        manifest = json.loads(signed['manifest'])
+        if manifest.get('since'):
+            raise Exception('Manifeste complet requis (delta reçu)')
+        
+        manifest['manifest_key'] = public_key
+        manifest['keys'] = self._public_keys(manifest['keys'])
+        manifest['tickets'] = {entry[0]: entry[1:] for entry in manifest['tickets']}
+        return manifest
+    
+    def apply_delta(self, manifest, signed):
+        """Appliquer un delta (changements depuis la version du manifeste)"""
+        self._verify(signed, manifest['manifest_key'])
+        delta = json.loads(signed['manifest'])
+        
+        if delta['trip_id'] != manifest['trip_id']:
+            raise Exception('Delta d\'un autre voyage')
+        if delta['since'] > manifest['version']:
+            raise Exception('Delta incomplet : version du manifeste trop ancienne')
+        
+        for entry in delta['tickets']:
+            manifest['tickets'][entry[0]] = entry[1:]
+        # Clés QR courantes (rotation survenue depuis le manifeste complet)
+        manifest['keys'] = self._public_keys(delta['keys'])
+        manifest['version'] = max(manifest['version'], delta['version'])
+        return manifest
+    
+    def validate_offline(self, token, manifest, scanned_ids=None):
+        """
+        Valider un QR code avec le manifeste chargé (load_manifest)
+        
+        Args:
+            token: token compact ou JWT historique
+            manifest: manifeste vérifié du voyage
+            scanned_ids: identifiants déjà scannés sur l'appareil (complété si valide)
         
         Returns:
             dict: Résultat de validation
         """
         try:
-            # Décoder le token
-            decoded = self.generator.decode_qr_code(token)
-            
-            # Vérifier la correspondance avec le voyage
-            if str(trip_data['id']) != decoded.get('trip_id'):
-                return {
-                    'is_valid': False,
-                    'error': 'QR code ne correspond pas à ce voyage',
-                    'needs_sync': False
-                }
-            
-            # Vérifier l'expiration
-            if decoded.get('exp') and timezone.now().timestamp() > decoded['exp']:
-                return {
-                    'is_valid': False,
-                    'error': 'QR code expiré',
-                    'needs_sync': False
-                }
-            
-            # Vérifier dans le cache local si le ticket n'a pas déjà été scanné
-            cache_key = f'offline_scanned_{decoded["ticket_id"]}'
-            if cache.get(cache_key):
-                return {
-                    'is_valid': False,
-                    'error': 'Ce ticket a déjà été scanné (cache local)',
-                    'needs_sync': True
-                }
-            
-            # Marquer comme scanné localement
-            cache.set(cache_key, True, 86400)  # 24 heures
-            
+            decoded = self._decode(token, manifest['keys'])
+        except Exception as e:
             return {
-                'is_valid': True,
-                'error': None,
-                'decoded_data': decoded,
-                'needs_sync': True  # Doit être synchronisé avec le serveur
+                'is_valid': False,
+                'error': str(e),
+                'needs_sync': False
             }
         
-        except Exception as e:
+        if decoded.get('trip_id') != str(manifest['trip_id']):
             return {
                 'is_valid': False,
-                'error': str(e),
+                'error': 'QR code ne correspond pas à ce voyage',
                 'needs_sync': False
             }
+        
+        ticket_id = uuid.UUID(decoded['ticket_id']).hex
+        entry = manifest['tickets'].get(ticket_id)
+        if entry is None:
+            return {
+                'is_valid': False,
+                'error': 'Ticket absent du manifeste',
+                'needs_sync': True
+            }
+        
+        seat_number, status, passenger_name = entry
+        if status == self.USED or (scanned_ids is not None and ticket_id in scanned_ids):
+            return {
+                'is_valid': False,
+                'error': 'Ce ticket a déjà été utilisé',
+                'needs_sync': True
+            }
+        if status != self.CONFIRMED:
+            return {
+                'is_valid': False,
+                'error': 'Ticket non confirmé',
+                'needs_sync': status == self.PENDING
+            }
+        
+        if scanned_ids is not None:
+            scanned_ids.add(ticket_id)
+        
+        return {
+            'is_valid': True,
+            'error': None,
+            'decoded_data': decoded,
+            'seat_number': seat_number,
+            'passenger_name': passenger_name,
+            'needs_sync': True  # Doit être synchronisé avec le serveur
+        }
     
-    def prepare_offline_data(self, trip):
+    def prepare_offline_data(self, trip, since=None):
         """
-        Préparer les données pour validation offline
+        Préparer le manifeste signé à stocker sur l'appareil
         
         Args:
             trip: Instance Trip
+            since: version déjà présente sur l'appareil (delta)
         
         Returns:
-            dict: Données à stocker localement
+            dict: {'manifest': JSON, 'signature': base64}
         """
-        from apps.tickets.models import Ticket
-        
-        # Récupérer tous les tickets confirmés du voyage
-        tickets = Ticket.objects.filter(
-            trip=trip,
-            status__in=[Ticket.CONFIRMED, Ticket.PENDING]
-        ).select_related('passenger')
-        
+        from apps.boarding.services import BoardingManifestService
+        return BoardingManifestService.build(trip, since=since)
+    
+    @staticmethod
+    def _public_keys(keys):
+        """Clés du manifeste (la clé courante, qui signe les manifestes, en premier)"""
         return {
-            'trip_id': str(trip.id),
-            'departure_city': trip.departure_city.name,
-            'arrival_city': trip.arrival_city.name,
-            'departure_datetime': trip.departure_datetime.isoformat(),
-            'total_seats': trip.total_seats,
-            'tickets': [
-                {
-                    'ticket_id': str(ticket.id),
-                    'ticket_number': ticket.ticket_number,
-                    'passenger_name': ticket.passenger_full_name,
-                    'seat_number': ticket.seat_number,
-                    'status': ticket.status
-                }
-                for ticket in tickets
+            'ed25519': [
+                ed25519.Ed25519PublicKey.from_public_bytes(base64.b64decode(key))
+                for key in keys['ed25519']
             ],
-            'synced_at': timezone.now().isoformat()
-        }
\ No newline at end of file
+            'rs256': [serialization.load_pem_public_key(key.encode()) for key in keys['rs256']],
+        }
+    
+    @staticmethod
+    def _verify(signed, public_key):
+        try:
+            public_key.verify(base64.b64decode(signed['signature']), signed['manifest'].encode())
+        except InvalidSignature:
+            raise Exception('Signature du manifeste invalide')
+    
+    @staticmethod
+    def _decode(token, keys):
+        if token.startswith(COMPACT_PREFIX):
+            return decode_compact_token(token, keys['ed25519'])
+        try:
+            return QRCodeGenerator._decode_jwt(token, keys['rs256'])
+        except jwt.ExpiredSignatureError:
+            raise Exception('QR code expiré')
+        except jwt.InvalidTokenError as e:
+            raise Exception(f'QR code invalide : {str(e)}')
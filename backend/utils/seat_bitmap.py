@@ -0,0 +1,63 @@
+"""
+Bitmap d'occupation des sièges d'un voyage
+"""
+
+
+class SeatBitmap:
+    """
+    Occupation des sièges sous forme d'entier (un bit par siège)
+
+    L'ordre des bits suit l'ordre des sièges du plan du véhicule
+    (Vehicle.get_seat_map()) : le test d'un siège est un accès dictionnaire
+    plus une opération binaire, sans requête.
+    """
+
+    def __init__(self, seat_numbers, bits=0):
+        self.seat_numbers = [str(number) for number in seat_numbers]
+        self.positions = {number: index for index, number in enumerate(self.seat_numbers)}
+        self.bits = bits
+
+    @classmethod
+    def from_seat_map(cls, seat_map, bits=0):
+        """Créer un bitmap à partir du plan de sièges d'un véhicule"""
+        return cls([seat['number'] for seat in seat_map.get('seats', [])], bits)
+
+    def __len__(self):
+        return len(self.seat_numbers)
+
+    def __contains__(self, number):
+        return str(number) in self.positions
+
+    def _mask(self, number):
+        try:
+            return 1 << self.positions[str(number)]
+        except KeyError:
+            raise KeyError(f'Siège inconnu : {number}')
+
+    def is_occupied(self, number):
+        """Le siège est-il occupé"""
+        return bool(self.bits & self._mask(number))
+
+    def is_available(self, number):
+        """Le siège existe-t-il et est-il libre"""
+        return number in self and not self.is_occupied(number)
+
+    def occupy(self, number):
+        """Marquer un siège comme occupé"""
+        self.bits |= self._mask(number)
+
+    def release(self, number):
+        """Marquer un siège comme libre"""
+        self.bits &= ~self._mask(number)
+
+    @property
+    def occupied_count(self):
+        return bin(self.bits).count('1')
+
+    @property
+    def available_count(self):
+        return len(self) - self.occupied_count
+
+    def occupied_numbers(self):
+        """Numéros des sièges occupés (ordre du plan)"""
+        return [number for index, number in enumerate(self.seat_numbers) if self.bits >> index & 1]
@@ -0,0 +1,70 @@
+"""
+Suivi en mémoire des modifications de champs d'un modèle
+"""
+
+
+class FieldTrackerMixin:
+    """
+    Mémorise les valeurs de tracked_fields au chargement et après chaque save()
+
+    Les signaux pre_save/post_save comparent l'état courant à cet instantané
+    (previous_value, has_changed) sans relire la ligne en base. L'instantané
+    est pris dans __init__, appelé aussi par Model.from_db lors des lectures.
+
+    Les mises à jour ensemblistes (QuerySet.update) ne passent pas par
+    l'instance : l'instantané reflète la dernière lecture ou sauvegarde.
+    """
+
+    tracked_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tracked_snapshot = {}
+        self._snapshot_tracked()
+
+    def _snapshot_tracked(self, fields=None):
+        for name in fields if fields is not None else self.tracked_fields:
+            attname = self._meta.get_field(name).attname
+            # Champ différé (only/defer) : non chargé, donc non suivi
+            if attname in self.__dict__:
+                self._tracked_snapshot[name] = self.__dict__[attname]
+
+    def previous_value(self, name):
+        """Valeur du champ lors du dernier chargement/sauvegarde (None si nouvel objet)"""
+        if self._state.adding:
+            return None
+        return self._tracked_snapshot.get(name)
+
+    def has_changed(self, name):
+        """Le champ a-t-il changé depuis le dernier chargement/sauvegarde"""
+        if self._state.adding:
+            return True
+        if name not in self._tracked_snapshot:
+            return False
+        return self._tracked_snapshot[name] != getattr(self, self._meta.get_field(name).attname)
+
+    def tracked_changes(self):
+        """Champs suivis modifiés : {nom: (ancienne valeur, nouvelle valeur)}"""
+        return {
+            name: (self.previous_value(name), getattr(self, self._meta.get_field(name).attname))
+            for name in self.tracked_fields
+            if self.has_changed(name)
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        # Après les signaux post_save, qui comparent encore à l'ancien état
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._snapshot_tracked()
+        else:
+            self._snapshot_tracked([name for name in self.tracked_fields if name in update_fields])
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+        if fields is None:
+            self._snapshot_tracked()
+        else:
+            self._snapshot_tracked([name for name in self.tracked_fields if name in fields])